@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Persisted anomaly-score index keyed by pkSeqID.
+
+Built once from a predictions CSV (run_baselines.py combine output, or a
+notebook-era baseline_test_predictions.csv without pkSeqID, whose rows are
+the test split in order and are keyed with the preprocessing artifact's
+test ids). The index keeps the ids sorted with every score and prediction
+column aligned, so:
+
+    top_k       the k most anomalous rows by lof_score / iso_forest_score
+                by partial selection (O(n), no full sort), ties by pkSeqID
+    get         scores of given pkSeqIDs by binary search
+    join_flows  fetch only the selected rows' features from a flow store
+                or CSV (filter pushdown / chunked scan), in ranking order
+
+Nothing depends on row positions lining up between the predictions and
+the flow file.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import ID_COLUMN
+
+INDEX_VERSION = 1
+INDEX_FILE = 'anomaly_index.npz'
+SCORE_COLUMNS = ['lof_score', 'iso_forest_score']
+TOP_K = 5000
+
+
+def top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k highest scores, highest first, ties by position.
+    argpartition selects in O(n); only the k winners are sorted. NaN
+    scores rank last.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if np.isnan(scores).any():
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+    if k < len(scores):
+        # argpartition picks arbitrary members of a tie at the k-th score;
+        # fill the remaining slots with the earliest of them instead
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > kth)
+        idx = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+class AnomalyIndex:
+    """Score and prediction columns aligned with sorted, unique pkSeqIDs."""
+
+    def __init__(self, ids: np.ndarray, columns: dict, info: dict = None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.columns = {name: np.asarray(values) for name, values in columns.items()}
+        self.info = info or {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_predictions(cls, predictions: pd.DataFrame, test_ids=None, source: str = None) -> 'AnomalyIndex':
+        """
+        Index a predictions frame. Without a pkSeqID column the rows must be
+        the test split in order; `test_ids` (FeaturePreprocessor.test_ids)
+        then supplies their keys.
+        """
+        if ID_COLUMN in predictions.columns:
+            ids = predictions[ID_COLUMN].to_numpy(dtype=np.int64)
+        elif test_ids is not None:
+            if len(test_ids) != len(predictions):
+                raise ValueError(f"Predictions have {len(predictions):,} rows but the test split has "
+                                 f"{len(test_ids):,} ids; they are not positional test-split scores")
+            ids = np.asarray(test_ids, dtype=np.int64)
+        else:
+            raise ValueError(f"Predictions have no {ID_COLUMN} column; pass the preprocessing "
+                             f"artifact's test ids to key them")
+
+        order = np.argsort(ids, kind='stable')
+        ids = ids[order]
+        if len(ids) > 1 and (ids[1:] == ids[:-1]).any():
+            raise ValueError(f"Duplicate {ID_COLUMN} values in predictions")
+        columns = {c: predictions[c].to_numpy()[order] for c in predictions.columns if c != ID_COLUMN}
+        return cls(ids, columns, {'rows': int(len(ids)), 'source': source,
+                                  'keyed_by': 'column' if ID_COLUMN in predictions.columns else 'test_ids'})
+
+    def positions(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, ids)
+        found = pos < len(self.ids)
+        found[found] = self.ids[pos[found]] == ids[found]
+        if not found.all():
+            missing = ids[~found]
+            raise KeyError(f"{len(missing):,} pkSeqIDs not in the anomaly index (e.g. {missing[:5].tolist()})")
+        return pos
+
+    def frame(self, positions: np.ndarray = None) -> pd.DataFrame:
+        positions = slice(None) if positions is None else positions
+        df = pd.DataFrame({name: values[positions] for name, values in self.columns.items()})
+        df.insert(0, ID_COLUMN, self.ids[positions])
+        return df
+
+    def get(self, ids) -> pd.DataFrame:
+        """Rows of the given pkSeqIDs, in that order."""
+        return self.frame(self.positions(ids))
+
+    def top_k(self, k: int = TOP_K, rank_by: str = 'lof_score') -> pd.DataFrame:
+        """The k most anomalous rows by `rank_by`, most anomalous first."""
+        if rank_by not in self.columns:
+            raise KeyError(f"'{rank_by}' is not in the anomaly index (columns: {list(self.columns)})")
+        return self.frame(top_k_positions(self.columns[rank_by], k))
+
+    def save(self, path: str):
+        meta = {'version': INDEX_VERSION, 'columns': list(self.columns), 'info': self.info}
+        arrays = {f"col_{name}": values for name, values in self.columns.items()}
+        arrays['ids'] = self.ids
+        arrays['meta'] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'AnomalyIndex':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].tobytes().decode())
+            if meta['version'] != INDEX_VERSION:
+                raise ValueError(f"{path} is anomaly index v{meta['version']}, expected v{INDEX_VERSION}; rebuild it")
+            return cls(data['ids'], {name: data[f"col_{name}"] for name in meta['columns']}, meta['info'])
+
+
+def join_flows(anomalies: pd.DataFrame, flows: str, columns: list = None, compact: bool = True) -> pd.DataFrame:
+    """
+    Flow features of the pkSeqIDs in `anomalies`, with the anomaly columns
+    appended, in `anomalies` order. Only the matching rows are loaded.
+    """
+    from flow_store import load_flow_data
+
+    ids = anomalies[ID_COLUMN].to_numpy(dtype=np.int64)
+    if columns is not None:
+        columns = list(dict.fromkeys([ID_COLUMN] + list(columns)))
+    df = load_flow_data(flows, columns=columns, filters=[(ID_COLUMN, 'in', ids.tolist())], compact=compact)
+    if df[ID_COLUMN].duplicated().any():
+        raise ValueError(f"Duplicate {ID_COLUMN} values in {flows}")
+    missing = np.setdiff1d(ids, df[ID_COLUMN].to_numpy())
+    if len(missing):
+        raise KeyError(f"{len(missing):,} pkSeqIDs not found in {flows} (e.g. {missing[:5].tolist()})")
+    df = df.set_index(ID_COLUMN).loc[ids].reset_index()
+    extra = anomalies.drop(columns=[c for c in anomalies.columns if c in df.columns])
+    return pd.concat([df, extra.reset_index(drop=True)], axis=1)
+
+
+def build_index(predictions: str, preprocessor: str = None) -> AnomalyIndex:
+    """Index a predictions CSV; `preprocessor` keys files without pkSeqID."""
+    df = pd.read_csv(predictions)
+    test_ids = None
+    if ID_COLUMN not in df.columns and preprocessor:
+        from feature_preprocessing import FeaturePreprocessor
+        test_ids = FeaturePreprocessor.load(preprocessor).test_ids
+    return AnomalyIndex.from_predictions(df, test_ids=test_ids, source=os.path.abspath(predictions))
+
+
+def main():
+    from instrumentation import stage
+
+    parser = argparse.ArgumentParser(description="Build or query the pkSeqID-keyed anomaly index")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Index a predictions CSV")
+    build.add_argument('predictions', help="baseline_test_predictions.csv")
+    build.add_argument('--preprocessor', default=None,
+                       help="Preprocessing artifact; keys predictions files without a pkSeqID column")
+    build.add_argument('--output', default=INDEX_FILE)
+
+    top = sub.add_parser('top', help="Top-K anomalies, optionally joined to their flow features")
+    top.add_argument('index', help="Anomaly index (.npz) or a predictions CSV")
+    top.add_argument('--preprocessor', default=None)
+    top.add_argument('--top-k', type=int, default=TOP_K)
+    top.add_argument('--rank-by', choices=SCORE_COLUMNS, default='lof_score')
+    top.add_argument('--flows', default=None, help="Flow store or CSV/Parquet to fetch features from")
+    top.add_argument('--columns', nargs='+', default=None, help="Flow columns to fetch (default: all)")
+    top.add_argument('--output', default='top_anomalies.csv')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = build_index(args.predictions, args.preprocessor)
+        index.save(args.output)
+        print(f"✓ Indexed {len(index):,} rows by {ID_COLUMN} ({index.info['keyed_by']}) → {args.output}")
+        return
+
+    index = AnomalyIndex.load(args.index) if args.index.endswith('.npz') else \
+        build_index(args.index, args.preprocessor)
+    with stage('topk', rows_in=len(index), k=args.top_k, rank_by=args.rank_by) as span:
+        result = index.top_k(args.top_k, args.rank_by)
+        span.rows_out = len(result)
+    if args.flows:
+        result = join_flows(result, args.flows, columns=args.columns, compact=False)
+    result.to_csv(args.output, index=False)
+    print(f"✓ Top {len(result):,} of {len(index):,} by {args.rank_by} → {args.output}")
+    print(f"  {args.rank_by} range: {result[args.rank_by].min():.4f} - {result[args.rank_by].max():.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark of the detection pipeline on synthetic Bot-IoT flows.
+
+For every size (default 100k, 1M and 10M rows) a seeded synthetic CSV is
+generated once (synthetic_flows.py, cached in --workdir) and the stages run
+in a fresh process, each under an instrumentation span:
+
+    store → load → preprocess → iso_forest.fit/score → lof.fit/score
+    → topk → cluster → profiles → metrics
+
+`metrics` scores synthetic LLM outputs with compute_metrics for
+max(n_clusters, rows / rows_per_cluster) clusters. Wall time, CPU time and
+peak RSS per stage are written to --output and, with --baseline, compared
+against a stored result: a stage regresses when its time or peak memory
+grows by more than --threshold. Stage times are also compared across
+sizes; a growth exponent well above 1 (time rising faster than rows) is
+reported as a scaling cliff. Exits with status 1 on any regression.
+
+The LOF reference set is capped at --lof-fit-rows train rows so the 10M
+run finishes; IsolationForest fits on the full train split as in the
+baseline notebook.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+BENCHMARK_VERSION = 1
+SIZES = [100_000, 1_000_000, 10_000_000]
+STAGES = ['store', 'load', 'preprocess', 'iso_forest.fit', 'iso_forest.score', 'lof.fit', 'lof.score',
+          'topk', 'cluster', 'profiles', 'metrics']
+DEFAULT_PARAMS = {
+    'seed': 42,
+    'mix': None,
+    'test_size': 0.3,
+    'n_estimators': 100,
+    'lof_index': 'kd_tree',
+    'lof_fit_rows': 200_000,
+    'n_neighbors': 20,
+    'top_k': 5000,
+    'n_clusters': 3,
+    'rows_per_cluster': 1000
+}
+REGRESSION_THRESHOLD = 1.25
+SCALING_ALERT = 1.3         # growth exponent flagged as a scaling cliff
+MIN_WALL_S = 0.05           # stages faster than this are too noisy to compare
+MIN_RSS_DELTA_MB = 50.0
+
+
+def parse_size(text: str) -> int:
+    """'100k' / '1M' / '10m' / '250000' -> rows."""
+    text = text.strip().lower().replace('_', '')
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def size_label(rows: int) -> str:
+    if rows >= 1_000_000 and rows % 1_000_000 == 0:
+        return f"{rows // 1_000_000}M"
+    if rows >= 1_000 and rows % 1_000 == 0:
+        return f"{rows // 1_000}k"
+    return str(rows)
+
+
+def dataset_path(workdir: str, rows: int, seed: int, mix: str = None) -> str:
+    tag = '' if not mix else '_' + mix.replace('=', '').replace(',', '_').replace('.', 'p')
+    return os.path.join(workdir, f"synthetic_{size_label(rows)}_s{seed}{tag}.csv")
+
+
+def run_size(rows: int, workdir: str, params: dict) -> dict:
+    """Run every stage on `rows` synthetic flows; returns the stage spans and data info."""
+    import shutil
+
+    import numpy as np
+    import pandas as pd
+
+    import instrumentation
+    from cluster_profiles import build_profiles
+    from compute_metrics import compute_report
+    from feature_preprocessing import fit_from_flows
+    from flow_schema import FEATURE_SETS, ID_COLUMN
+    from flow_store import load_flow_data, write_flow_store
+    from incremental_clustering import IncrementalClusterModel
+    from lof_engine import LOFEngine
+    from run_baselines import fit_isolation_forest, iso_forest_frame, select_top_k
+    from synthetic_flows import parse_mix, synthetic_interpretations, write_flows
+
+    label = size_label(rows)
+    trace_path = os.path.join(workdir, 'traces', f"benchmark_{label}.json")
+    tracer = instrumentation.enable(trace_path)
+    stage = instrumentation.stage
+
+    source = dataset_path(workdir, rows, params['seed'], params['mix'])
+    generated = None
+    if not os.path.exists(source):
+        started = time.perf_counter()
+        write_flows(source, rows, seed=params['seed'], mix=parse_mix(params['mix']) if params['mix'] else None)
+        generated = round(time.perf_counter() - started, 3)
+
+    store_dir = os.path.join(workdir, f"store_{label}")
+    shutil.rmtree(store_dir, ignore_errors=True)
+    with stage('store', rows_in=rows) as span:
+        span.rows_out = write_flow_store(source, store_dir)['rows']
+
+    columns = [ID_COLUMN, 'attack'] + [c for features in FEATURE_SETS['detection'] for c in features]
+    with stage('load', rows_in=rows) as span:
+        df = load_flow_data(store_dir, columns=columns, compact=True)
+        span.rows_out = len(df)
+
+    with stage('preprocess', rows_in=len(df)) as span:
+        preprocessor = fit_from_flows(df, test_size=params['test_size'], random_state=params['seed'])
+        X = preprocessor.transform(df)
+        position = pd.Index(df[ID_COLUMN].to_numpy())
+        train_pos = position.get_indexer(preprocessor.train_ids)
+        test_pos = position.get_indexer(preprocessor.test_ids)
+        X_train, X_test = X[train_pos], X[test_pos]
+        del X
+        span.rows_out = len(X_train) + len(X_test)
+
+    with stage('iso_forest.fit', rows_in=len(X_train), n_estimators=params['n_estimators']):
+        iso = fit_isolation_forest(X_train, n_estimators=params['n_estimators'], random_state=params['seed'])
+    with stage('iso_forest.score', rows_in=len(X_test)) as span:
+        iso_scores = iso_forest_frame(iso, X_test)
+        span.rows_out = len(iso_scores)
+        span.extra['anomalies'] = int(iso_scores['iso_forest_pred'].sum())
+    del iso
+
+    rng = np.random.default_rng(params['seed'])
+    fit_rows = min(len(X_train), params['lof_fit_rows'] or len(X_train))
+    reference = X_train if fit_rows == len(X_train) else X_train[np.sort(rng.choice(len(X_train), fit_rows, replace=False))]
+    with stage('lof.fit', rows_in=fit_rows, index=params['lof_index']):
+        engine = LOFEngine(n_neighbors=params['n_neighbors'], index=params['lof_index']).fit(reference)
+    del X_train, reference
+    with stage('lof.score', rows_in=len(X_test)) as span:
+        lof_scores = engine.score_frame(X_test)
+        span.rows_out = len(lof_scores)
+        span.extra['anomalies'] = int(lof_scores['lof_pred'].sum())
+    del engine
+
+    test = df.iloc[test_pos].reset_index(drop=True)
+    predictions = pd.concat([pd.DataFrame({ID_COLUMN: test[ID_COLUMN].to_numpy(),
+                                           'actual_label': test['attack'].to_numpy()}),
+                             iso_scores, lof_scores], axis=1)
+    with stage('topk', rows_in=len(predictions), k=params['top_k']) as span:
+        top = select_top_k(predictions, k=params['top_k'])
+        span.rows_out = len(top)
+
+    top_pos = pd.Index(test[ID_COLUMN].to_numpy()).get_indexer(top[ID_COLUMN].to_numpy())
+    with stage('cluster', rows_in=len(top), clusters=params['n_clusters']) as span:
+        model = IncrementalClusterModel(n_clusters=params['n_clusters'], random_state=params['seed'])
+        labels = model.fit(X_test[top_pos])
+        span.rows_out = int(len(model.cluster_ids_))
+
+    anomalies = test.iloc[top_pos].reset_index(drop=True)
+    anomalies['cluster'] = labels
+    anomalies['lof_score'] = top['lof_score'].to_numpy()
+    with stage('profiles', rows_in=len(anomalies)) as span:
+        profiles = build_profiles(anomalies)
+        span.rows_out = len(profiles)
+
+    n_clusters = max(params['n_clusters'], rows // params['rows_per_cluster'])
+    llm_data, cluster_data = synthetic_interpretations(profiles, n_clusters, seed=params['seed'])
+    with stage('metrics', rows_in=sum(len(a) for a in llm_data.values()), clusters=n_clusters) as span:
+        report = compute_report(llm_data, cluster_data, report_date='1970-01-01')
+        span.rows_out = len(report['metric_3_semantic_consistency'])
+
+    tracer.write()
+    shutil.rmtree(store_dir, ignore_errors=True)
+    return {
+        'rows': rows,
+        'source': source,
+        'generate_s': generated,
+        'trace': trace_path,
+        'stages': {s['name']: {k: s.get(k) for k in ('wall_s', 'cpu_s', 'peak_rss_mb', 'rows_in', 'rows_out',
+                                                     'rows_per_s')}
+                   for s in tracer.spans if s['depth'] == 0}
+    }
+
+
+def machine_info() -> dict:
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+
+
+def compare(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Regressions of `results` against `baseline`, as printable dicts."""
+    regressions = []
+    for size, run in results['sizes'].items():
+        base_run = baseline['sizes'].get(size)
+        if not base_run:
+            continue
+        for name, cur in run['stages'].items():
+            base = base_run['stages'].get(name)
+            if not base:
+                continue
+            if base['wall_s'] >= MIN_WALL_S and cur['wall_s'] > base['wall_s'] * threshold:
+                regressions.append({'size': size, 'stage': name, 'metric': 'wall_s',
+                                    'baseline': base['wall_s'], 'current': cur['wall_s']})
+            if base.get('peak_rss_mb') and cur.get('peak_rss_mb') and \
+                    cur['peak_rss_mb'] > base['peak_rss_mb'] * threshold and \
+                    cur['peak_rss_mb'] - base['peak_rss_mb'] > MIN_RSS_DELTA_MB:
+                regressions.append({'size': size, 'stage': name, 'metric': 'peak_rss_mb',
+                                    'baseline': base['peak_rss_mb'], 'current': cur['peak_rss_mb']})
+    return regressions
+
+
+def scaling_exponents(results: dict) -> dict:
+    """{stage: [(from size, to size, exponent)]}; exponent 1 = linear in rows."""
+    runs = sorted(results['sizes'].values(), key=lambda r: r['rows'])
+    out = {}
+    for small, large in zip(runs, runs[1:]):
+        for name in STAGES:
+            a, b = small['stages'].get(name), large['stages'].get(name)
+            if not a or not b or a['wall_s'] < MIN_WALL_S:
+                continue
+            exponent = math.log(b['wall_s'] / a['wall_s']) / math.log(large['rows'] / small['rows'])
+            out.setdefault(name, []).append((size_label(small['rows']), size_label(large['rows']),
+                                             round(exponent, 2)))
+    return out
+
+
+def print_results(results: dict):
+    sizes = sorted(results['sizes'].values(), key=lambda r: r['rows'])
+    print(f"\n{'stage':18s}" + ''.join(f"{size_label(r['rows']):>22s}" for r in sizes))
+    print(f"{'':18s}" + ''.join(f"{'wall s / peak MB':>22s}" for _ in sizes))
+    for name in STAGES:
+        cells = []
+        for run in sizes:
+            s = run['stages'].get(name)
+            cells.append(f"{s['wall_s']:10.2f} / {s['peak_rss_mb'] or 0:8.0f}" if s else f"{'-':>19s}")
+        print(f"{name:18s}" + ''.join(f"{c:>22s}" for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile pipeline stages at several data sizes")
+    parser.add_argument('--sizes', nargs='+', default=[size_label(s) for s in SIZES],
+                        help="Row counts, e.g. 100k 1M 10M")
+    parser.add_argument('--workdir', default='benchmark_data', help="Synthetic datasets and traces")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="Earlier --output to compare against")
+    parser.add_argument('--save-baseline', default=None, help="Also write the results to this baseline file")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Regression when time or peak memory exceeds baseline × threshold")
+    for name, value in DEFAULT_PARAMS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value) if value is not None else str,
+                            default=value)
+    args = parser.parse_args()
+    params = {name: getattr(args, name) for name in DEFAULT_PARAMS}
+    sizes = [parse_size(s) for s in args.sizes]
+    os.makedirs(args.workdir, exist_ok=True)
+
+    print("=" * 80)
+    print(f"SCALING BENCHMARK: {', '.join(size_label(s) for s in sizes)} rows")
+    print("=" * 80)
+
+    results = {'version': BENCHMARK_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'machine': machine_info(), 'params': params, 'sizes': {}}
+    for rows in sizes:
+        print(f"\n>>> {size_label(rows)} rows...")
+        # A fresh process per size, so peak memory of one size does not carry into the next
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            run = pool.submit(run_size, rows, args.workdir, params).result()
+        results['sizes'][size_label(rows)] = run
+        total = sum(s['wall_s'] for s in run['stages'].values())
+        print(f"✓ {size_label(rows)}: {total:.1f}s over {len(run['stages'])} stages (trace: {run['trace']})")
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print_results(results)
+
+    cliffs = {name: [e for e in exps if e[2] > SCALING_ALERT] for name, exps in scaling_exponents(results).items()}
+    cliffs = {name: exps for name, exps in cliffs.items() if exps}
+    if cliffs:
+        print("\n⚠️  Superlinear scaling (time grows faster than rows):")
+        for name, exps in cliffs.items():
+            for small, large, exponent in exps:
+                print(f"  {name}: {small} → {large} exponent {exponent}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Baseline saved to: {args.save_baseline}")
+
+    print(f"\n✅ Results saved to: {args.output}")
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('machine', {}).get('cpu_count') != results['machine']['cpu_count']:
+            print("  Note: baseline was recorded on a different machine; timings may not be comparable")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) vs {args.baseline} (threshold ×{args.threshold}):")
+            for r in regressions:
+                print(f"  [{r['size']}] {r['stage']} {r['metric']}: {r['baseline']} → {r['current']} "
+                      f"(×{r['current'] / r['baseline']:.2f})")
+            sys.exit(1)
+        print(f"✓ No regressions vs {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
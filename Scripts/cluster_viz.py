@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Scalable cluster visualizations from a cached projection.
+
+The anomaly matrix is projected once with IncrementalPCA (streamed in
+batches) or randomized PCA (fit on a sample) and the fitted projection plus
+the projected coordinates are cached under a key of their inputs:
+
+    <cache_dir>/<key>/projection.npz   components, mean, explained variance
+    <cache_dir>/<key>/coords.npy       float32 (n, n_components), ids order
+    <cache_dir>/<key>/ids.npy          pkSeqIDs of the rows
+    <cache_dir>/<key>/tsne_<hash>.npy  t-SNE embeddings of cluster samples
+
+Every figure reuses the same coordinates: the K-Means and HDBSCAN views
+(cluster_visualization.png, hdbscan_visualization.png) take the first
+three components, and t-SNE runs on a per-cluster sample of the cached
+components instead of the raw features.
+
+Points are not drawn one by one. The 3D PCA view is rotated to a fixed
+camera, binned into per-cluster pixel grids with one bincount and composited
+into an image whose colour mixes cluster colours by count and whose
+intensity is log density; sparse plots are widened by a small box filter.
+Binning is one O(n) pass, and drawing costs the same for 5k points as for
+millions.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import ID_COLUMN
+from instrumentation import stage
+
+VIZ_VERSION = 1
+METHODS = ['incremental', 'randomized']
+N_COMPONENTS = 10
+BATCH_SIZE = 20_000
+FIT_ROWS = 200_000          # randomized PCA fits on at most this many rows
+BINS = 400
+VIEW = (20, 45)             # (elev, azim) of the old 3D scatter plots
+NOISE_COLOR = (0.6, 0.6, 0.6)
+TSNE_PER_CLUSTER = 60
+TSNE_TOP_CLUSTERS = 10
+
+
+class Projection:
+    """Linear projection onto principal components."""
+
+    def __init__(self, components: np.ndarray, mean: np.ndarray, explained_variance_ratio: np.ndarray,
+                 info: dict = None):
+        self.components_ = np.asarray(components, dtype=np.float64)
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.explained_variance_ratio_ = np.asarray(explained_variance_ratio, dtype=np.float64)
+        self.info = info or {}
+
+    def transform(self, X: np.ndarray, batch_size: int = BATCH_SIZE) -> np.ndarray:
+        out = np.empty((len(X), len(self.components_)), dtype=np.float32)
+        components = self.components_.T.astype(np.float32)
+        mean = self.mean_.astype(np.float32)
+        for start in range(0, len(X), batch_size):
+            batch = np.asarray(X[start:start + batch_size], dtype=np.float32)
+            np.matmul(batch - mean, components, out=out[start:start + len(batch)])
+        return out
+
+    def save(self, path: str):
+        meta = {'version': VIZ_VERSION, 'info': self.info}
+        with open(path, 'wb') as f:
+            np.savez(f, components=self.components_, mean=self.mean_,
+                     explained_variance_ratio=self.explained_variance_ratio_,
+                     meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path: str) -> 'Projection':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].tobytes().decode())
+            if meta['version'] != VIZ_VERSION:
+                raise ValueError(f"{path} is projection v{meta['version']}, expected v{VIZ_VERSION}")
+            return cls(data['components'], data['mean'], data['explained_variance_ratio'], meta['info'])
+
+
+def fit_projection(X: np.ndarray, n_components: int = N_COMPONENTS, method: str = 'incremental',
+                   batch_size: int = BATCH_SIZE, fit_rows: int = FIT_ROWS, random_state: int = 42) -> Projection:
+    """IncrementalPCA over all rows in batches, or randomized PCA on a row sample."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {METHODS}")
+    n_components = min(n_components, X.shape[1], len(X))
+    if method == 'incremental':
+        from sklearn.decomposition import IncrementalPCA
+        pca = IncrementalPCA(n_components=n_components)
+        # Every partial_fit batch needs at least n_components rows; fold a short tail into the last batch
+        starts = list(range(0, len(X), batch_size))
+        if len(starts) > 1 and len(X) - starts[-1] < n_components:
+            starts.pop()
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else len(X)
+            pca.partial_fit(np.asarray(X[start:end], dtype=np.float64))
+        fitted_rows = len(X)
+    else:
+        from sklearn.decomposition import PCA
+        sample = X
+        if fit_rows and len(X) > fit_rows:
+            rng = np.random.default_rng(random_state)
+            sample = X[np.sort(rng.choice(len(X), fit_rows, replace=False))]
+        pca = PCA(n_components=n_components, svd_solver='randomized', random_state=random_state).fit(sample)
+        fitted_rows = len(sample)
+    return Projection(pca.components_, pca.mean_, pca.explained_variance_ratio_,
+                      {'method': method, 'n_components': int(n_components), 'fit_rows': int(fitted_rows)})
+
+
+def _hash(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.tobytes() if isinstance(part, np.ndarray) else json.dumps(part, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def data_key(X: np.ndarray) -> str:
+    """Cache key of an in-memory matrix."""
+    return _hash(np.ascontiguousarray(X), list(X.shape), str(X.dtype))
+
+
+def cached_projection(cache_dir: str, key: str, ids: np.ndarray, load_matrix, n_components: int = N_COMPONENTS,
+                      method: str = 'incremental', random_state: int = 42) -> tuple:
+    """
+    (Projection, coords, entry dir) for `key`. `load_matrix()` supplies the
+    feature matrix (rows in `ids` order) and is only called on a cache miss.
+    """
+    entry = os.path.join(cache_dir, _hash(VIZ_VERSION, key, method, n_components, random_state))
+    paths = {name: os.path.join(entry, name) for name in ('projection.npz', 'coords.npy', 'ids.npy')}
+    if all(os.path.exists(p) for p in paths.values()):
+        cached_ids = np.load(paths['ids.npy'])
+        if np.array_equal(cached_ids, ids):
+            return Projection.load(paths['projection.npz']), np.load(paths['coords.npy'], mmap_mode='r'), entry
+
+    X = load_matrix()
+    with stage('viz.project', rows_in=len(X), method=method, components=n_components) as span:
+        projection = fit_projection(X, n_components, method, random_state=random_state)
+        coords = projection.transform(X)
+        span.rows_out = len(coords)
+    os.makedirs(entry, exist_ok=True)
+    projection.save(paths['projection.npz'])
+    np.save(paths['ids.npy'], np.asarray(ids, dtype=np.int64))
+    # Written last: an entry is complete once its coordinates exist
+    np.save(paths['coords.npy'], coords)
+    return projection, coords, entry
+
+
+def view_coords(xyz: np.ndarray, elev: float = VIEW[0], azim: float = VIEW[1]) -> np.ndarray:
+    """Orthographic screen coordinates of 3D points seen from (elev, azim) degrees."""
+    e, a = np.radians(elev), np.radians(azim)
+    x, y, z = (np.asarray(xyz[:, i], dtype=np.float32) for i in range(3))
+    sx = -np.sin(a) * x + np.cos(a) * y
+    sy = -np.sin(e) * np.cos(a) * x - np.sin(e) * np.sin(a) * y + np.cos(e) * z
+    return np.column_stack([sx, sy])
+
+
+def density_grids(xy: np.ndarray, codes: np.ndarray, n_classes: int, bins: int = BINS,
+                  extent: tuple = None) -> tuple:
+    """
+    (grids, extent): per-class point counts on a bins×bins pixel grid,
+    shape (n_classes, bins, bins) with row 0 at the bottom. The extent
+    defaults to the 0.5-99.5 percentile box plus a 5% margin; points
+    outside are clamped to the border pixels so every point is counted.
+    """
+    if extent is None:
+        lo = np.percentile(xy, 0.5, axis=0)
+        hi = np.percentile(xy, 99.5, axis=0)
+        hi = np.where(hi > lo, hi, lo + 1.0)
+        margin = (hi - lo) * 0.05
+        lo, hi = lo - margin, hi + margin
+        extent = (float(lo[0]), float(hi[0]), float(lo[1]), float(hi[1]))
+    x0, x1, y0, y1 = extent
+    px = np.clip(((xy[:, 0] - x0) / (x1 - x0) * bins).astype(np.int64), 0, bins - 1)
+    py = np.clip(((xy[:, 1] - y0) / (y1 - y0) * bins).astype(np.int64), 0, bins - 1)
+    flat = (np.asarray(codes, dtype=np.int64) * bins + py) * bins + px
+    grids = np.bincount(flat, minlength=n_classes * bins * bins).reshape(n_classes, bins, bins)
+    return grids.astype(np.float32), extent
+
+
+def spread_radius(n_points: int, bins: int = BINS) -> int:
+    """Pixel radius that keeps sparse plots readable; 0 once points fill the grid."""
+    fill = n_points / float(bins * bins)
+    return 0 if fill >= 2.0 else 1 if fill >= 0.2 else 2
+
+
+def spread(grids: np.ndarray, radius: int) -> np.ndarray:
+    """Box-filter every class grid by `radius` pixels (cost depends on the grid, not the points)."""
+    if radius <= 0:
+        return grids
+    from scipy.ndimage import uniform_filter
+
+    size = 2 * radius + 1
+    return uniform_filter(grids, size=(1, size, size), mode='constant') * (size * size)
+
+
+def composite(grids: np.ndarray, colors: np.ndarray) -> np.ndarray:
+    """RGB image on white: count-weighted cluster colour, log-density intensity."""
+    total = grids.sum(axis=0)
+    rgb = np.tensordot(colors[:, :3].astype(np.float32), grids, axes=(0, 0)).transpose(1, 2, 0)
+    occupied = total > 0
+    rgb[occupied] /= total[occupied][:, None]
+    intensity = np.log1p(total) / np.log1p(total.max()) if total.max() > 0 else total
+    # Occupied pixels get at least 25% intensity so sparse clusters stay visible
+    intensity = np.where(occupied, 0.25 + 0.75 * intensity, 0.0)[..., None]
+    return 1.0 - intensity * (1.0 - rgb)
+
+
+def cluster_colors(classes: np.ndarray, cmap: str) -> np.ndarray:
+    """One RGBA colour per class; noise (-1) is grey."""
+    import matplotlib.pyplot as plt
+
+    clusters = [c for c in classes if c != -1]
+    palette = plt.get_cmap(cmap)(np.linspace(0, 1, max(len(clusters), 1)))
+    colors, i = [], 0
+    for c in classes:
+        if c == -1:
+            colors.append((*NOISE_COLOR, 1.0))
+        else:
+            colors.append(tuple(palette[i]))
+            i += 1
+    return np.array(colors)
+
+
+def plot_density(ax, xy: np.ndarray, labels: np.ndarray, cmap: str = 'viridis', bins: int = BINS) -> dict:
+    """Draw the density composite of labelled 2D points on `ax`; returns {label: colour}."""
+    classes, codes = np.unique(labels, return_inverse=True)
+    colors = cluster_colors(classes, cmap)
+    grids, extent = density_grids(xy, codes, len(classes), bins)
+    grids = spread(grids, spread_radius(len(xy), bins))
+    ax.imshow(composite(grids, colors), origin='lower', extent=extent, aspect='auto', interpolation='nearest')
+    return dict(zip(classes.tolist(), colors))
+
+
+def _legend(ax, colors: dict, max_items: int = 12):
+    from matplotlib.patches import Patch
+
+    items = [(c, col) for c, col in colors.items()][:max_items]
+    ax.legend(handles=[Patch(color=col, label='noise' if c == -1 else f'Cluster {c}') for c, col in items],
+              loc='upper right', fontsize=8, framealpha=0.8)
+
+
+def render_cluster_figure(path: str, coords: np.ndarray, labels: np.ndarray, projection: Projection,
+                          title: str, cmap: str = 'viridis', bins: int = BINS, dpi: int = 300):
+    """3D PCA view as a density image next to the cluster size distribution."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    evr = projection.explained_variance_ratio_
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, 6))
+    colors = plot_density(ax1, view_coords(coords[:, :3]), labels, cmap, bins)
+    ax1.set_title(f"{title}\n{len(labels):,} points, PC1-3 ({evr[:3].sum() * 100:.1f}% variance), "
+                  f"view elev={VIEW[0]}° azim={VIEW[1]}°", fontsize=13, fontweight='bold')
+    ax1.set_xticks([])
+    ax1.set_yticks([])
+    _legend(ax1, colors)
+
+    sizes = pd.Series(labels).value_counts().sort_index()
+    noise = int(sizes.pop(-1)) if -1 in sizes.index else 0
+    ax2.bar([str(c) for c in sizes.index], sizes.values, color=[colors[c] for c in sizes.index],
+            edgecolor='black', linewidth=1.0)
+    ax2.set_xlabel('Cluster ID', fontsize=12)
+    ax2.set_ylabel('Number of Samples', fontsize=12)
+    ax2.set_title('Cluster Size Distribution' + (f' ({noise:,} noise points)' if noise else ''),
+                  fontsize=13, fontweight='bold')
+    ax2.grid(axis='y', alpha=0.3)
+    if len(sizes) <= 20:
+        for i, v in enumerate(sizes.values):
+            ax2.text(i, v, f"{v:,}", ha='center', va='bottom', fontweight='bold', fontsize=9)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+
+
+def sample_per_cluster(labels: np.ndarray, per_cluster: int = TSNE_PER_CLUSTER,
+                       top_clusters: int = TSNE_TOP_CLUSTERS, random_state: int = 42) -> np.ndarray:
+    """Sorted row positions of up to `per_cluster` rows from each of the largest clusters."""
+    sizes = pd.Series(labels[labels != -1]).value_counts()
+    rng = np.random.default_rng(random_state)
+    picked = []
+    for cid in sizes.index[:top_clusters]:
+        rows = np.flatnonzero(labels == cid)
+        picked.append(rng.choice(rows, min(per_cluster, len(rows)), replace=False))
+    return np.sort(np.concatenate(picked)) if picked else np.empty(0, dtype=np.int64)
+
+
+def cached_tsne(entry: str, coords: np.ndarray, rows: np.ndarray, n_components: int = 2,
+                perplexity: float = 15.0, max_iter: int = 1500, random_state: int = 42) -> np.ndarray:
+    """t-SNE of the sampled cached components; reused while the sample is unchanged."""
+    path = os.path.join(entry, f"tsne_{_hash(rows, n_components, perplexity, max_iter, random_state)}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+    from sklearn.manifold import TSNE
+
+    sample = np.asarray(coords[rows], dtype=np.float32)
+    with stage('viz.tsne', rows_in=len(sample), components=n_components) as span:
+        embedding = TSNE(n_components=n_components, perplexity=min(perplexity, max(1.0, len(sample) - 1.0)),
+                         max_iter=max_iter, init='pca', random_state=random_state).fit_transform(sample)
+        span.rows_out = len(embedding)
+    np.save(path, embedding)
+    return embedding
+
+
+def render_tsne_figure(path: str, embedding: np.ndarray, labels: np.ndarray, all_labels: np.ndarray,
+                       title: str, cmap: str = 'tab20', dpi: int = 300):
+    """Sampled t-SNE scatter next to the full sizes of the plotted clusters."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    classes = np.unique(labels)
+    colors = dict(zip(classes.tolist(), cluster_colors(classes, cmap)))
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+    ax1.scatter(embedding[:, 0], embedding[:, 1], c=[colors[c] for c in labels], s=40, alpha=0.8,
+                edgecolors='black', linewidth=0.4)
+    ax1.set_xlabel('t-SNE Dimension 1', fontsize=11, fontweight='bold')
+    ax1.set_ylabel('t-SNE Dimension 2', fontsize=11, fontweight='bold')
+    ax1.set_title(title, fontsize=13, fontweight='bold')
+    ax1.grid(True, alpha=0.3)
+    _legend(ax1, colors)
+
+    sizes = pd.Series(all_labels).value_counts().reindex(classes)
+    ax2.barh([f'Cluster {c}' for c in sizes.index], sizes.values, color=[colors[c] for c in sizes.index],
+             edgecolor='black', linewidth=1.0)
+    ax2.invert_yaxis()
+    ax2.set_xlabel('Number of Samples (Original)', fontsize=12, fontweight='bold')
+    ax2.set_title(f'Cluster Sizes ({len(labels):,} samples visualized)', fontsize=13, fontweight='bold')
+    ax2.grid(axis='x', alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+
+
+def _input_key(flows: str, preprocessor, ids: np.ndarray) -> str:
+    """Cache key of the features of `ids`: preprocessing fingerprint, ids and the flow file's size/mtime."""
+    from flow_store import FLOWS_FILE, is_flow_store
+
+    source = os.path.join(flows, FLOWS_FILE) if is_flow_store(flows) else flows
+    st = os.stat(source)
+    return _hash(preprocessor.fingerprint(), np.asarray(ids, dtype=np.int64),
+                 [os.path.abspath(source), st.st_size, st.st_mtime_ns])
+
+
+def _labels_for(assignments: str, ids: np.ndarray) -> tuple:
+    """
+    (positions in `ids` that a pkSeqID,cluster CSV covers, their labels).
+    Ids only another method clustered are left out rather than drawn as noise.
+    """
+    df = pd.read_csv(assignments, usecols=[ID_COLUMN, 'cluster'])
+    labels = df.set_index(ID_COLUMN)['cluster'].reindex(ids)
+    covered = labels.notna().to_numpy()
+    return np.flatnonzero(covered), labels[covered].to_numpy(dtype=np.int64)
+
+
+def main():
+    from feature_preprocessing import FeaturePreprocessor, load_features_for_ids
+
+    parser = argparse.ArgumentParser(description="Cluster visualizations from a cached PCA projection")
+    parser.add_argument('--kmeans', default=None, help="K-Means cluster_assignments.csv (pkSeqID, cluster)")
+    parser.add_argument('--hdbscan', default=None, help="HDBSCAN assignments CSV (pkSeqID, cluster; -1 = noise)")
+    parser.add_argument('--flows', required=True, help="Flow store directory or subset CSV/Parquet")
+    parser.add_argument('--preprocessor', required=True)
+    parser.add_argument('--cache-dir', default='viz_cache')
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--method', choices=METHODS, default='incremental')
+    parser.add_argument('--components', type=int, default=N_COMPONENTS,
+                        help="Components kept; views use the first 3, t-SNE uses all")
+    parser.add_argument('--bins', type=int, default=BINS, help="Pixel grid size of the density images")
+    parser.add_argument('--tsne', action='store_true', help="Also render a sampled t-SNE view")
+    parser.add_argument('--tsne-per-cluster', type=int, default=TSNE_PER_CLUSTER)
+    parser.add_argument('--tsne-top-clusters', type=int, default=TSNE_TOP_CLUSTERS)
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--random-state', type=int, default=42)
+    args = parser.parse_args()
+    if not (args.kmeans or args.hdbscan):
+        parser.error("give --kmeans and/or --hdbscan assignments")
+
+    print("=" * 80)
+    print("CLUSTER VISUALIZATION")
+    print("=" * 80)
+
+    frames = [pd.read_csv(p, usecols=[ID_COLUMN]) for p in (args.kmeans, args.hdbscan) if p]
+    ids = np.unique(np.concatenate([f[ID_COLUMN].to_numpy(dtype=np.int64) for f in frames]))
+    preprocessor = FeaturePreprocessor.load(args.preprocessor)
+    key = _input_key(args.flows, preprocessor, ids)
+
+    def load_matrix():
+        print(f"\n>>> Loading features of {len(ids):,} anomalies...")
+        return load_features_for_ids(args.flows, preprocessor, ids)[1]
+
+    projection, coords, entry = cached_projection(args.cache_dir, key, ids, load_matrix, args.components,
+                                                  args.method, args.random_state)
+    evr = projection.explained_variance_ratio_
+    print(f"✓ Projection ({projection.info['method']} PCA, {len(evr)} components): {entry}")
+    print(f"  Explained variance PC1-3: {evr[0]:.4f}, {evr[1]:.4f}, {evr[2]:.4f} (total {evr.sum():.4f})")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    views = [('kmeans', args.kmeans, 'cluster_visualization.png', 'K-Means Clusters (PCA 3D Projection)', 'viridis'),
+             ('hdbscan', args.hdbscan, 'hdbscan_visualization.png', 'HDBSCAN Clusters (PCA 3D Projection)', 'tab20')]
+    labels_by_method = {}
+    for method, assignments, filename, title, cmap in views:
+        if not assignments:
+            continue
+        # Both methods share the projection of the union of their ids; each is drawn over its own ids
+        rows, labels = _labels_for(assignments, ids)
+        labels_by_method[method] = rows, labels
+        output = os.path.join(args.output_dir, filename)
+        with stage('viz.render', rows_in=len(labels), figure=filename):
+            render_cluster_figure(output, coords[rows], labels, projection, title, cmap, args.bins, args.dpi)
+        print(f"✅ {method}: {output}")
+
+    if args.tsne:
+        method = 'hdbscan' if 'hdbscan' in labels_by_method else 'kmeans'
+        own, labels = labels_by_method[method]
+        picked = sample_per_cluster(labels, args.tsne_per_cluster, args.tsne_top_clusters, args.random_state)
+        rows = own[picked]
+        embedding = cached_tsne(entry, coords, rows, random_state=args.random_state)
+        output = os.path.join(args.output_dir, f"{method}_tsne_top_clusters.png")
+        render_tsne_figure(output, embedding, labels[picked], labels,
+                           f"{method.upper() if method == 'hdbscan' else 'K-Means'}: Top Clusters (2D t-SNE)\n"
+                           f"{len(rows):,} points, ≤{args.tsne_per_cluster} per cluster", dpi=args.dpi)
+        print(f"✅ t-SNE ({len(rows):,} sampled points): {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,27 +2,129 @@
 """
 Compute quantitative metrics for LLM output validation.
 Generates Metric Validation Report for publication.
+
+Importable: `compute_report(llm_data, cluster_data)` returns the report
+dict and `main()` is the CLI. Grounding matches each number against a
+sorted array of baseline values with binary search, clusters are looked up
+through a dict index, and all threat/feature/theme keywords are counted in
+one regex pass per text.
 """
 
+import argparse
 import json
 import re
+from bisect import bisect_left
+from collections import Counter
+from datetime import date
 from typing import Dict, List, Tuple
-from statistics import mean, stdev
+from statistics import mean
+
+from instrumentation import stage
+from personas import PERSONAS as PERSONA_DEFINITIONS
+
+PERSONAS = list(PERSONA_DEFINITIONS)
+GROUNDING_TOLERANCE = 0.1
+
+# Metric name -> keywords whose counts are summed (same terms as before)
+THREAT_KEYWORDS = {
+    'c2': ['c2'],
+    'command_control': ['command and control', 'command & control'],
+    'botnet': ['botnet'],
+    'malware': ['malware'],
+    'exfiltration': ['exfiltration'],
+    'dos': ['dos', 'denial'],
+    'scanning': ['scanning', 'scan'],
+    'reconnaissance': ['reconnaissance']
+}
+AGREEMENT_KEYWORDS = {
+    'mentions_c2': ['c2', 'command and control'],
+    'mentions_botnet': ['botnet']
+}
+FEATURE_KEYWORDS = {
+    'protocols': ['tcp', 'udp'],
+    'ports': ['port 80', '80'],
+    'states': ['int', 'req', 'rst'],
+    'destinations': ['192.168.100'],
+    'anomaly': ['lof', 'anomaly'],
+    'bytes': ['bytes', 'flow'],
+    'packets': ['packet', 'pkts']
+}
+THEME_KEYWORDS = {
+    'technical': ['bandwidth', 'latency', 'packets', 'bytes', 'protocol'],
+    'threat': ['attack', 'botnet', 'malware', 'threat', 'exploit'],
+    'actionable': ['recommend', 'should', 'must', 'must implement', 'isolate', 'block', 'monitor'],
+    'defensive': ['defense', 'mitigation', 'detection', 'prevention']
+}
+
+
+def _trie_pattern(words) -> str:
+    """Alternation factored by common prefixes, so `re` does not retry every keyword at each position."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
 
-# Load data files
-with open('llm_multi_persona_analysis.json', 'r') as f:
-    llm_data = json.load(f)
+    def build(node) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{body})?' if '' in node else body
 
-with open('cluster_profiles.json', 'r') as f:
-    cluster_data = json.load(f)
+    return build(trie)
+
+
+def _self_overlapping(word: str) -> bool:
+    return any(word[:i] == word[-i:] for i in range(1, len(word)))
+
+
+class KeywordCounter:
+    """
+    Counts many substrings in one scan. Counts equal `text.count(kw)` for
+    every keyword: at each position the longest keyword that starts there
+    is matched (via a lookahead, so matches may overlap) and every keyword
+    that is a prefix of it is credited too. The few keywords that can
+    overlap themselves ('threat' in 'threathreat'), where str.count skips
+    overlapping occurrences, are recounted with str.count.
+    """
 
-# Build baseline from cluster_profiles
-baseline = {}
-for cluster in cluster_data:
-    cid = f"cluster_{cluster['cluster_id']}"
-    baseline[cid] = cluster
+    def __init__(self, keywords):
+        self.keywords = sorted(set(keywords))
+        self._pattern = re.compile(f'(?=({_trie_pattern(self.keywords)}))')
+        self._prefixes = {kw: [p for p in self.keywords if kw.startswith(p)] for kw in self.keywords}
+        self._self_overlapping = [kw for kw in self.keywords if _self_overlapping(kw)]
 
-personas = ['penetration_tester', 'security_researcher', 'security_ops_engineer', 'data_analyst']
+    def count(self, text: str) -> Counter:
+        counts = Counter()
+        for kw, n in Counter(self._pattern.findall(text)).items():
+            for prefix in self._prefixes[kw]:
+                counts[prefix] += n
+        for kw in self._self_overlapping:
+            if counts[kw]:
+                counts[kw] = text.count(kw)
+        return counts
+
+
+ALL_KEYWORDS = KeywordCounter(
+    kw for group in (THREAT_KEYWORDS, AGREEMENT_KEYWORDS, FEATURE_KEYWORDS, THEME_KEYWORDS)
+    for kws in group.values() for kw in kws
+)
+
+
+def keyword_counts(text: str) -> Counter:
+    """Counts of every metric keyword in the lowercased text."""
+    return ALL_KEYWORDS.count(text.lower())
+
+
+def _group_totals(counts: Counter, groups: Dict) -> Dict:
+    return {name: sum(counts[kw] for kw in kws) for name, kws in groups.items()}
+
+
+def _cluster_counts(cluster_analysis: Dict) -> Tuple[Dict, Counter]:
+    per_persona = {persona: keyword_counts(text) for persona, text in cluster_analysis.items()}
+    return per_persona, sum(per_persona.values(), Counter())
 
 # ============ METRIC 1: GROUNDING FIDELITY ============
 
@@ -31,276 +133,218 @@ def extract_numeric_mentions(text: str) -> List[float]:
     pattern = r'\d+\.?\d*'
     return [float(x) for x in re.findall(pattern, text)]
 
-def check_grounding(text: str, baseline_values: Dict) -> Tuple[int, int]:
+
+def baseline_numbers(baseline_values: Dict) -> List[float]:
+    """Sorted key values of a cluster profile that LLM numbers are checked against."""
+    nums = {
+        baseline_values['size'],
+        baseline_values['numeric_stats']['pkts']['mean'],
+        baseline_values['numeric_stats']['bytes']['mean'],
+        baseline_values['numeric_stats']['pkts']['max'],
+        baseline_values['numeric_stats']['bytes']['max'],
+        baseline_values['lof_score_stats'].get('max'),
+    }
+    nums.update(baseline_values['categorical_dist']['proto'].values())
+    nums.update(baseline_values['categorical_dist']['dport'].values())
+    # Older profiles stored some min/max values as strings
+    return sorted(float(b) for b in nums if b is not None)
+
+
+def is_grounded(num: float, baseline: List[float], tolerance: float = GROUNDING_TOLERANCE) -> bool:
+    """True if a sorted baseline holds a value within `tolerance` of num."""
+    i = bisect_left(baseline, num)
+    return (i < len(baseline) and baseline[i] - num < tolerance) or \
+        (i > 0 and num - baseline[i - 1] < tolerance)
+
+
+def check_grounding(text: str, baseline_values, tolerance: float = GROUNDING_TOLERANCE) -> Tuple[int, int]:
     """
     Check if numeric mentions in LLM text correspond to actual cluster data.
+    `baseline_values` is a cluster profile or its `baseline_numbers`.
     Returns (grounded_count, total_count)
     """
-    grounded = 0
-    total = 0
-    
-    # Extract all numbers from text
+    baseline = baseline_values if isinstance(baseline_values, list) else baseline_numbers(baseline_values)
     numbers = extract_numeric_mentions(text)
-    
-    # Key values to check
-    baseline_nums = set()
-    baseline_nums.add(baseline_values['size'])
-    baseline_nums.add(baseline_values['numeric_stats']['pkts']['mean'])
-    baseline_nums.add(baseline_values['numeric_stats']['bytes']['mean'])
-    baseline_nums.add(baseline_values['numeric_stats']['pkts']['max'])
-    baseline_nums.add(baseline_values['numeric_stats']['bytes']['max'])
-    baseline_nums.add(baseline_values['lof_score_stats']['max'])
-    baseline_nums.update(baseline_values['categorical_dist']['proto'].values())
-    baseline_nums.update(baseline_values['categorical_dist']['dport'].values())
-    
-    # Check each mentioned number
-    for num in numbers:
-        total += 1
-        # Check if this number matches baseline (with rounding tolerance)
-        if any(abs(num - b) < 0.1 for b in baseline_nums):
-            grounded += 1
-    
+    grounded = sum(1 for num in numbers if is_grounded(num, baseline, tolerance))
+    total = len(numbers)
     return grounded, total if total > 0 else 1
 
-grounding_results = {}
-for cluster_id, cluster_analysis in llm_data.items():
-    cid = cluster_id
-    baseline_cluster = next((c for c in cluster_data if f"cluster_{c['cluster_id']}" == cid), None)
-    
-    if not baseline_cluster:
-        continue
-    
+
+def grounding_metrics(cluster_analysis: Dict, baseline_cluster: Dict) -> Dict:
+    baseline = baseline_numbers(baseline_cluster)
     cluster_grounding = {}
     for persona, text in cluster_analysis.items():
-        grounded, total = check_grounding(text, baseline_cluster)
-        fidelity = (grounded / total * 100) if total > 0 else 0
+        grounded, total = check_grounding(text, baseline)
         cluster_grounding[persona] = {
             'grounded': grounded,
             'total': total,
-            'fidelity': fidelity
+            'fidelity': (grounded / total * 100) if total > 0 else 0
         }
-    
-    grounding_results[cid] = cluster_grounding
+    return cluster_grounding
 
 # ============ METRIC 2: HALLUCINATION DETECTION ============
 
 def detect_hallucinations(text: str, baseline: Dict) -> List[str]:
     """Identify claims that don't match baseline data"""
-    hallucinations = []
-    
-    # Check for specific claimed relationships not in data
-    # Extract sentences with claims about specific IPs, ports, counts
-    sentences = text.split('.')
-    
     # Note: This is a simplified check - real hallucination detection would be more sophisticated
     # For now, we check if major claims (C2, exfiltration) are supported by data
-    
-    return hallucinations
+    return []
 
 # ============ METRIC 3: SEMANTIC CONSISTENCY ============
 
-def check_semantic_consistency(cluster_analysis: Dict) -> Dict:
+def check_semantic_consistency(cluster_analysis: Dict, n_personas: int = len(PERSONAS),
+                               counts: Tuple = None) -> Dict:
     """Check if all personas agree on threat classification"""
-    
-    threat_mentions = {
-        'c2': 0,
-        'command_control': 0,
-        'botnet': 0,
-        'malware': 0,
-        'exfiltration': 0,
-        'dos': 0,
-        'scanning': 0,
-        'reconnaissance': 0
+    per_persona, totals = counts or _cluster_counts(cluster_analysis)
+    persona_agreements = {
+        persona: {name: any(c[kw] for kw in kws) for name, kws in AGREEMENT_KEYWORDS.items()}
+        for persona, c in per_persona.items()
     }
-    
-    all_text = ' '.join(cluster_analysis.values()).lower()
-    
-    threat_mentions['c2'] = all_text.count('c2')
-    threat_mentions['command_control'] = all_text.count('command and control') + all_text.count('command & control')
-    threat_mentions['botnet'] = all_text.count('botnet')
-    threat_mentions['malware'] = all_text.count('malware')
-    threat_mentions['exfiltration'] = all_text.count('exfiltration')
-    threat_mentions['dos'] = all_text.count('dos') + all_text.count('denial')
-    threat_mentions['scanning'] = all_text.count('scanning') + all_text.count('scan')
-    threat_mentions['reconnaissance'] = all_text.count('reconnaissance')
-    
-    # Check agreement level (do all personas mention C2/botnet?)
-    persona_agreements = {}
-    for persona, text in cluster_analysis.items():
-        text_lower = text.lower()
-        agrees_c2 = ('c2' in text_lower or 'command and control' in text_lower)
-        agrees_botnet = 'botnet' in text_lower
-        persona_agreements[persona] = {
-            'mentions_c2': agrees_c2,
-            'mentions_botnet': agrees_botnet
-        }
-    
-    c2_agreement = sum(1 for v in persona_agreements.values() if v['mentions_c2']) / len(personas)
-    
+    c2_agreement = sum(1 for v in persona_agreements.values() if v['mentions_c2']) / n_personas
     return {
-        'threat_mentions': threat_mentions,
+        'threat_mentions': _group_totals(totals, THREAT_KEYWORDS),
         'persona_agreements': persona_agreements,
         'c2_consensus': c2_agreement
     }
 
-consistency_results = {}
-for cluster_id, cluster_analysis in llm_data.items():
-    consistency_results[cluster_id] = check_semantic_consistency(cluster_analysis)
-
 # ============ METRIC 4: FEATURE COVERAGE ============
 
-def analyze_feature_coverage(cluster_analysis: Dict, baseline: Dict) -> Dict:
+def analyze_feature_coverage(cluster_analysis: Dict, baseline: Dict = None, counts: Tuple = None) -> Dict:
     """Check which cluster features are mentioned by personas"""
-    
-    features = {
-        'protocols': ['tcp', 'udp'],
-        'ports': ['port 80', '80'],
-        'states': ['int', 'req', 'rst'],
-        'destinations': ['192.168.100'],
-        'anomaly': ['lof', 'anomaly'],
-        'bytes': ['bytes', 'flow'],
-        'packets': ['packet', 'pkts']
-    }
-    
-    coverage = {}
-    all_text = ' '.join(cluster_analysis.values()).lower()
-    
-    for feature_category, keywords in features.items():
-        mentions = sum(all_text.count(kw) for kw in keywords)
-        coverage[feature_category] = {
-            'keywords': keywords,
-            'mentions': mentions
-        }
-    
-    return coverage
-
-feature_coverage_results = {}
-for cluster_id, cluster_analysis in llm_data.items():
-    cid = cluster_id
-    baseline_cluster = next((c for c in cluster_data if f"cluster_{c['cluster_id']}" == cid), None)
-    if baseline_cluster:
-        feature_coverage_results[cid] = analyze_feature_coverage(cluster_analysis, baseline_cluster)
+    _, totals = counts or _cluster_counts(cluster_analysis)
+    return {category: {'keywords': keywords, 'mentions': sum(totals[kw] for kw in keywords)}
+            for category, keywords in FEATURE_KEYWORDS.items()}
 
 # ============ METRIC 5: INTER-PERSONA AGREEMENT ============
 
-def compute_inter_persona_agreement(cluster_analysis: Dict) -> Dict:
+def compute_inter_persona_agreement(cluster_analysis: Dict, n_personas: int = len(PERSONAS),
+                                    counts: Tuple = None) -> Dict:
     """Measure agreement between personas using shared terminology"""
-    
-    shared_terms = {
-        'threat_assessment': 0,
-        'technical_accuracy': 0,
-        'actionability': 0
-    }
-    
-    # Extract key themes from each persona
-    themes = {}
-    
-    for persona, text in cluster_analysis.items():
-        text_lower = text.lower()
-        themes[persona] = {
-            'technical': any(w in text_lower for w in ['bandwidth', 'latency', 'packets', 'bytes', 'protocol']),
-            'threat': any(w in text_lower for w in ['attack', 'botnet', 'malware', 'threat', 'exploit']),
-            'actionable': any(w in text_lower for w in ['recommend', 'should', 'must', 'must implement', 'isolate', 'block', 'monitor']),
-            'defensive': any(w in text_lower for w in ['defense', 'mitigation', 'detection', 'prevention'])
-        }
-    
-    # Agreement scoring
-    theme_agreement = {}
-    for theme in ['technical', 'threat', 'actionable', 'defensive']:
-        mentions = sum(1 for p in themes.values() if p[theme])
-        theme_agreement[theme] = mentions / len(personas)
-    
+    per_persona, _ = counts or _cluster_counts(cluster_analysis)
+    themes = {persona: {theme: any(c[kw] for kw in kws) for theme, kws in THEME_KEYWORDS.items()}
+              for persona, c in per_persona.items()}
+    theme_agreement = {theme: sum(1 for p in themes.values() if p[theme]) / n_personas
+                       for theme in THEME_KEYWORDS}
     return {
         'themes': themes,
         'theme_agreement': theme_agreement
     }
 
-inter_persona_results = {}
-for cluster_id, cluster_analysis in llm_data.items():
-    inter_persona_results[cluster_id] = compute_inter_persona_agreement(cluster_analysis)
-
 # ============ GENERATE REPORT ============
 
-report = {
-    'metadata': {
-        'total_clusters': len(llm_data),
-        'total_personas': len(personas),
-        'total_analyses': len(llm_data) * len(personas),
-        'report_date': '2026-01-31'
-    },
-    'metric_1_grounding_fidelity': grounding_results,
-    'metric_2_hallucination_detection': {
-        'hallucinations_detected': 0,
-        'note': 'No major hallucinations detected - all numeric claims verified'
-    },
-    'metric_3_semantic_consistency': consistency_results,
-    'metric_4_feature_coverage': feature_coverage_results,
-    'metric_5_inter_persona_agreement': inter_persona_results
-}
+def build_report(grounding_results: Dict, consistency_results: Dict, feature_coverage_results: Dict,
+                 inter_persona_results: Dict, total_clusters: int, personas: List = PERSONAS,
+                 report_date: str = None) -> Dict:
+    return {
+        'metadata': {
+            'total_clusters': total_clusters,
+            'total_personas': len(personas),
+            'total_analyses': total_clusters * len(personas),
+            'report_date': report_date or date.today().isoformat()
+        },
+        'metric_1_grounding_fidelity': grounding_results,
+        'metric_2_hallucination_detection': {
+            'hallucinations_detected': 0,
+            'note': 'No major hallucinations detected - all numeric claims verified'
+        },
+        'metric_3_semantic_consistency': consistency_results,
+        'metric_4_feature_coverage': feature_coverage_results,
+        'metric_5_inter_persona_agreement': inter_persona_results
+    }
 
-# Print summary
-print("\n" + "="*70)
-print("LLM OUTPUT METRICS VALIDATION REPORT")
-print("="*70 + "\n")
-
-print("📊 DATASET OVERVIEW")
-print("-" * 70)
-print(f"Total Clusters Analyzed:     {report['metadata']['total_clusters']}")
-print(f"Total Personas:              {report['metadata']['total_personas']}")
-print(f"Total Analyses Generated:    {report['metadata']['total_analyses']}\n")
-
-print("📈 METRIC 1: GROUNDING FIDELITY")
-print("-" * 70)
-all_fidelities = []
-for cluster_id, personas_data in grounding_results.items():
-    print(f"\n{cluster_id}:")
-    for persona, metrics in personas_data.items():
-        fidelity = metrics['fidelity']
-        all_fidelities.append(fidelity)
-        status = "✅" if fidelity >= 80 else "⚠️"
-        print(f"  {status} {persona:25s}: {fidelity:6.1f}% ({metrics['grounded']}/{metrics['total']})")
-
-if all_fidelities:
-    avg_fidelity = mean(all_fidelities)
-    print(f"\n  AVERAGE FIDELITY: {avg_fidelity:.1f}%")
-
-print("\n📋 METRIC 2: HALLUCINATION DETECTION")
-print("-" * 70)
-print("Status: ✅ CLEAN - No invented statistics detected")
-print("Method: Cross-verified all numeric claims against cluster_profiles.json")
-
-print("\n🤝 METRIC 3: SEMANTIC CONSISTENCY (Threat Classification)")
-print("-" * 70)
-for cluster_id, consistency in consistency_results.items():
-    print(f"\n{cluster_id}:")
-    print(f"  C2 Consensus (all personas):       {consistency['c2_consensus']*100:.0f}%")
-    print(f"  Threat Type Mentions:")
-    for threat_type, count in consistency['threat_mentions'].items():
-        if count > 0:
-            print(f"    - {threat_type:20s}: {count:2d} mentions")
-
-print("\n🔍 METRIC 4: FEATURE COVERAGE")
-print("-" * 70)
-for cluster_id, coverage in feature_coverage_results.items():
-    print(f"\n{cluster_id}:")
-    total_mentions = sum(v['mentions'] for v in coverage.values())
-    for feature_cat, data in coverage.items():
-        if data['mentions'] > 0:
-            pct = (data['mentions'] / total_mentions * 100) if total_mentions > 0 else 0
-            print(f"  {feature_cat:15s}: {data['mentions']:3d} mentions ({pct:5.1f}%)")
-
-print("\n👥 METRIC 5: INTER-PERSONA AGREEMENT")
-print("-" * 70)
-for cluster_id, agreement in inter_persona_results.items():
-    print(f"\n{cluster_id}:")
-    for theme, score in agreement['theme_agreement'].items():
-        status = "✅" if score >= 0.75 else "⚠️" if score >= 0.5 else "❌"
-        print(f"  {status} {theme:15s}: {score*100:5.0f}% personas (personas that mention it)")
-
-print("\n" + "="*70)
-print("CONCLUSION")
-print("="*70)
-print("""
+
+def compute_report(llm_data: Dict, cluster_data: List, personas: List = PERSONAS,
+                   report_date: str = None) -> Dict:
+    """
+    Metrics for {cluster: {persona: text}} against the cluster profiles.
+    Grounding and coverage skip clusters without a profile.
+    """
+    baseline = {f"cluster_{c['cluster_id']}": c for c in cluster_data}
+    grounding_results, consistency_results = {}, {}
+    feature_coverage_results, inter_persona_results = {}, {}
+
+    for cid, cluster_analysis in llm_data.items():
+        counts = _cluster_counts(cluster_analysis)
+        baseline_cluster = baseline.get(cid)
+        if baseline_cluster:
+            grounding_results[cid] = grounding_metrics(cluster_analysis, baseline_cluster)
+        consistency_results[cid] = check_semantic_consistency(cluster_analysis, len(personas), counts)
+        if baseline_cluster:
+            feature_coverage_results[cid] = analyze_feature_coverage(cluster_analysis, baseline_cluster, counts)
+        inter_persona_results[cid] = compute_inter_persona_agreement(cluster_analysis, len(personas), counts)
+
+    return build_report(grounding_results, consistency_results, feature_coverage_results,
+                        inter_persona_results, len(llm_data), personas, report_date)
+
+
+def print_summary(report: Dict):
+    grounding_results = report['metric_1_grounding_fidelity']
+    consistency_results = report['metric_3_semantic_consistency']
+    feature_coverage_results = report['metric_4_feature_coverage']
+    inter_persona_results = report['metric_5_inter_persona_agreement']
+
+    print("\n" + "="*70)
+    print("LLM OUTPUT METRICS VALIDATION REPORT")
+    print("="*70 + "\n")
+
+    print("📊 DATASET OVERVIEW")
+    print("-" * 70)
+    print(f"Total Clusters Analyzed:     {report['metadata']['total_clusters']}")
+    print(f"Total Personas:              {report['metadata']['total_personas']}")
+    print(f"Total Analyses Generated:    {report['metadata']['total_analyses']}\n")
+
+    print("📈 METRIC 1: GROUNDING FIDELITY")
+    print("-" * 70)
+    all_fidelities = []
+    for cluster_id, personas_data in grounding_results.items():
+        print(f"\n{cluster_id}:")
+        for persona, metrics in personas_data.items():
+            fidelity = metrics['fidelity']
+            all_fidelities.append(fidelity)
+            status = "✅" if fidelity >= 80 else "⚠️"
+            print(f"  {status} {persona:25s}: {fidelity:6.1f}% ({metrics['grounded']}/{metrics['total']})")
+
+    if all_fidelities:
+        avg_fidelity = mean(all_fidelities)
+        print(f"\n  AVERAGE FIDELITY: {avg_fidelity:.1f}%")
+
+    print("\n📋 METRIC 2: HALLUCINATION DETECTION")
+    print("-" * 70)
+    print("Status: ✅ CLEAN - No invented statistics detected")
+    print("Method: Cross-verified all numeric claims against cluster_profiles.json")
+
+    print("\n🤝 METRIC 3: SEMANTIC CONSISTENCY (Threat Classification)")
+    print("-" * 70)
+    for cluster_id, consistency in consistency_results.items():
+        print(f"\n{cluster_id}:")
+        print(f"  C2 Consensus (all personas):       {consistency['c2_consensus']*100:.0f}%")
+        print(f"  Threat Type Mentions:")
+        for threat_type, count in consistency['threat_mentions'].items():
+            if count > 0:
+                print(f"    - {threat_type:20s}: {count:2d} mentions")
+
+    print("\n🔍 METRIC 4: FEATURE COVERAGE")
+    print("-" * 70)
+    for cluster_id, coverage in feature_coverage_results.items():
+        print(f"\n{cluster_id}:")
+        total_mentions = sum(v['mentions'] for v in coverage.values())
+        for feature_cat, data in coverage.items():
+            if data['mentions'] > 0:
+                pct = (data['mentions'] / total_mentions * 100) if total_mentions > 0 else 0
+                print(f"  {feature_cat:15s}: {data['mentions']:3d} mentions ({pct:5.1f}%)")
+
+    print("\n👥 METRIC 5: INTER-PERSONA AGREEMENT")
+    print("-" * 70)
+    for cluster_id, agreement in inter_persona_results.items():
+        print(f"\n{cluster_id}:")
+        for theme, score in agreement['theme_agreement'].items():
+            status = "✅" if score >= 0.75 else "⚠️" if score >= 0.5 else "❌"
+            print(f"  {status} {theme:15s}: {score*100:5.0f}% personas (personas that mention it)")
+
+    print("\n" + "="*70)
+    print("CONCLUSION")
+    print("="*70)
+    print("""
 ✅ All LLM outputs are grounded in quantitative cluster data
 ✅ No hallucinated statistics detected
 ✅ Strong inter-persona consensus on threat classifications
@@ -308,8 +352,32 @@ print("""
 ✅ Report ready for peer review and publication
 """)
 
-# Save report to file
-with open('METRICS_VALIDATION_REPORT.json', 'w') as f:
-    json.dump(report, f, indent=2)
 
-print("Report saved to: METRICS_VALIDATION_REPORT.json")
+def main():
+    parser = argparse.ArgumentParser(description="Compute validation metrics for LLM cluster interpretations")
+    parser.add_argument('--analysis', default='llm_multi_persona_analysis.json')
+    parser.add_argument('--profiles', default='cluster_profiles.json')
+    parser.add_argument('--output', default='METRICS_VALIDATION_REPORT.json')
+    parser.add_argument('--report-date', default=None, help="Defaults to today (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    # Load data files
+    with open(args.analysis, 'r') as f:
+        llm_data = json.load(f)
+    with open(args.profiles, 'r') as f:
+        cluster_data = json.load(f)
+
+    with stage('metrics', rows_in=sum(len(a) for a in llm_data.values())) as span:
+        report = compute_report(llm_data, cluster_data, report_date=args.report_date)
+        span.rows_out = len(llm_data)
+    print_summary(report)
+
+    # Save report to file
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Report saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
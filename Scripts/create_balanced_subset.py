@@ -1,5 +1,12 @@
-import pandas as pd
+import argparse
 import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import LABEL_COLUMNS, iter_flow_chunks
+from instrumentation import stage
 
 # Configuration
 MERGED_FILE = "/Users/nawara/Desktop/LLM-Clustering-Paper/Bot-IoT-Dataset/UNSW_2018_IoT_Botnet_Full_Merged.csv"
@@ -8,65 +15,147 @@ OUTPUT_FILE = os.path.join(OUTPUT_DIR, "bot_iot_balanced_subset_300k.csv")
 
 TARGET_N = 300000
 RANDOM_STATE = 42
-
-print("Loading merged dataset...")
-df = pd.read_csv(MERGED_FILE, low_memory=False)
-
-print(f"Full dataset shape: {df.shape}")
-
-# Check label distributions
-print("\n" + "="*60)
-print("LABEL DISTRIBUTION IN FULL DATASET")
-print("="*60)
-
-print("\nAttack (binary - 0/1):")
-print(df['attack'].value_counts())
-
-print("\nCategory distribution:")
-print(df['category'].value_counts())
-
-print("\nSubcategory distribution:")
-print(df['subcategory'].value_counts())
-
-# Perform stratified sampling based on 'attack' label
-print("\n" + "="*60)
-print("CREATING BALANCED SUBSET")
-print("="*60)
-
-# Get counts per attack label
-attack_counts = df['attack'].value_counts()
-print(f"\nTarget subset size: {TARGET_N:,} records")
-print(f"Available records per attack label:")
-print(attack_counts)
-
-# Calculate samples per attack label (balanced)
-n_labels = len(attack_counts)
-samples_per_label = TARGET_N // n_labels
-
-print(f"\nSampling ~{samples_per_label:,} records from each attack label ({n_labels} labels)")
-
-# Perform stratified sampling using sample with stratify parameter
-# Since we need balanced samples from attack labels
-subsets = []
-for label in df['attack'].unique():
-    label_df = df[df['attack'] == label]
-    sampled = label_df.sample(n=min(len(label_df), samples_per_label), random_state=RANDOM_STATE)
-    subsets.append(sampled)
-    print(f"  Label {label}: sampled {len(sampled):,} records")
-
-df_subset = pd.concat(subsets, ignore_index=True)
-
-print(f"\nSubset created:")
-print(f"  Shape: {df_subset.shape}")
-print(f"  Total records: {len(df_subset):,}")
-print(f"\nAttack label distribution in subset:")
-print(df_subset['attack'].value_counts())
-
-print(f"\nCategory distribution in subset:")
-print(df_subset['category'].value_counts())
-
-# Save subset
-print(f"\nSaving subset...")
-df_subset.to_csv(OUTPUT_FILE, index=False)
-print(f"✓ Saved to: {OUTPUT_FILE}")
-print(f"  File size: {os.path.getsize(OUTPUT_FILE) / (1024**2):.2f} MB")
+CHUNK_SIZE = 500_000
+
+
+def _keep_smallest_keys(pool: pd.DataFrame, cap: int) -> pd.DataFrame:
+    """Keep the `cap` rows with the smallest sampling keys (no full sort)."""
+    if len(pool) <= cap:
+        return pool
+    idx = np.argpartition(pool['_key'].to_numpy(), cap - 1)[:cap]
+    return pool.iloc[idx]
+
+
+def stream_stratified_sample(path: str, stratify: str = 'attack', target_n: int = TARGET_N,
+                             random_state: int = RANDOM_STATE, chunksize: int = CHUNK_SIZE,
+                             count_columns: list = LABEL_COLUMNS):
+    """
+    Balanced stratified sample in a single chunked pass over `path`.
+
+    Every row gets a uniform random key from a seeded generator; each label
+    keeps a reservoir of its rows with the smallest keys. The bottom-m keys of
+    a label are a uniform sample of size m from that label, so the reservoirs
+    can shrink to `target_n // labels_seen` as new labels appear without ever
+    discarding a row that belongs in the final sample. Keys are drawn as one
+    continuous stream, so the sample does not depend on `chunksize`.
+
+    Returns (subset, label_counts) where label_counts maps each of
+    `count_columns` to a Counter collected in the same pass.
+    """
+    rng = np.random.default_rng(random_state)
+    reservoirs = {}
+    label_counts = {col: Counter() for col in count_columns}
+    rows_seen = 0
+
+    for chunk in iter_flow_chunks(path, chunksize):
+        for col in count_columns:
+            label_counts[col].update(chunk[col].value_counts().to_dict())
+
+        chunk = chunk.assign(
+            _key=rng.random(len(chunk)),
+            _row=np.arange(rows_seen, rows_seen + len(chunk))
+        )
+        rows_seen += len(chunk)
+
+        for label in chunk[stratify].dropna().unique():
+            reservoirs.setdefault(label, None)
+        cap = target_n // len(reservoirs)
+
+        for label, group in chunk.groupby(stratify, sort=False):
+            current = reservoirs[label]
+            if current is not None and len(current) >= cap:
+                # Only rows beating the current worst key can enter
+                group = group[group['_key'].to_numpy() < current['_key'].max()]
+                if group.empty:
+                    continue
+            pool = group if current is None else pd.concat([current, group])
+            reservoirs[label] = _keep_smallest_keys(pool, cap)
+
+        for label, current in reservoirs.items():
+            if current is not None and len(current) > cap:
+                reservoirs[label] = _keep_smallest_keys(current, cap)
+
+    samples = [res for res in reservoirs.values() if res is not None]
+    if not samples:
+        raise ValueError(f"No rows with a '{stratify}' label found in {path}")
+    subset = (
+        pd.concat(samples)
+        .sort_values('_row', kind='stable')
+        .drop(columns=['_key', '_row'])
+        .reset_index(drop=True)
+    )
+    return subset, label_counts
+
+
+def _print_counts(counts: Counter):
+    for label, count in counts.most_common():
+        print(f"  {label}: {count:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a balanced stratified subset in one streaming pass")
+    parser.add_argument('--input', default=MERGED_FILE, help="Merged CSV or Parquet file")
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--stratify', choices=LABEL_COLUMNS, default='attack')
+    parser.add_argument('--target-n', type=int, default=TARGET_N)
+    parser.add_argument('--random-state', type=int, default=RANDOM_STATE)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print("Streaming merged dataset...")
+    with stage('subset', target_n=args.target_n) as span:
+        df_subset, label_counts = stream_stratified_sample(
+            args.input, stratify=args.stratify, target_n=args.target_n,
+            random_state=args.random_state, chunksize=args.chunksize
+        )
+        span.rows_in, span.rows_out = sum(label_counts['attack'].values()), len(df_subset)
+
+    total_rows = sum(label_counts['attack'].values())
+    print(f"Full dataset rows: {total_rows:,}")
+
+    # Check label distributions
+    print("\n" + "="*60)
+    print("LABEL DISTRIBUTION IN FULL DATASET")
+    print("="*60)
+
+    print("\nAttack (binary - 0/1):")
+    _print_counts(label_counts['attack'])
+
+    print("\nCategory distribution:")
+    _print_counts(label_counts['category'])
+
+    print("\nSubcategory distribution:")
+    _print_counts(label_counts['subcategory'])
+
+    print("\n" + "="*60)
+    print("CREATING BALANCED SUBSET")
+    print("="*60)
+
+    strata = label_counts[args.stratify]
+    samples_per_label = args.target_n // len(strata)
+    print(f"\nTarget subset size: {args.target_n:,} records")
+    print(f"Sampling ~{samples_per_label:,} records from each '{args.stratify}' label ({len(strata)} labels)")
+    for label, count in df_subset[args.stratify].value_counts(sort=False).items():
+        print(f"  Label {label}: sampled {count:,} records")
+
+    print(f"\nSubset created:")
+    print(f"  Shape: {df_subset.shape}")
+    print(f"  Total records: {len(df_subset):,}")
+    print(f"\nAttack label distribution in subset:")
+    print(df_subset['attack'].value_counts())
+
+    print(f"\nCategory distribution in subset:")
+    print(df_subset['category'].value_counts())
+
+    # Save subset
+    print(f"\nSaving subset...")
+    if args.output.endswith('.parquet'):
+        df_subset.to_parquet(args.output, index=False)
+    else:
+        df_subset.to_csv(args.output, index=False)
+    print(f"✓ Saved to: {args.output}")
+    print(f"  File size: {os.path.getsize(args.output) / (1024**2):.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
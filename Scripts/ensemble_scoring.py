@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Process-parallel ensemble scoring over a memory-mapped feature matrix.
+
+The preprocessed feature matrix is written once to a .npy file and every
+worker process maps it read-only, so the OS page cache holds the only copy.
+Workers load the fitted IsolationForest (joblib, arrays memory-mapped) and
+LOF engine (reference matrix memory-mapped) once, then score fixed-size row
+shards for both detectors and write each result straight into a shared
+output matrix at the shard's rows:
+
+    shard i = rows [i * shard_rows, (i + 1) * shard_rows)
+    task    = (detector, shard)  →  out[rows, column]
+
+Every row's score depends only on that row and the models, shard bounds
+do not depend on the number of workers, and each worker runs its BLAS /
+OpenMP / joblib work single-threaded. Scores are therefore bit-identical
+for any --workers, and equal to the single-process run_baselines.py /
+lof_engine.py scores. The output has the columns of
+baseline_test_predictions.csv.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import ID_COLUMN
+from instrumentation import stage
+
+SHARD_ROWS = 50_000
+MATRIX_FILE = 'features.npy'
+SCORES_FILE = 'scores.npy'
+SCORE_COLUMNS = {'iso_forest': 0, 'lof': 1}
+
+# Per-worker state, set once by _init_worker
+_WORKER = {}
+
+
+def _init_worker(matrix_path: str, scores_path: str, iso_model: str, lof_model: str):
+    from threadpoolctl import threadpool_limits
+
+    # One thread per process: parallelism comes from the pool, and fixed
+    # reduction order keeps scores bit-identical across worker counts
+    _WORKER['limits'] = threadpool_limits(1)
+    _WORKER['X'] = np.load(matrix_path, mmap_mode='r')
+    _WORKER['out'] = np.load(scores_path, mmap_mode='r+')
+    if iso_model:
+        import joblib
+        iso = joblib.load(iso_model, mmap_mode='r')
+        iso.set_params(n_jobs=1)
+        _WORKER['iso_forest'] = iso
+    if lof_model:
+        from lof_engine import LOFEngine
+        _WORKER['lof'] = LOFEngine.load(lof_model, n_jobs=1, mmap=True)
+
+
+def _score_shard(task) -> tuple:
+    """Score rows [start, end) with one detector into the shared output."""
+    detector, start, end = task
+    X = np.asarray(_WORKER['X'][start:end])
+    if detector == 'iso_forest':
+        scores = -_WORKER['iso_forest'].score_samples(X)
+    else:
+        scores = -_WORKER['lof'].score_samples(X)
+    _WORKER['out'][start:end, SCORE_COLUMNS[detector]] = scores
+    return detector, start, end
+
+
+def shards(n_rows: int, shard_rows: int = SHARD_ROWS) -> list:
+    return [(start, min(start + shard_rows, n_rows)) for start in range(0, n_rows, shard_rows)]
+
+
+def score_ensemble(X: np.ndarray, iso_model: str = None, lof_model: str = None, workers: int = None,
+                   shard_rows: int = SHARD_ROWS, workdir: str = None) -> pd.DataFrame:
+    """
+    `iso_forest_score` / `lof_score` (higher = more anomalous) of every row
+    of X, plus the binary predictions, using a pool of `workers` processes.
+    """
+    detectors = [d for d, model in (('iso_forest', iso_model), ('lof', lof_model)) if model]
+    if not detectors:
+        raise ValueError("Give an IsolationForest model, a LOF model or both")
+    workers = workers or os.cpu_count() or 1
+    tmp = tempfile.mkdtemp(prefix='ensemble_', dir=workdir)
+    try:
+        matrix_path = os.path.join(tmp, MATRIX_FILE)
+        scores_path = os.path.join(tmp, SCORES_FILE)
+        # The one on-disk copy every worker maps; float32 as the models score it
+        np.save(matrix_path, np.ascontiguousarray(X, dtype=np.float32))
+        out = np.lib.format.open_memmap(scores_path, mode='w+', dtype=np.float64, shape=(len(X), 2))
+        out[:] = np.nan
+        out.flush()
+        del out
+
+        # Interleave detectors so both share the pool from the start
+        tasks = [(d, start, end) for start, end in shards(len(X), shard_rows) for d in detectors]
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)) or 1, mp_context=get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(matrix_path, scores_path, iso_model, lof_model)) as pool:
+            for _ in pool.map(_score_shard, tasks):
+                pass
+
+        scores = np.load(scores_path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    result = pd.DataFrame(index=range(len(X)))
+    if iso_model:
+        import joblib
+        offset = joblib.load(iso_model).offset_
+        result['iso_forest_score'] = scores[:, 0]
+        result['iso_forest_pred'] = (-scores[:, 0] - offset < 0).astype(int)
+    if lof_model:
+        from lof_engine import LOFEngine
+        offset = LOFEngine.load(lof_model, n_jobs=1).offset_
+        result['lof_score'] = scores[:, 1]
+        result['lof_pred'] = (-scores[:, 1] - offset < 0).astype(int)
+    return result
+
+
+def main():
+    from feature_preprocessing import FeaturePreprocessor, load_features_for_ids
+    from run_baselines import PREDICTION_COLUMNS
+
+    parser = argparse.ArgumentParser(description="Sharded IsolationForest + LOF scoring across worker processes")
+    parser.add_argument('flows', help="Flow store directory or subset CSV/Parquet")
+    parser.add_argument('--preprocessor', required=True)
+    parser.add_argument('--iso-model', default=None, help="joblib IsolationForest (run_baselines.py iso --model)")
+    parser.add_argument('--lof-model', default=None, help="LOF engine directory (lof_engine.py fit --output)")
+    parser.add_argument('--split', choices=['train', 'test'], default='test')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS)
+    parser.add_argument('--workdir', default=None, help="Where the shared matrix is written (default: system temp)")
+    parser.add_argument('--output', default='baseline_test_predictions.csv')
+    args = parser.parse_args()
+    if not (args.iso_model or args.lof_model):
+        parser.error("give --iso-model and/or --lof-model")
+
+    print("=" * 70)
+    print(f"ENSEMBLE SCORING: {args.split.upper()} split")
+    print("=" * 70)
+
+    preprocessor = FeaturePreprocessor.load(args.preprocessor)
+    ids = preprocessor.train_ids if args.split == 'train' else preprocessor.test_ids
+    df, X = load_features_for_ids(args.flows, preprocessor, ids)
+
+    workers = args.workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    with stage('ensemble.score', rows_in=len(X), workers=workers, shard_rows=args.shard_rows) as span:
+        result = score_ensemble(X, args.iso_model, args.lof_model, workers, args.shard_rows, args.workdir)
+        span.rows_out = len(result)
+        for detector in ('iso_forest', 'lof'):
+            if f"{detector}_pred" in result.columns:
+                span.extra[f"{detector}_anomalies"] = int(result[f"{detector}_pred"].sum())
+    elapsed = time.perf_counter() - started
+
+    result.insert(0, ID_COLUMN, df[ID_COLUMN].to_numpy())
+    result.insert(1, 'actual_label', df['attack'].to_numpy())
+    result = result[[c for c in PREDICTION_COLUMNS if c in result.columns]]
+    result.to_csv(args.output, index=False)
+    print(f"✓ Scored {len(result):,} rows with {workers} workers in {elapsed:.1f}s → {args.output}")
+    for col in ('iso_forest_pred', 'lof_pred'):
+        if col in result.columns:
+            print(f"  {col}: {result[col].sum():,} / {len(result):,} anomalies")
+
+
+if __name__ == '__main__':
+    main()
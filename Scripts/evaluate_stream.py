@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Streaming, parallel, incremental evaluation of LLM interpretations.
+
+Interpretations are read as JSONL records, one per (cluster, persona):
+
+    {"cluster": "cluster_3", "persona": "data_analyst", "response": "..."}
+
+(`persona_runner.py --records` appends exactly these lines; a
+llm_multi_persona_analysis.json dict is accepted too.) Records are scored
+in batches across a process pool with the compute_metrics functions. Each
+record's grounding and keyword counts are cached under a hash of its text,
+the baseline numbers of its cluster profile and METRICS_VERSION, so
+unchanged analyses are never re-scored. After every batch the report built
+so far is written to the output, marked partial until the last batch.
+
+The final report equals `compute_metrics.compute_report` on the same data.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import compute_metrics
+from compute_metrics import PERSONAS
+from instrumentation import stage
+
+# Bump when per-record scoring changes so cached results are recomputed
+METRICS_VERSION = 1
+CACHE_PATH = '.metrics_cache.jsonl'
+BATCH_SIZE = 2000
+
+
+def iter_records(path: str):
+    """(cluster, persona, text) from a JSONL file or a {cluster: {persona: text}} JSON file."""
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for cluster, analysis in data.items():
+            for persona, text in analysis.items():
+                yield cluster, persona, text
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                yield rec['cluster'], rec['persona'], rec['response']
+
+
+def load_baselines(path: str) -> dict:
+    """{cluster key: sorted baseline numbers} from cluster_profiles.json."""
+    with open(path, 'r') as f:
+        profiles = json.load(f)
+    return {f"cluster_{p['cluster_id']}": compute_metrics.baseline_numbers(p) for p in profiles}
+
+
+def record_key(text: str, baseline) -> str:
+    payload = json.dumps([METRICS_VERSION, compute_metrics.GROUNDING_TOLERANCE, baseline, text])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def score_record(task) -> dict:
+    """Grounding and keyword counts of one interpretation; `baseline` may be None."""
+    text, baseline = task
+    result = {'keywords': dict(compute_metrics.keyword_counts(text))}
+    if baseline is not None:
+        grounded, total = compute_metrics.check_grounding(text, baseline)
+        result['grounding'] = {'grounded': grounded, 'total': total,
+                               'fidelity': (grounded / total * 100) if total > 0 else 0}
+    return result
+
+
+class MetricsCache:
+    """Append-only JSONL of {'key', 'result'}; later lines win."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self._pending = []
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line of an interrupted run
+                    self.entries[entry['key']] = entry['result']
+
+    def get(self, key: str):
+        return self.entries.get(key)
+
+    def put(self, key: str, result: dict):
+        self.entries[key] = result
+        self._pending.append(json.dumps({'key': key, 'result': result}))
+
+    def flush(self):
+        if self._pending:
+            with open(self.path, 'a') as f:
+                f.write('\n'.join(self._pending) + '\n')
+            self._pending = []
+
+
+class StreamingReport:
+    """
+    Per-record results folded into the compute_metrics report. Clusters and
+    personas keep the order they first appear in; a repeated record replaces
+    the earlier one. Metric sections are rebuilt only for clusters that
+    received records since the last report.
+    """
+
+    def __init__(self, personas: list = PERSONAS):
+        self.personas = personas
+        self.clusters = {}
+        self._sections = {}
+
+    def add(self, cluster: str, persona: str, result: dict):
+        self.clusters.setdefault(cluster, {})[persona] = result
+        self._sections.pop(cluster, None)
+
+    def _cluster_sections(self, records: dict) -> tuple:
+        n = len(self.personas)
+        per_persona = {p: Counter(r['keywords']) for p, r in records.items()}
+        counts = (per_persona, sum(per_persona.values(), Counter()))
+        has_baseline = all('grounding' in r for r in records.values())
+        return (
+            {p: r['grounding'] for p, r in records.items()} if has_baseline else None,
+            compute_metrics.check_semantic_consistency(records, n, counts),
+            compute_metrics.analyze_feature_coverage(records, None, counts) if has_baseline else None,
+            compute_metrics.compute_inter_persona_agreement(records, n, counts)
+        )
+
+    def report(self, report_date: str = None) -> dict:
+        grounding_results, consistency_results = {}, {}
+        feature_coverage_results, inter_persona_results = {}, {}
+        for cid, records in self.clusters.items():
+            if cid not in self._sections:
+                self._sections[cid] = self._cluster_sections(records)
+            grounding, consistency, coverage, agreement = self._sections[cid]
+            if grounding is not None:
+                grounding_results[cid] = grounding
+            consistency_results[cid] = consistency
+            if coverage is not None:
+                feature_coverage_results[cid] = coverage
+            inter_persona_results[cid] = agreement
+        return compute_metrics.build_report(grounding_results, consistency_results, feature_coverage_results,
+                                            inter_persona_results, len(self.clusters), self.personas,
+                                            report_date)
+
+
+def _write_report(report: dict, path: str, indent: int = 2):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(report, indent=indent))
+    os.replace(tmp, path)
+
+
+def _batches(records, size: int):
+    batch = []
+    for rec in records:
+        batch.append(rec)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def evaluate(records, baselines: dict, output: str, cache: MetricsCache = None, workers: int = None,
+             batch_size: int = BATCH_SIZE, personas: list = PERSONAS, report_date: str = None):
+    """
+    Score (cluster, persona, text) records and write the report to `output`
+    after every batch. Returns the final report and counts of scored and
+    cached records.
+    """
+    stream = StreamingReport(personas)
+    stats = {'records': 0, 'scored': 0, 'cache_hits': 0}
+    workers = workers or os.cpu_count() or 1
+    with Pool(workers) as pool:
+        for batch in _batches(records, batch_size):
+            misses = []
+            for cluster, persona, text in batch:
+                baseline = baselines.get(cluster)
+                key = record_key(text, baseline)
+                result = cache.get(key) if cache else None
+                if result is None:
+                    misses.append((cluster, persona, key, (text, baseline)))
+                else:
+                    stream.add(cluster, persona, result)
+                    stats['cache_hits'] += 1
+            chunksize = max(1, len(misses) // (4 * workers))
+            scored = pool.map(score_record, [m[3] for m in misses], chunksize=chunksize)
+            for (cluster, persona, key, _), result in zip(misses, scored):
+                stream.add(cluster, persona, result)
+                if cache:
+                    cache.put(key, result)
+            if cache:
+                cache.flush()
+            stats['records'] += len(batch)
+            stats['scored'] += len(misses)
+
+            partial = stream.report(report_date)
+            partial['metadata']['partial'] = {'records_evaluated': stats['records']}
+            # Unindented dumps take json's C encoder; only the final report is pretty-printed
+            _write_report(partial, output, indent=None)
+
+    report = stream.report(report_date)
+    _write_report(report, output)
+    return report, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score LLM interpretations in parallel with a per-record cache")
+    parser.add_argument('--records', default='llm_multi_persona_analysis.jsonl',
+                        help="JSONL records (or a llm_multi_persona_analysis.json dict)")
+    parser.add_argument('--profiles', default='cluster_profiles.json')
+    parser.add_argument('--output', default='METRICS_VALIDATION_REPORT.json')
+    parser.add_argument('--cache', default=CACHE_PATH)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Records per partial report")
+    parser.add_argument('--report-date', default=None, help="Defaults to today (YYYY-MM-DD)")
+    parser.add_argument('--summary', action='store_true', help="Print the full metrics summary")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"STREAMING METRICS EVALUATION: {args.records}")
+    print("=" * 70)
+
+    started = time.perf_counter()
+    with stage('metrics.stream') as span:
+        report, s = evaluate(iter_records(args.records), load_baselines(args.profiles), args.output,
+                          cache=None if args.no_cache else MetricsCache(args.cache), workers=args.workers,
+                          batch_size=args.batch_size, report_date=args.report_date)
+        span.rows_in, span.rows_out = s['records'], len(report['metric_3_semantic_consistency'])
+        span.extra.update(s)
+    elapsed = time.perf_counter() - started
+
+    if args.summary:
+        compute_metrics.print_summary(report)
+    print(f"\n✅ Report saved to: {args.output}")
+    print(f"  {s['records']:,} records: {s['scored']:,} scored, {s['cache_hits']:,} from cache in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Persisted feature-preprocessing artifact.
+
+Captures the fitted ordinal encoding of the categorical features, the
+StandardScaler statistics of the numeric features, the exact feature order
+and the train/test split (as pkSeqIDs), so every stage loads one file
+instead of refitting. Matrix layout is [numeric | categorical], as in the
+notebooks' `np.hstack([X_num, X_cat])`.
+
+Each artifact is fitted for one feature set (flow_schema.FEATURE_SETS):
+`detection` encodes the seven categoricals of
+Anomaly_Detection_Baselines.ipynb (42 features) and feeds the
+IsolationForest/LOF scripts; `clustering` encodes the six of
+Anomaly_Clustering_Analysis.ipynb (41 features) and feeds the clustering
+scripts. Both record the same stratified split, but each is fitted on the
+rows its notebook used: the stratified train split for detection, and
+`full_data.sample(frac=0.7, random_state=42)` for clustering.
+
+Categories are stored as sorted strings, which reproduces sklearn's
+OrdinalEncoder codes; unknown values encode to -1. Packed columns from
+flow_table (uint32 addresses, uint16 ports) are accepted transparently.
+"""
+
+import argparse
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import DETECTION_CATEGORICAL_FEATURES, FEATURE_SETS, ID_COLUMN, NUMERIC_FEATURES
+from flow_table import decode_value
+from instrumentation import stage
+
+PREPROCESSOR_VERSION = 2
+PREPROCESSOR_FILES = {
+    'detection': f"feature_preprocessing_v{PREPROCESSOR_VERSION}.npz",
+    'clustering': f"cluster_preprocessing_v{PREPROCESSOR_VERSION}.npz"
+}
+PREPROCESSOR_FILE = PREPROCESSOR_FILES['detection']
+
+TEST_SIZE = 0.3
+RANDOM_STATE = 42
+
+
+def _column_keys(series: pd.Series):
+    """Factorize a column into (codes, unique values as canonical strings)."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    keys = np.array([str(decode_value(series.name, v)) for v in uniques], dtype=object)
+    return codes, keys
+
+
+class FeaturePreprocessor:
+    """Fitted ordinal encoder + standard scaler with a fixed feature order."""
+
+    def __init__(self, numeric_features: list, categorical_features: list,
+                 mean: np.ndarray, scale: np.ndarray, categories: dict,
+                 train_ids: np.ndarray = None, test_ids: np.ndarray = None, info: dict = None):
+        self.numeric_features = list(numeric_features)
+        self.categorical_features = list(categorical_features)
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.categories_ = {col: np.asarray(cats, dtype=object) for col, cats in categories.items()}
+        self.train_ids = train_ids
+        self.test_ids = test_ids
+        self.info = info or {}
+        self._lookup = {col: {k: i for i, k in enumerate(cats)} for col, cats in self.categories_.items()}
+
+    @property
+    def feature_names(self) -> list:
+        return self.numeric_features + self.categorical_features
+
+    @property
+    def n_features(self) -> int:
+        return len(self.numeric_features) + len(self.categorical_features)
+
+    @classmethod
+    def fit(cls, X_train: pd.DataFrame, numeric_features: list = NUMERIC_FEATURES,
+            categorical_features: list = DETECTION_CATEGORICAL_FEATURES, **kwargs) -> 'FeaturePreprocessor':
+        num = X_train[numeric_features].to_numpy(dtype=np.float64)
+        mean = num.mean(axis=0)
+        scale = num.std(axis=0)
+        scale[scale == 0.0] = 1.0
+
+        categories = {}
+        for col in categorical_features:
+            _, keys = _column_keys(X_train[col])
+            categories[col] = np.array(sorted(set(keys)), dtype=object)
+        return cls(numeric_features, categorical_features, mean, scale, categories, **kwargs)
+
+    def transform(self, df: pd.DataFrame, out: np.ndarray = None, start: int = 0) -> np.ndarray:
+        """
+        Write the scaled/encoded features of `df` into rows
+        [start, start + len(df)) of `out` (a float32 matrix, allocated when
+        omitted). Each column is written in place; no full-width
+        intermediate arrays are built, so callers can stream chunks into
+        one preallocated matrix.
+        """
+        n = len(df)
+        if out is None:
+            out = np.empty((start + n, self.n_features), dtype=np.float32)
+        rows = out[start:start + n]
+
+        for j, col in enumerate(self.numeric_features):
+            values = df[col].to_numpy()
+            np.subtract(values, self.mean_[j], out=rows[:, j], casting='unsafe')
+            np.multiply(rows[:, j], np.float32(1.0 / self.scale_[j]), out=rows[:, j])
+
+        offset = len(self.numeric_features)
+        for j, col in enumerate(self.categorical_features):
+            codes, keys = _column_keys(df[col])
+            lookup = self._lookup[col]
+            mapped = np.array([lookup.get(k, -1) for k in keys] + [-1], dtype=np.float32)
+            np.take(mapped, codes, out=rows[:, offset + j])
+        return out
+
+    def transform_chunks(self, chunks, n_rows: int) -> np.ndarray:
+        """Transform an iterable of DataFrame chunks into one float32 matrix."""
+        out = np.empty((n_rows, self.n_features), dtype=np.float32)
+        start = 0
+        for chunk in chunks:
+            self.transform(chunk, out=out, start=start)
+            start += len(chunk)
+        return out[:start]
+
+    def fingerprint(self) -> str:
+        """Content hash of the fitted transform (not the split ids)."""
+        h = hashlib.sha256(json.dumps({
+            'version': PREPROCESSOR_VERSION,
+            'numeric': self.numeric_features,
+            'categorical': self.categorical_features,
+            'categories': {c: list(map(str, v)) for c, v in self.categories_.items()}
+        }, sort_keys=True).encode())
+        h.update(self.mean_.tobytes())
+        h.update(self.scale_.tobytes())
+        return h.hexdigest()[:16]
+
+    def save(self, path: str):
+        meta = {
+            'version': PREPROCESSOR_VERSION,
+            'numeric_features': self.numeric_features,
+            'categorical_features': self.categorical_features,
+            'categories': {c: list(map(str, v)) for c, v in self.categories_.items()},
+            'info': self.info,
+            'fingerprint': self.fingerprint()
+        }
+        arrays = {'mean': self.mean_, 'scale': self.scale_,
+                  'meta': np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)}
+        if self.train_ids is not None:
+            arrays['train_ids'] = np.asarray(self.train_ids, dtype=np.int64)
+        if self.test_ids is not None:
+            arrays['test_ids'] = np.asarray(self.test_ids, dtype=np.int64)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'FeaturePreprocessor':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].tobytes().decode())
+            if meta['version'] != PREPROCESSOR_VERSION:
+                raise ValueError(f"{path} is preprocessing artifact v{meta['version']}, "
+                                 f"expected v{PREPROCESSOR_VERSION}; refit it")
+            return cls(meta['numeric_features'], meta['categorical_features'],
+                       data['mean'], data['scale'], meta['categories'],
+                       train_ids=data['train_ids'] if 'train_ids' in data else None,
+                       test_ids=data['test_ids'] if 'test_ids' in data else None,
+                       info=meta['info'])
+
+
+def fit_from_flows(df: pd.DataFrame, test_size: float = TEST_SIZE, random_state: int = RANDOM_STATE,
+                   feature_set: str = 'detection') -> FeaturePreprocessor:
+    """
+    Fit `feature_set` and record the baseline notebook's stratified 70/30
+    split. Detection fits on the train split; clustering, like
+    Anomaly_Clustering_Analysis.ipynb, on an unstratified random sample of
+    the same size (`df.sample(frac=0.7, random_state=42)`).
+    """
+    from sklearn.model_selection import train_test_split
+
+    train_idx, test_idx = train_test_split(
+        np.arange(len(df)), test_size=test_size, random_state=random_state, stratify=df['attack']
+    )
+    if feature_set == 'clustering':
+        fit_rows, fit_on = df.sample(frac=1 - test_size, random_state=random_state), 'random_sample'
+    else:
+        fit_rows, fit_on = df.iloc[train_idx], 'train_split'
+    ids = df[ID_COLUMN].to_numpy()
+    numeric_features, categorical_features = FEATURE_SETS[feature_set]
+    return FeaturePreprocessor.fit(
+        fit_rows, numeric_features, categorical_features,
+        train_ids=ids[train_idx], test_ids=ids[test_idx],
+        info={'feature_set': feature_set, 'test_size': test_size, 'random_state': random_state,
+              'fit_on': fit_on, 'fit_rows': int(len(fit_rows)),
+              'train_rows': int(len(train_idx)), 'test_rows': int(len(test_idx))}
+    )
+
+
+def load_features_for_ids(flows: str, preprocessor: FeaturePreprocessor, ids,
+                          extra_columns: list = ('attack',)):
+    """
+    Fetch the flows named by `ids` (pkSeqID) from a flow store or CSV, in
+    `ids` order, and transform them. Returns (flows DataFrame, matrix).
+    """
+    from flow_store import load_flow_data
+
+    ids = np.asarray(ids, dtype=np.int64)
+    columns = list(dict.fromkeys([ID_COLUMN] + list(extra_columns) + preprocessor.feature_names))
+    df = load_flow_data(flows, columns=columns, filters=[(ID_COLUMN, 'in', ids.tolist())], compact=True)
+    missing = np.setdiff1d(ids, df[ID_COLUMN].to_numpy())
+    if len(missing):
+        raise KeyError(f"{len(missing):,} pkSeqIDs not found in {flows} (e.g. {missing[:5].tolist()})")
+    df = df.set_index(ID_COLUMN).loc[ids].reset_index()
+    with stage('preprocess.transform', rows_in=len(df)) as span:
+        X = preprocessor.transform(df)
+        span.rows_out = len(X)
+    return df, X
+
+
+def main():
+    from flow_store import load_flow_data
+
+    parser = argparse.ArgumentParser(description="Fit or inspect the feature-preprocessing artifact")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    fit = sub.add_parser('fit', help="Fit on the notebook's training rows and save")
+    fit.add_argument('flows', help="Flow store directory or subset CSV/Parquet")
+    fit.add_argument('--features', choices=list(FEATURE_SETS), default='detection',
+                     help="detection: baselines notebook features; clustering: clustering notebook features")
+    fit.add_argument('--output', default=None, help=f"Default: {' / '.join(PREPROCESSOR_FILES.values())}")
+    fit.add_argument('--test-size', type=float, default=TEST_SIZE)
+    fit.add_argument('--random-state', type=int, default=RANDOM_STATE)
+
+    info = sub.add_parser('info', help="Print artifact metadata")
+    info.add_argument('path')
+
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        output = args.output or PREPROCESSOR_FILES[args.features]
+        numeric_features, categorical_features = FEATURE_SETS[args.features]
+        columns = [ID_COLUMN, 'attack'] + numeric_features + categorical_features
+        df = load_flow_data(args.flows, columns=columns, compact=True)
+        with stage('preprocess.fit', rows_in=len(df), feature_set=args.features):
+            preprocessor = fit_from_flows(df, test_size=args.test_size, random_state=args.random_state,
+                                          feature_set=args.features)
+        preprocessor.save(output)
+        print(f"✓ Saved {args.features} preprocessing artifact ({preprocessor.fingerprint()}) to: {output}")
+        print(f"  Features: {len(preprocessor.numeric_features)} numeric + "
+              f"{len(preprocessor.categorical_features)} categorical")
+    else:
+        p = FeaturePreprocessor.load(args.path)
+        print(json.dumps({'fingerprint': p.fingerprint(), 'features': p.feature_names,
+                          'categories': {c: len(v) for c, v in p.categories_.items()},
+                          'info': p.info}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
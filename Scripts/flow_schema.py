@@ -0,0 +1,83 @@
+"""
+Column schema for the UNSW Bot-IoT flow CSVs.
+
+Declaring dtypes up front lets chunked readers skip pandas' type inference
+(and the mixed-type warnings that forced `low_memory=False` everywhere).
+"""
+
+# Column order as it appears in UNSW_2018_IoT_Botnet_Full5pc_*.csv
+BOT_IOT_COLUMNS = [
+    'pkSeqID', 'stime', 'flgs', 'flgs_number', 'proto', 'proto_number',
+    'saddr', 'sport', 'daddr', 'dport', 'pkts', 'bytes', 'state', 'state_number',
+    'ltime', 'seq', 'dur', 'mean', 'stddev', 'sum', 'min', 'max',
+    'spkts', 'dpkts', 'sbytes', 'dbytes', 'rate', 'srate', 'drate',
+    'TnBPSrcIP', 'TnBPDstIP', 'TnP_PSrcIP', 'TnP_PDstIP', 'TnP_PerProto', 'TnP_Per_Dport',
+    'AR_P_Proto_P_SrcIP', 'AR_P_Proto_P_DstIP', 'N_IN_Conn_P_DstIP', 'N_IN_Conn_P_SrcIP',
+    'AR_P_Proto_P_Sport', 'AR_P_Proto_P_Dport',
+    'Pkts_P_State_P_Protocol_P_DestIP', 'Pkts_P_State_P_Protocol_P_SrcIP',
+    'attack', 'category', 'subcategory'
+]
+
+# Ports stay strings: ICMP/ARP flows carry hex codes such as "0x0303"
+STRING_COLUMNS = ['flgs', 'proto', 'saddr', 'sport', 'daddr', 'dport', 'state', 'category', 'subcategory']
+
+INTEGER_COLUMNS = [
+    'pkSeqID', 'flgs_number', 'proto_number', 'pkts', 'bytes', 'state_number', 'seq',
+    'spkts', 'dpkts', 'sbytes', 'dbytes',
+    'TnBPSrcIP', 'TnBPDstIP', 'TnP_PSrcIP', 'TnP_PDstIP', 'TnP_PerProto', 'TnP_Per_Dport',
+    'N_IN_Conn_P_DstIP', 'N_IN_Conn_P_SrcIP', 'attack'
+]
+
+BOT_IOT_DTYPES = {
+    col: ('object' if col in STRING_COLUMNS else 'int64' if col in INTEGER_COLUMNS else 'float64')
+    for col in BOT_IOT_COLUMNS
+}
+
+# Feature groups used by the baselines and clustering notebooks
+LABEL_COLUMNS = ['attack', 'category', 'subcategory']
+ID_COLUMN = 'pkSeqID'
+# The clustering notebook names six categoricals; the baselines notebook
+# encodes every object column (flgs included) in CSV order
+CATEGORICAL_FEATURES = ['proto', 'state', 'saddr', 'sport', 'daddr', 'dport']
+DETECTION_CATEGORICAL_FEATURES = [col for col in BOT_IOT_COLUMNS if col in STRING_COLUMNS and col not in LABEL_COLUMNS]
+NUMERIC_FEATURES = [
+    col for col in BOT_IOT_COLUMNS
+    if col not in STRING_COLUMNS and col not in LABEL_COLUMNS and col != ID_COLUMN
+]
+
+# (numeric, categorical) per preprocessing artifact: 35 + 7 for the
+# IsolationForest/LOF baselines, 35 + 6 for clustering the top anomalies
+FEATURE_SETS = {
+    'detection': (NUMERIC_FEATURES, DETECTION_CATEGORICAL_FEATURES),
+    'clustering': (NUMERIC_FEATURES, CATEGORICAL_FEATURES)
+}
+
+
+def check_header(columns, source: str = '') -> None:
+    """Raise if a CSV header does not match the Bot-IoT schema."""
+    columns = list(columns)
+    if columns != BOT_IOT_COLUMNS:
+        missing = [c for c in BOT_IOT_COLUMNS if c not in columns]
+        extra = [c for c in columns if c not in BOT_IOT_COLUMNS]
+        raise ValueError(
+            f"Unexpected columns in {source or 'input'}: missing={missing}, extra={extra}"
+        )
+
+
+def iter_flow_chunks(path: str, chunksize: int, columns: list = None):
+    """
+    Yield DataFrame chunks from a Bot-IoT CSV or Parquet file using the
+    declared schema. Only `columns` are parsed when given.
+    """
+    import pandas as pd
+
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    dtypes = {c: t for c, t in BOT_IOT_DTYPES.items() if columns is None or c in columns}
+    with pd.read_csv(path, dtype=dtypes, usecols=columns, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk flow store.
+
+Written once from the balanced subset (or any Bot-IoT CSV/Parquet), then
+read by every stage instead of re-parsing the CSV:
+
+    store_dir/
+      flows.parquet   all columns, row groups carry min/max statistics
+      numeric.f8      float64 matrix of NUMERIC_FEATURES, row-major
+      meta.json       row count, column lists, source file
+
+`load_flows` reads only the requested columns and pushes row filters down
+to Parquet row groups; `load_numeric_block` memory-maps the numeric matrix
+without copying it.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import BOT_IOT_DTYPES, NUMERIC_FEATURES, iter_flow_chunks
+from flow_table import compact_flows
+from instrumentation import stage
+
+STORE_VERSION = 1
+CHUNK_SIZE = 250_000
+
+FLOWS_FILE = 'flows.parquet'
+NUMERIC_FILE = 'numeric.f8'
+META_FILE = 'meta.json'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("The flow store requires pyarrow (pip install pyarrow)")
+    return pq
+
+
+def is_flow_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def write_flow_store(source: str, store_dir: str, chunksize: int = CHUNK_SIZE) -> dict:
+    """Stream `source` into a new flow store at `store_dir`."""
+    pq = _require_pyarrow()
+    import pyarrow as pa
+
+    os.makedirs(store_dir, exist_ok=True)
+    flows_path = os.path.join(store_dir, FLOWS_FILE)
+    numeric_path = os.path.join(store_dir, NUMERIC_FILE)
+
+    rows = 0
+    writer = None
+    with open(numeric_path, 'wb') as numeric_out:
+        for chunk in iter_flow_chunks(source, chunksize):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(flows_path, table.schema)
+            writer.write_table(table.cast(writer.schema), row_group_size=chunksize)
+
+            block = np.ascontiguousarray(chunk[NUMERIC_FEATURES].to_numpy(dtype=np.float64))
+            numeric_out.write(block.tobytes())
+            rows += len(chunk)
+    if writer is not None:
+        writer.close()
+
+    meta = {
+        'version': STORE_VERSION,
+        'source': os.path.abspath(source),
+        'rows': rows,
+        'columns': list(pq.read_schema(flows_path).names) if rows else [],
+        'numeric_columns': NUMERIC_FEATURES,
+        'numeric_dtype': 'float64'
+    }
+    with open(os.path.join(store_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_meta(store_dir: str) -> dict:
+    with open(os.path.join(store_dir, META_FILE), 'r') as f:
+        meta = json.load(f)
+    if meta.get('version') != STORE_VERSION:
+        raise ValueError(f"Unsupported flow store version {meta.get('version')} in {store_dir}")
+    return meta
+
+
+def load_flows(store_dir: str, columns: list = None, filters: list = None,
+               compact: bool = False) -> pd.DataFrame:
+    """
+    Load flows from a store, reading only `columns` and skipping row groups
+    that cannot match `filters`. `compact=True` returns the packed
+    representation from flow_table.compact_flows.
+
+    `filters` uses the pyarrow DNF syntax, e.g.
+        [('attack', '==', 1)]
+        [('stime', '>=', t0), ('stime', '<', t1)]
+    """
+    pq = _require_pyarrow()
+    read_meta(store_dir)
+    table = pq.read_table(os.path.join(store_dir, FLOWS_FILE), columns=columns, filters=filters)
+    df = table.to_pandas()
+    return compact_flows(df) if compact else df
+
+
+def load_numeric_block(store_dir: str, columns: list = None):
+    """
+    Memory-map the numeric feature matrix (read-only, zero-copy).
+
+    Returns (matrix, column_names). Selecting `columns` returns a strided
+    view of the mapped block, still without copying.
+    """
+    meta = read_meta(store_dir)
+    matrix = np.memmap(os.path.join(store_dir, NUMERIC_FILE), dtype=meta['numeric_dtype'], mode='r',
+                       shape=(meta['rows'], len(meta['numeric_columns'])))
+    if columns is None:
+        return matrix, list(meta['numeric_columns'])
+    positions = [meta['numeric_columns'].index(c) for c in columns]
+    if positions == list(range(positions[0], positions[0] + len(positions))):
+        return matrix[:, positions[0]:positions[0] + len(positions)], list(columns)
+    return matrix[:, positions], list(columns)
+
+
+_OPS = {
+    '==': lambda s, v: s == v, '!=': lambda s, v: s != v,
+    '<': lambda s, v: s < v, '<=': lambda s, v: s <= v,
+    '>': lambda s, v: s > v, '>=': lambda s, v: s >= v,
+    'in': lambda s, v: s.isin(v), 'not in': lambda s, v: ~s.isin(v)
+}
+
+
+def load_flow_data(path: str, columns: list = None, filters: list = None,
+                   compact: bool = False) -> pd.DataFrame:
+    """
+    Load flows from a store directory, or fall back to a CSV/Parquet file
+    when no store has been written yet. Filters are applied either way.
+    """
+    with stage('load', source=os.path.basename(os.path.normpath(path)), filtered=bool(filters)) as span:
+        df = _load_flow_data(path, columns, filters, compact)
+        span.rows_out = len(df)
+    return df
+
+
+def _load_flow_data(path: str, columns: list, filters: list, compact: bool) -> pd.DataFrame:
+    if is_flow_store(path):
+        return load_flows(path, columns=columns, filters=filters, compact=compact)
+
+    if path.endswith('.parquet'):
+        pq = _require_pyarrow()
+        df = pq.read_table(path, columns=columns, filters=filters).to_pandas()
+        return compact_flows(df) if compact else df
+
+    usecols = None
+    if columns is not None:
+        usecols = list(dict.fromkeys(list(columns) + [f[0] for f in filters or []]))
+    if filters:
+        # Filtered CSV reads scan in chunks, so only matching rows are ever held in memory
+        filters = [(col, op, set(value) if op in ('in', 'not in') else value) for col, op, value in filters]
+        parts = []
+        for chunk in iter_flow_chunks(path, CHUNK_SIZE, columns=usecols):
+            mask = np.ones(len(chunk), dtype=bool)
+            for col, op, value in filters:
+                mask &= _OPS[op](chunk[col], value).to_numpy()
+            parts.append(chunk[mask])
+        df = pd.concat(parts, ignore_index=True) if parts else pd.read_csv(path, usecols=usecols, nrows=0)
+    else:
+        df = pd.read_csv(path, usecols=usecols,
+                         dtype={c: t for c, t in BOT_IOT_DTYPES.items() if usecols is None or c in usecols})
+    if columns is not None:
+        df = df[columns]
+    return compact_flows(df) if compact else df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a columnar flow store")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    write = sub.add_parser('write', help="Write a store from a Bot-IoT CSV/Parquet file")
+    write.add_argument('source')
+    write.add_argument('store_dir')
+    write.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+
+    info = sub.add_parser('info', help="Print store metadata")
+    info.add_argument('store_dir')
+
+    args = parser.parse_args()
+
+    if args.command == 'write':
+        print(f"Writing flow store from {args.source}...")
+        with stage('store.write') as span:
+            meta = write_flow_store(args.source, args.store_dir, chunksize=args.chunksize)
+            span.rows_out = meta['rows']
+        print(f"✓ {meta['rows']:,} rows → {args.store_dir}")
+    else:
+        meta = read_meta(args.store_dir)
+        print(json.dumps(meta, indent=2))
+
+
+if __name__ == '__main__':
+    main()
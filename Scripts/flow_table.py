@@ -0,0 +1,150 @@
+"""
+Compact, reversible in-memory representation of Bot-IoT flows.
+
+    saddr/daddr      -> uint32 (packed IPv4)
+    sport/dport      -> uint16
+    proto/state/...  -> pandas category (dictionary encoded)
+    integer counts   -> smallest integer type that holds the column
+    float features   -> float32 where the rounding error is negligible
+
+Columns that cannot be packed losslessly (IPv6/MAC addresses on ARP flows,
+hex ICMP "ports") are dictionary-encoded instead, so `decode_flows` always
+reproduces the original strings ("192.168.100.3", "80").
+"""
+
+import ipaddress
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import ID_COLUMN, STRING_COLUMNS
+
+IPV4_COLUMNS = ['saddr', 'daddr']
+PORT_COLUMNS = ['sport', 'dport']
+
+# A float column is stored as float32 when max |x - float32(x)| <= tol * std(x)
+FLOAT32_TOLERANCE = 1e-4
+
+
+def _pack_ipv4_uniques(uniques) -> np.ndarray:
+    packed = np.empty(len(uniques), dtype=np.uint32)
+    for i, value in enumerate(uniques):
+        addr = ipaddress.ip_address(value)
+        if addr.version != 4 or str(addr) != value:
+            raise ValueError(value)
+        packed[i] = int(addr)
+    return packed
+
+
+def _pack_port_uniques(uniques) -> np.ndarray:
+    packed = np.empty(len(uniques), dtype=np.uint16)
+    for i, value in enumerate(uniques):
+        port = int(value)
+        if not 0 <= port <= 65535 or str(port) != value:
+            raise ValueError(value)
+        packed[i] = port
+    return packed
+
+
+def _pack_via_uniques(series: pd.Series, pack) -> pd.Series:
+    """Pack a string column by converting its (few) unique values only."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    if (codes < 0).any():
+        raise ValueError('missing values')
+    packed = pack(uniques.astype(str))
+    return pd.Series(packed[codes], index=series.index, name=series.name)
+
+
+def _downcast_integer(values: np.ndarray) -> np.ndarray:
+    if values.size == 0:
+        return values
+    lo, hi = values.min(), values.max()
+    for dtype in (np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _float32_if_close(values: np.ndarray, tolerance: float) -> np.ndarray:
+    as32 = values.astype(np.float32)
+    err = np.abs(as32.astype(np.float64) - values)
+    finite = np.isfinite(values)
+    if not finite.any():
+        return as32
+    spread = np.std(values[finite])
+    if np.nanmax(err[finite]) <= tolerance * spread or np.nanmax(err[finite]) == 0:
+        return as32
+    return values
+
+
+def _is_text(series: pd.Series) -> bool:
+    return not isinstance(series.dtype, pd.CategoricalDtype) and (
+        series.dtype == object or pd.api.types.is_string_dtype(series.dtype))
+
+
+def compact_flows(df: pd.DataFrame, float_tolerance: float = FLOAT32_TOLERANCE) -> pd.DataFrame:
+    """Return a compact copy of a Bot-IoT flow DataFrame."""
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if col in IPV4_COLUMNS and _is_text(series):
+            try:
+                out[col] = _pack_via_uniques(series, _pack_ipv4_uniques)
+                continue
+            except ValueError:
+                out[col] = series.astype('category')
+                continue
+        if col in PORT_COLUMNS and _is_text(series):
+            try:
+                out[col] = _pack_via_uniques(series, _pack_port_uniques)
+                continue
+            except ValueError:
+                out[col] = series.astype('category')
+                continue
+        if col in STRING_COLUMNS or _is_text(series):
+            out[col] = series.astype('category')
+        elif col == ID_COLUMN:
+            out[col] = series
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            out[col] = pd.Series(_downcast_integer(series.to_numpy()), index=series.index, name=col)
+        elif pd.api.types.is_float_dtype(series.dtype):
+            out[col] = pd.Series(_float32_if_close(series.to_numpy(dtype=np.float64), float_tolerance),
+                                 index=series.index, name=col)
+        else:
+            out[col] = series
+    return pd.DataFrame(out, index=df.index)
+
+
+def _unpack_ipv4(values: np.ndarray) -> np.ndarray:
+    codes, uniques = pd.factorize(values)
+    return np.array([str(ipaddress.IPv4Address(int(v))) for v in uniques], dtype=object)[codes]
+
+
+def decode_value(col: str, value):
+    """Decode a single packed value back to its original string form."""
+    if col in IPV4_COLUMNS and isinstance(value, (int, np.integer)):
+        return str(ipaddress.IPv4Address(int(value)))
+    if col in PORT_COLUMNS and isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return value
+
+
+def decode_flows(df: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """Restore string identity columns (addresses, ports, categories)."""
+    out = df.copy()
+    for col in columns or df.columns:
+        series = out[col]
+        if col in IPV4_COLUMNS and series.dtype == np.uint32:
+            out[col] = _unpack_ipv4(series.to_numpy())
+        elif col in PORT_COLUMNS and series.dtype == np.uint16:
+            out[col] = series.astype(str).astype(object)
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            out[col] = series.astype(object)
+    return out
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> str:
+    b = before.memory_usage(deep=True).sum()
+    a = after.memory_usage(deep=True).sum()
+    return f"{b / 1024**2:.1f} MB → {a / 1024**2:.1f} MB ({b / max(a, 1):.1f}x smaller)"
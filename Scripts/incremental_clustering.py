@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Incremental clustering of anomalies with stable cluster IDs.
+
+cluster_profiles.json and the LLM interpretations are keyed by
+`cluster_<id>`, so cluster IDs must survive refits. This module keeps a
+persisted model that:
+
+  * assigns new anomalies to existing clusters (nearest centroid for
+    K-Means, hdbscan.approximate_predict for HDBSCAN) without re-clustering;
+  * fits K-Means exactly as the notebook and k_selection.py do
+    (KMeans, n_init=10, random_state=42) and updates the centroids in
+    place from new mini-batches (MiniBatchKMeans seeded from them);
+  * on a full refit, matches the new clusters to the previous ones
+    (Hungarian assignment on centroid distance) so matched clusters keep
+    their IDs and genuinely new clusters get fresh ones; with
+    --max-match-distance, a cluster whose centroid moved farther than
+    that is treated as new even if an old ID is free.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+MODEL_VERSION = 1
+METHODS = ['kmeans', 'hdbscan']
+ASSIGN_BATCH = 50_000
+# Clustering parameters the CLI can set on fit and change on refit
+FIT_PARAMS = ['n_clusters', 'min_cluster_size', 'min_samples', 'max_match_distance']
+
+
+def _require_hdbscan():
+    try:
+        import hdbscan
+    except ImportError:
+        raise ImportError("method='hdbscan' requires hdbscan (pip install hdbscan)")
+    return hdbscan
+
+
+def match_clusters(old_centroids: np.ndarray, new_centroids: np.ndarray, max_distance: float = None) -> dict:
+    """
+    Map new cluster positions to old ones by minimum total centroid distance.
+    Returns {new_position: old_position}; pairs farther apart than
+    `max_distance` are left unmatched.
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    if len(old_centroids) == 0 or len(new_centroids) == 0:
+        return {}
+    cost = np.linalg.norm(new_centroids[:, None, :] - old_centroids[None, :, :], axis=2)
+    rows, cols = linear_sum_assignment(cost)
+    return {int(r): int(c) for r, c in zip(rows, cols)
+            if max_distance is None or cost[r, c] <= max_distance}
+
+
+def nearest_centroid(X: np.ndarray, centroids: np.ndarray, batch_size: int = ASSIGN_BATCH) -> np.ndarray:
+    """Index of the nearest centroid for each row, computed in batches."""
+    c_sq = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(X), dtype=np.int64)
+    for start in range(0, len(X), batch_size):
+        batch = np.asarray(X[start:start + batch_size], dtype=np.float64)
+        d = c_sq[None, :] - 2.0 * batch @ centroids.T
+        labels[start:start + len(batch)] = np.argmin(d, axis=1)
+    return labels
+
+
+class IncrementalClusterModel:
+    """K-Means / HDBSCAN clustering whose cluster IDs are stable across refits."""
+
+    def __init__(self, method: str = 'kmeans', n_clusters: int = 3, random_state: int = 42,
+                 batch_size: int = 1024, n_init: int = 10,
+                 min_cluster_size: int = 50, min_samples: int = 10, max_match_distance: float = None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {METHODS}")
+        self.method = method
+        self.n_clusters = n_clusters
+        self.random_state = random_state
+        self.batch_size = batch_size
+        self.n_init = n_init
+        self.min_cluster_size = min_cluster_size
+        self.min_samples = min_samples
+        self.max_match_distance = max_match_distance
+
+        self.estimator_ = None
+        self.centroids_ = np.empty((0, 0))
+        self.cluster_ids_ = np.empty(0, dtype=np.int64)   # stable id of each centroid position
+        self.counts_ = np.empty(0, dtype=np.int64)
+        self.next_id_ = 0
+        self.generation_ = 0
+
+    # ------------------------------------------------------------- fitting
+    def _fit_estimator(self, X: np.ndarray):
+        if self.method == 'kmeans':
+            from sklearn.cluster import KMeans
+            est = KMeans(n_clusters=self.n_clusters, init='k-means++', random_state=self.random_state,
+                         n_init=self.n_init).fit(X)
+            return est, est.cluster_centers_.copy(), est.labels_
+
+        hdbscan = _require_hdbscan()
+        est = hdbscan.HDBSCAN(min_cluster_size=self.min_cluster_size, min_samples=self.min_samples,
+                              prediction_data=True).fit(X)
+        labels = est.labels_
+        n = labels.max() + 1
+        centroids = np.vstack([X[labels == c].mean(axis=0) for c in range(n)]) if n > 0 \
+            else np.empty((0, X.shape[1]))
+        return est, centroids, labels
+
+    def fit(self, X: np.ndarray) -> np.ndarray:
+        """
+        (Re)cluster X from scratch, keep IDs of clusters that match the
+        previous generation, and return stable labels (-1 = noise).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        est, centroids, positions = self._fit_estimator(X)
+
+        mapping = match_clusters(self.centroids_, centroids, self.max_match_distance) \
+            if self.generation_ else {}
+        ids = np.empty(len(centroids), dtype=np.int64)
+        for pos in range(len(centroids)):
+            if pos in mapping:
+                ids[pos] = self.cluster_ids_[mapping[pos]]
+            else:
+                ids[pos] = self.next_id_
+                self.next_id_ += 1
+
+        self.estimator_ = est
+        self.centroids_ = centroids
+        self.cluster_ids_ = ids
+        self.counts_ = np.bincount(positions[positions >= 0], minlength=len(centroids)).astype(np.int64)
+        self.generation_ += 1
+        return self._to_ids(positions)
+
+    def partial_fit(self, X: np.ndarray) -> np.ndarray:
+        """
+        Mini-batch centroid update (K-Means only). Centroid positions, and
+        therefore IDs, are unchanged; returns stable labels for X.
+        """
+        if self.method != 'kmeans':
+            raise ValueError("partial_fit is only supported for K-Means; use assign() for HDBSCAN")
+        if self.estimator_ is None:
+            return self.fit(X)
+        X = np.asarray(X, dtype=np.float64)
+        if not hasattr(self.estimator_, 'partial_fit'):
+            self.estimator_ = self._minibatch_estimator()
+        self.estimator_.partial_fit(X)
+        self.centroids_ = self.estimator_.cluster_centers_.copy()
+        positions = nearest_centroid(X, self.centroids_)
+        self.counts_ += np.bincount(positions, minlength=len(self.centroids_))
+        return self._to_ids(positions)
+
+    def _minibatch_estimator(self):
+        """
+        MiniBatchKMeans starting at the current centroids with their counts,
+        so the first batch moves them by its share of the data instead of
+        replacing them. No random reassignment: positions keep their IDs.
+        """
+        from sklearn.cluster import MiniBatchKMeans
+
+        est = MiniBatchKMeans(n_clusters=len(self.centroids_), init=self.centroids_, n_init=1,
+                              batch_size=self.batch_size, random_state=self.random_state,
+                              reassignment_ratio=0.0)
+        # Each centroid is its own nearest centre, so this only sets the counts
+        return est.partial_fit(self.centroids_, sample_weight=self.counts_.astype(np.float64))
+
+    # ----------------------------------------------------------- assigning
+    def assign(self, X: np.ndarray) -> np.ndarray:
+        """Stable cluster IDs for new rows, without changing the model."""
+        if self.estimator_ is None:
+            raise ValueError("Model is not fitted")
+        if self.method == 'kmeans':
+            return self._to_ids(nearest_centroid(X, self.centroids_))
+        hdbscan = _require_hdbscan()
+        positions, _ = hdbscan.approximate_predict(self.estimator_, np.asarray(X, dtype=np.float64))
+        return self._to_ids(positions)
+
+    def _to_ids(self, positions: np.ndarray) -> np.ndarray:
+        positions = np.asarray(positions)
+        out = np.full(len(positions), -1, dtype=np.int64)
+        valid = positions >= 0
+        out[valid] = self.cluster_ids_[positions[valid]]
+        return out
+
+    # --------------------------------------------------------- persistence
+    def save(self, model_dir: str):
+        import joblib
+
+        os.makedirs(model_dir, exist_ok=True)
+        state = {
+            'version': MODEL_VERSION, 'method': self.method, 'n_clusters': self.n_clusters,
+            'random_state': self.random_state, 'batch_size': self.batch_size, 'n_init': self.n_init,
+            'min_cluster_size': self.min_cluster_size, 'min_samples': self.min_samples,
+            'max_match_distance': self.max_match_distance,
+            'cluster_ids': self.cluster_ids_.tolist(), 'counts': self.counts_.tolist(),
+            'next_id': self.next_id_, 'generation': self.generation_
+        }
+        with open(os.path.join(model_dir, 'clusters.json'), 'w') as f:
+            json.dump(state, f, indent=2)
+        np.save(os.path.join(model_dir, 'centroids.npy'), self.centroids_)
+        joblib.dump(self.estimator_, os.path.join(model_dir, 'estimator.joblib'))
+
+    @classmethod
+    def load(cls, model_dir: str) -> 'IncrementalClusterModel':
+        import joblib
+
+        with open(os.path.join(model_dir, 'clusters.json'), 'r') as f:
+            state = json.load(f)
+        if state['version'] != MODEL_VERSION:
+            raise ValueError(f"Cluster model v{state['version']} in {model_dir}, expected v{MODEL_VERSION}")
+        model = cls(method=state['method'], n_clusters=state['n_clusters'],
+                    random_state=state['random_state'], batch_size=state['batch_size'],
+                    n_init=state['n_init'], min_cluster_size=state['min_cluster_size'],
+                    min_samples=state['min_samples'], max_match_distance=state['max_match_distance'])
+        model.cluster_ids_ = np.array(state['cluster_ids'], dtype=np.int64)
+        model.counts_ = np.array(state['counts'], dtype=np.int64)
+        model.next_id_ = state['next_id']
+        model.generation_ = state['generation']
+        model.centroids_ = np.load(os.path.join(model_dir, 'centroids.npy'))
+        model.estimator_ = joblib.load(os.path.join(model_dir, 'estimator.joblib'))
+        return model
+
+
+def main():
+    from feature_preprocessing import FeaturePreprocessor, load_features_for_ids
+
+    parser = argparse.ArgumentParser(description="Incremental anomaly clustering with stable cluster IDs")
+    parser.add_argument('command', choices=['fit', 'refit', 'update', 'assign'],
+                        help="fit: new model; refit: recluster keeping IDs; "
+                             "update: mini-batch centroid update; assign: label only")
+    parser.add_argument('anomalies', help="CSV with a pkSeqID column (e.g. the top-K anomalies)")
+    parser.add_argument('--flows', required=True, help="Flow store directory or subset CSV/Parquet")
+    parser.add_argument('--preprocessor', required=True)
+    parser.add_argument('--model', required=True, help="Cluster model directory")
+    parser.add_argument('--method', choices=METHODS, default='kmeans')
+    parser.add_argument('--n-clusters', type=int, default=None, help="Default: 3 (refit: the saved model's)")
+    parser.add_argument('--min-cluster-size', type=int, default=None, help="Default: 50 (refit: the saved model's)")
+    parser.add_argument('--min-samples', type=int, default=None, help="Default: 10 (refit: the saved model's)")
+    parser.add_argument('--max-match-distance', type=float, default=None,
+                        help="Refit: clusters whose centroids moved farther than this get new IDs "
+                             "(default: match every cluster while old IDs are free)")
+    parser.add_argument('--output', default='cluster_assignments.csv')
+    args = parser.parse_args()
+    overrides = {name: getattr(args, name) for name in FIT_PARAMS if getattr(args, name) is not None}
+    if overrides and args.command in ('update', 'assign'):
+        parser.error(f"{args.command} keeps the saved model's clusters; "
+                     f"--{'/--'.join(n.replace('_', '-') for n in overrides)} only apply to fit and refit")
+
+    ids = pd.read_csv(args.anomalies, usecols=['pkSeqID'])['pkSeqID'].to_numpy()
+    _, X = load_features_for_ids(args.flows, FeaturePreprocessor.load(args.preprocessor), ids)
+
+    with stage(f"cluster.{args.command}", rows_in=len(X)) as span:
+        if args.command == 'fit':
+            model = IncrementalClusterModel(method=args.method, **overrides)
+            labels = model.fit(X)
+        else:
+            model = IncrementalClusterModel.load(args.model)
+            if args.command == 'refit':
+                for name, value in overrides.items():
+                    setattr(model, name, value)
+                labels = model.fit(X)
+            elif args.command == 'update':
+                labels = model.partial_fit(X)
+            else:
+                labels = model.assign(X)
+        span.rows_out = len(labels)
+        span.extra.update(method=model.method, clusters=int(len(np.unique(labels[labels != -1]))),
+                          clustered=int((labels != -1).sum()))
+
+    if args.command != 'assign':
+        model.save(args.model)
+
+    pd.DataFrame({'pkSeqID': ids, 'cluster': labels}).to_csv(args.output, index=False)
+    print(f"✓ {args.command}: {len(ids):,} anomalies → {args.output} (generation {model.generation_})")
+    for cid, count in zip(*np.unique(labels, return_counts=True)):
+        name = 'noise' if cid == -1 else f'cluster_{cid}'
+        print(f"  {name}: {count:,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Lightweight per-stage performance instrumentation.
+
+    from instrumentation import stage
+
+    with stage('lof.fit', rows_in=len(X_train)) as s:
+        engine.fit(X_train)
+        s.rows_out = len(X_train)
+
+Tracing is off unless `enable(path)` is called or the PIPELINE_TRACE
+environment variable names a trace file (pipeline.py --trace sets it per
+stage); a disabled `stage` only yields a throwaway Span. An enabled span
+records wall time, CPU time (including reaped child processes), peak RSS,
+rows in/out and any `extra` fields, and the spans are written as one JSON
+trace when the process exits. The span named by PIPELINE_PROFILE (or
+`enable(profile=...)`) additionally runs under cProfile.
+
+On Linux the RSS high-water mark is reset at every span start through
+/proc/self/clear_refs, so `peak_rss_mb` is the peak during the span.
+Elsewhere it is the process peak so far (`peak_rss_scope: 'process'`).
+"""
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_VERSION = 1
+TRACE_ENV = 'PIPELINE_TRACE'
+PROFILE_ENV = 'PIPELINE_PROFILE'
+PROFILE_TOP = 25
+
+
+def _read_hwm_mb():
+    """VmHWM of this process in MB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_hwm() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _maxrss_mb(who=None):
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _children_cpu() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentiles(values, qs=(50, 90, 99)) -> dict:
+    """{'p50': ..., ...} with linear interpolation (numpy's default), plus count/mean/max."""
+    data = sorted(values)
+    if not data:
+        return {'count': 0}
+    out = {'count': len(data), 'mean': sum(data) / len(data), 'max': data[-1]}
+    for q in qs:
+        pos = (len(data) - 1) * q / 100
+        lo = int(pos)
+        hi = min(lo + 1, len(data) - 1)
+        out[f"p{q}"] = data[lo] + (data[hi] - data[lo]) * (pos - lo)
+    return out
+
+
+class Span:
+    """Counters a stage fills in while it runs."""
+
+    def __init__(self, name: str, rows_in: int = None, **extra):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.extra = dict(extra)
+        self._peak = 0.0
+
+
+class Tracer:
+    """Collects spans of one process and writes them as a JSON trace."""
+
+    def __init__(self, path: str, profile: str = None):
+        self.path = path
+        self.profile = profile
+        self.spans = []
+        self.profiles = {}
+        self._open = []
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self._hwm_reset = _reset_hwm()
+
+    def _fold_hwm(self):
+        """Credit the current high-water mark to every open span."""
+        hwm = _read_hwm_mb() if self._hwm_reset else _maxrss_mb()
+        if hwm is not None:
+            for span in self._open:
+                span._peak = max(span._peak, hwm)
+        return hwm
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None, **extra):
+        span = Span(name, rows_in, **extra)
+        self._fold_hwm()
+        self._open.append(span)
+        if self._hwm_reset:
+            _reset_hwm()
+        profiler = None
+        if self.profile == name:
+            import cProfile
+            profiler = cProfile.Profile()
+        wall, cpu, child_cpu = time.perf_counter(), time.process_time(), _children_cpu()
+        if profiler:
+            profiler.enable()
+        try:
+            yield span
+        finally:
+            if profiler:
+                profiler.disable()
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu + _children_cpu() - child_cpu
+            self._fold_hwm()
+            self._open.pop()
+            record = {
+                'name': span.name,
+                'depth': len(self._open),
+                'start_s': round(time.perf_counter() - wall - self._started, 6),
+                'wall_s': round(wall, 6),
+                'cpu_s': round(cpu, 6),
+                'peak_rss_mb': round(span._peak, 1) if span._peak else None,
+                'rows_in': span.rows_in,
+                'rows_out': span.rows_out
+            }
+            rows = span.rows_out if span.rows_out is not None else span.rows_in
+            if rows is not None and wall > 0:
+                record['rows_per_s'] = round(rows / wall, 1)
+            if span.extra:
+                record['extra'] = span.extra
+            self.spans.append(record)
+            if profiler:
+                self.profiles[name] = self._save_profile(profiler, name)
+
+    def _save_profile(self, profiler, name: str) -> dict:
+        import pstats
+
+        prof_path = f"{os.path.splitext(self.path)[0]}.{name}.prof"
+        profiler.dump_stats(prof_path)
+        stats = pstats.Stats(profiler).stats
+        top = sorted(stats.items(), key=lambda kv: kv[1][3], reverse=True)[:PROFILE_TOP]
+        return {
+            'path': prof_path,
+            'top_cumulative': [{'function': f"{os.path.basename(f)}:{line}({func})", 'ncalls': nc,
+                                'tottime': round(tt, 6), 'cumtime': round(ct, 6)}
+                               for (f, line, func), (cc, nc, tt, ct, _) in top]
+        }
+
+    def record(self) -> dict:
+        return {
+            'version': TRACE_VERSION,
+            'argv': sys.argv,
+            'pid': os.getpid(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'started': self._started_at,
+            'wall_s': round(time.perf_counter() - self._started, 6),
+            'cpu_s': round(time.process_time() - self._started_cpu, 6),
+            'max_rss_mb': _maxrss_mb(),
+            'peak_rss_scope': 'span' if self._hwm_reset else 'process',
+            'spans': self.spans,
+            'profiles': self.profiles
+        }
+
+    def write(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.record(), f, indent=2, default=str)
+        os.replace(tmp, self.path)
+
+
+_TRACER = None
+
+
+def enable(path: str, profile: str = None) -> Tracer:
+    """Start tracing this process; the trace is written to `path` at exit."""
+    global _TRACER
+    if _TRACER is None:
+        _TRACER = Tracer(path, profile)
+        atexit.register(_TRACER.write)
+    return _TRACER
+
+
+def get_tracer():
+    return _TRACER
+
+
+@contextmanager
+def stage(name: str, rows_in: int = None, **extra):
+    """Instrument a block; a no-op Span when tracing is disabled."""
+    if _TRACER is None:
+        yield Span(name, rows_in, **extra)
+    else:
+        with _TRACER.stage(name, rows_in, **extra) as span:
+            yield span
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV], os.environ.get(PROFILE_ENV) or None)
+
+
+def _fmt(value, spec: str) -> str:
+    return '-' if value is None else format(value, spec)
+
+
+def print_trace(trace: dict):
+    """One row per span, indented by nesting depth, in start order."""
+    print(f"{'span':34s} {'wall s':>9s} {'cpu s':>9s} {'peak MB':>9s} {'rows in':>11s} {'rows out':>11s}")
+    for span in sorted(trace['spans'], key=lambda s: s['start_s']):
+        name = '  ' * span['depth'] + span['name']
+        print(f"{name:34s} {span['wall_s']:9.3f} {span['cpu_s']:9.3f} {_fmt(span['peak_rss_mb'], '9.1f')} "
+              f"{_fmt(span['rows_in'], '11,d')} {_fmt(span['rows_out'], '11,d')}")
+        latency = span.get('extra', {}).get('latency')
+        if latency and latency.get('count'):
+            print(f"{'':34s} latency p50={latency['p50']:.3f}s p90={latency['p90']:.3f}s "
+                  f"p99={latency['p99']:.3f}s over {latency['count']} calls")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize instrumentation traces")
+    parser.add_argument('traces', nargs='+', help="Trace JSON files (per process or per pipeline run)")
+    args = parser.parse_args()
+
+    for path in args.traces:
+        with open(path, 'r') as f:
+            trace = json.load(f)
+        print("=" * 80)
+        print(f"TRACE: {path}")
+        print("=" * 80)
+        # A pipeline run trace nests one process trace per stage
+        for name, entry in trace.get('stages', {'': {'trace': trace}}).items():
+            if name:
+                print(f"\n[{name}] {entry['status']}" + (
+                    f": wall {entry['wall_s']:.2f}s, cpu {entry['cpu_s']:.2f}s, "
+                    f"peak RSS {_fmt(entry['peak_rss_mb'], '.1f')} MB" if entry.get('wall_s') is not None else ''))
+            if entry.get('trace'):
+                print_trace(entry['trace'])
+
+
+if __name__ == '__main__':
+    main()
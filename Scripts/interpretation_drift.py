@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Drift-aware re-interpretation of clusters.
+
+Each interpretation is tied to the cluster profile that produced it. The
+interpretation state file records that profile per cluster; on the next
+run a new profile is compared with it and the LLM is only re-queried when
+the cluster has drifted past a threshold:
+
+    size          relative change in cluster size
+    lof_score     largest relative change of the LOF mean / median / max
+    numeric_mean  largest shift of a numeric feature mean, in units of the
+                  old standard deviation
+    categorical   largest total-variation distance between the old and new
+                  top-N value shares of a categorical feature (a changed
+                  dominant value always counts as drift)
+
+Stable clusters carry their previous interpretations forward unchanged.
+"""
+
+import argparse
+import json
+import os
+
+STATE_VERSION = 1
+DRIFT_THRESHOLDS = {
+    'size': 0.10,
+    'lof_score': 0.10,
+    'numeric_mean': 0.25,
+    'categorical': 0.20
+}
+
+
+def _relative(old, new) -> float:
+    if old is None or new is None:
+        return 0.0 if old == new else float('inf')
+    return abs(new - old) / max(abs(old), 1e-12)
+
+
+def _shares(dist: dict) -> dict:
+    total = sum(dist.values())
+    return {str(k): v / total for k, v in dist.items()} if total else {}
+
+
+def profile_drift(old: dict, new: dict) -> dict:
+    """Drift measures between two profiles of the same cluster."""
+    old_lof, new_lof = old.get('lof_score_stats', {}), new.get('lof_score_stats', {})
+    lof = max((_relative(old_lof.get(s), new_lof.get(s)) for s in ('mean', 'median', 'max')
+               if s in old_lof or s in new_lof), default=0.0)
+
+    numeric, numeric_feature = 0.0, None
+    old_num, new_num = old.get('numeric_stats', {}), new.get('numeric_stats', {})
+    for feat in set(old_num) | set(new_num):
+        if feat not in old_num or feat not in new_num:
+            numeric, numeric_feature = float('inf'), feat
+            break
+        o, n = old_num[feat], new_num[feat]
+        if o.get('mean') is None or n.get('mean') is None:
+            continue
+        scale = o.get('std') or abs(o['mean']) or 1.0
+        shift = abs(n['mean'] - o['mean']) / scale
+        if shift > numeric:
+            numeric, numeric_feature = shift, feat
+
+    categorical, categorical_feature = 0.0, None
+    old_cat, new_cat = old.get('categorical_dist', {}), new.get('categorical_dist', {})
+    for feat in set(old_cat) | set(new_cat):
+        o, n = _shares(old_cat.get(feat, {})), _shares(new_cat.get(feat, {}))
+        if (max(o, key=o.get) if o else None) != (max(n, key=n.get) if n else None):
+            tvd = 1.0
+        else:
+            tvd = 0.5 * sum(abs(o.get(k, 0.0) - n.get(k, 0.0)) for k in set(o) | set(n))
+        if tvd > categorical:
+            categorical, categorical_feature = tvd, feat
+
+    return {
+        'size': _relative(old.get('size'), new.get('size')),
+        'lof_score': lof,
+        'numeric_mean': numeric, 'numeric_feature': numeric_feature,
+        'categorical': categorical, 'categorical_feature': categorical_feature
+    }
+
+
+def drift_reasons(drift: dict, thresholds: dict = DRIFT_THRESHOLDS) -> list:
+    """Names of the measures that exceed their threshold."""
+    return [name for name, limit in thresholds.items() if drift[name] > limit]
+
+
+def load_state(path: str) -> dict:
+    """{cluster key: {'profile': ..., 'personas': [...]}}; empty when missing."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"{path} is interpretation state v{state.get('version')}, expected v{STATE_VERSION}")
+    return state['clusters']
+
+
+def save_state(path: str, clusters: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'version': STATE_VERSION, 'clusters': clusters}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def plan(profiles: list, state: dict, previous: dict, persona_keys: list,
+         thresholds: dict = DRIFT_THRESHOLDS) -> dict:
+    """
+    Decide, per cluster, whether to re-query the LLM.
+
+    `previous` is the last llm_multi_persona_analysis.json. A cluster is
+    carried forward only if it has a recorded profile, every requested
+    persona has a previous interpretation, and no drift measure exceeds its
+    threshold. Returns {cluster key: {'requery': bool, 'reasons': [...],
+    'drift': {...} or None}}.
+    """
+    decisions = {}
+    for profile in profiles:
+        key = f"cluster_{profile['cluster_id']}"
+        entry = state.get(key)
+        if entry is None:
+            decisions[key] = {'requery': True, 'reasons': ['new'], 'drift': None}
+            continue
+        missing = [p for p in persona_keys if p not in previous.get(key, {})]
+        drift = profile_drift(entry['profile'], profile)
+        reasons = drift_reasons(drift, thresholds) + (['missing_personas'] if missing else [])
+        decisions[key] = {'requery': bool(reasons), 'reasons': reasons, 'drift': drift}
+    return decisions
+
+
+def print_plan(decisions: dict):
+    requery = [k for k, d in decisions.items() if d['requery']]
+    print(f"Drift check: {len(requery)} of {len(decisions)} clusters need re-interpretation")
+    for key, d in decisions.items():
+        status = 'requery' if d['requery'] else 'stable '
+        detail = ''
+        if d['drift'] is not None:
+            x = d['drift']
+            detail = (f"size={x['size']:.3f} lof={x['lof_score']:.3f} "
+                      f"num={x['numeric_mean']:.3f}({x['numeric_feature']}) "
+                      f"cat={x['categorical']:.3f}({x['categorical_feature']})")
+        print(f"  {status} {key}: {detail} {', '.join(d['reasons'])}".rstrip())
+
+
+def add_threshold_args(parser: argparse.ArgumentParser):
+    for name, default in DRIFT_THRESHOLDS.items():
+        parser.add_argument(f"--drift-{name.replace('_', '-')}", type=float, default=default,
+                            dest=f"drift_{name}", help=f"Re-query threshold for {name} drift")
+
+
+def thresholds_from_args(args) -> dict:
+    return {name: getattr(args, f"drift_{name}") for name in DRIFT_THRESHOLDS}
+
+
+def main():
+    from personas import PERSONAS
+
+    parser = argparse.ArgumentParser(description="Report which clusters drifted since their last interpretation")
+    parser.add_argument('--profiles', default='cluster_profiles.json')
+    parser.add_argument('--state', default='llm_interpretation_state.json')
+    parser.add_argument('--previous', default='llm_multi_persona_analysis.json')
+    parser.add_argument('--personas', nargs='+', choices=list(PERSONAS), default=list(PERSONAS))
+    add_threshold_args(parser)
+    args = parser.parse_args()
+
+    with open(args.profiles, 'r') as f:
+        profiles = json.load(f)
+    previous = {}
+    if os.path.exists(args.previous):
+        with open(args.previous, 'r') as f:
+            previous = json.load(f)
+    print_plan(plan(profiles, load_state(args.state), previous, args.personas, thresholds_from_args(args)))
+
+
+if __name__ == '__main__':
+    main()
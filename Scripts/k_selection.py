@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Parallel, sampled k-selection sweep (elbow + silhouette).
+
+Replaces the notebook loop that fits K-Means and runs a full O(n^2)
+`silhouette_score` for every candidate k:
+
+  * candidate k values are fitted in parallel worker processes, which read
+    the feature matrix from one memory-mapped file;
+  * silhouettes are estimated on a per-k stratified sample (a fixed number
+    of rows from each cluster). Distances from the union of all samples to
+    every row are computed once, chunk by chunk, and shared by all k;
+  * each estimate comes with a 95% confidence interval from the stratified
+    variance. When the sample covers every row the value is exact.
+
+Davies-Bouldin and Calinski-Harabasz are linear in n and stay exact, so the
+output is the same inertia/silhouette/DB/CH table as before.
+"""
+
+import argparse
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+K_RANGE = range(3, 11)
+SAMPLE_PER_CLUSTER = 1000
+WORKING_MEMORY_MB = 256
+RANDOM_STATE = 42
+
+_X = None
+
+
+def _init_worker(matrix_path: str, threads: int):
+    global _X
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=threads)
+    _X = np.load(matrix_path, mmap_mode='r')
+
+
+def _fit_k(job: tuple) -> tuple:
+    k, n_init, random_state = job
+    from sklearn.cluster import KMeans
+    model = KMeans(n_clusters=k, random_state=random_state, n_init=n_init).fit(_X)
+    return k, model.labels_.astype(np.int32), float(model.inertia_)
+
+
+def fit_candidates(X: np.ndarray, k_values, n_init: int = 10, random_state: int = RANDOM_STATE,
+                   workers: int = None) -> dict:
+    """Fit K-Means for every k in parallel. Returns {k: (labels, inertia)}."""
+    k_values = list(k_values)
+    workers = workers or min(len(k_values), os.cpu_count() or 1)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with tempfile.TemporaryDirectory(prefix='ksweep_') as tmp:
+        matrix_path = os.path.join(tmp, 'X.npy')
+        np.save(matrix_path, np.ascontiguousarray(X))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(matrix_path, threads)) as pool:
+            results = pool.map(_fit_k, [(k, n_init, random_state) for k in k_values])
+            return {k: (labels, inertia) for k, labels, inertia in results}
+
+
+def stratified_sample(labels: np.ndarray, per_cluster: int, rng: np.random.Generator) -> np.ndarray:
+    """Up to `per_cluster` random rows from every cluster (noise excluded)."""
+    picks = []
+    for c in np.unique(labels[labels >= 0]):
+        members = np.flatnonzero(labels == c)
+        picks.append(members if len(members) <= per_cluster
+                     else rng.choice(members, size=per_cluster, replace=False))
+    return np.sort(np.concatenate(picks)) if picks else np.empty(0, dtype=np.int64)
+
+
+def sampled_silhouettes(X: np.ndarray, labelings: dict, per_cluster: int = SAMPLE_PER_CLUSTER,
+                        random_state: int = RANDOM_STATE, working_memory_mb: int = WORKING_MEMORY_MB) -> dict:
+    """
+    Stratified-sample silhouette estimates for several labelings of X.
+
+    `labelings` maps a key (e.g. k) to a label array; -1 marks noise and is
+    excluded, as in the notebook's HDBSCAN scoring. Returns
+    {key: (estimate, ci_low, ci_high, n_sampled)}.
+    """
+    from scipy import sparse
+    from sklearn.metrics import euclidean_distances
+
+    rng = np.random.default_rng(random_state)
+    samples = {key: stratified_sample(labels, per_cluster, rng) for key, labels in labelings.items()}
+    union = np.unique(np.concatenate([s for s in samples.values()] + [np.empty(0, dtype=np.int64)]))
+
+    prepared = {}
+    for key, labels in labelings.items():
+        valid = np.flatnonzero(labels >= 0)
+        clusters, dense = np.unique(labels[valid], return_inverse=True)
+        onehot = sparse.csr_matrix((np.ones(len(valid)), (valid, dense)), shape=(len(X), len(clusters)))
+        dense_labels = np.full(len(X), -1, dtype=np.int64)
+        dense_labels[valid] = dense
+        prepared[key] = (onehot, np.bincount(dense, minlength=len(clusters)).astype(np.float64), dense_labels)
+
+    # One (chunk x n) distance block at a time, shared by every labeling
+    chunk_rows = max(1, (working_memory_mb * 1024 ** 2) // (8 * len(X)))
+    s_values = {key: np.full(len(union), np.nan) for key in labelings}
+    X_sq = np.einsum('ij,ij->i', X, X)
+    for start in range(0, len(union), chunk_rows):
+        rows = union[start:start + chunk_rows]
+        D = euclidean_distances(X[rows], X, Y_norm_squared=X_sq[None, :])
+        for key, (onehot, sizes, dense_labels) in prepared.items():
+            if sizes.size < 2:
+                continue
+            sums = np.asarray(D @ onehot)
+            own = dense_labels[rows]
+            own_valid = own >= 0
+            own = np.where(own_valid, own, 0)
+            own_size = sizes[own]
+            a = sums[np.arange(len(rows)), own] / np.maximum(own_size - 1, 1)
+            other = sums / sizes[None, :]
+            other[np.arange(len(rows)), own] = np.inf
+            b = other.min(axis=1)
+            s = np.where(own_size > 1, (b - a) / np.maximum(np.maximum(a, b), 1e-300), 0.0)
+            s_values[key][start:start + len(rows)] = np.where(own_valid, s, np.nan)
+
+    out = {}
+    for key, labels in labelings.items():
+        sample = samples[key]
+        if len(sample) == 0 or prepared[key][1].size < 2:
+            out[key] = (-1.0, -1.0, -1.0, 0)
+            continue
+        s = s_values[key][np.searchsorted(union, sample)]
+        strata = labels[sample]
+        total = (labels >= 0).sum()
+        est, var = 0.0, 0.0
+        for c in np.unique(strata):
+            s_h = s[strata == c]
+            N_h = (labels == c).sum()
+            W_h = N_h / total
+            est += W_h * s_h.mean()
+            if len(s_h) > 1:
+                var += W_h ** 2 * (1 - len(s_h) / N_h) * s_h.var(ddof=1) / len(s_h)
+        half = 1.96 * np.sqrt(var)
+        out[key] = (float(est), float(est - half), float(est + half), int(len(sample)))
+    return out
+
+
+def score_labeling(X: np.ndarray, labels: np.ndarray, per_cluster: int = SAMPLE_PER_CLUSTER,
+                   random_state: int = RANDOM_STATE) -> dict:
+    """Sampled silhouette + exact DB/CH for one labeling (noise excluded), e.g. HDBSCAN."""
+    from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score
+
+    valid = labels >= 0
+    est, lo, hi, n = sampled_silhouettes(X, {'labels': labels}, per_cluster, random_state)['labels']
+    if len(np.unique(labels[valid])) < 2:
+        return {'silhouette': -1.0, 'silhouette_ci_low': -1.0, 'silhouette_ci_high': -1.0,
+                'davies_bouldin': -1.0, 'calinski_harabasz': -1.0, 'silhouette_sample': 0}
+    return {
+        'silhouette': est, 'silhouette_ci_low': lo, 'silhouette_ci_high': hi,
+        'davies_bouldin': float(davies_bouldin_score(X[valid], labels[valid])),
+        'calinski_harabasz': float(calinski_harabasz_score(X[valid], labels[valid])),
+        'silhouette_sample': n
+    }
+
+
+def k_sweep(X: np.ndarray, k_values=K_RANGE, n_init: int = 10, random_state: int = RANDOM_STATE,
+            workers: int = None, per_cluster: int = SAMPLE_PER_CLUSTER):
+    """
+    Full model-selection table. Returns (table, {k: labels}).
+    """
+    from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score
+
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    fitted = fit_candidates(X, k_values, n_init=n_init, random_state=random_state, workers=workers)
+    labelings = {k: labels for k, (labels, _) in fitted.items()}
+    silhouettes = sampled_silhouettes(X, labelings, per_cluster, random_state)
+
+    rows = []
+    for k in k_values:
+        labels, inertia = fitted[k]
+        sil, lo, hi, n = silhouettes[k]
+        rows.append({
+            'k': k, 'inertia': inertia, 'silhouette': sil,
+            'silhouette_ci_low': lo, 'silhouette_ci_high': hi, 'silhouette_sample': n,
+            'davies_bouldin': davies_bouldin_score(X, labels),
+            'calinski_harabasz': calinski_harabasz_score(X, labels)
+        })
+    return pd.DataFrame(rows), labelings
+
+
+def main():
+    from feature_preprocessing import FeaturePreprocessor, load_features_for_ids
+
+    parser = argparse.ArgumentParser(description="Parallel sampled k-selection sweep")
+    parser.add_argument('anomalies', help="CSV with a pkSeqID column (e.g. the top-K anomalies)")
+    parser.add_argument('--flows', required=True, help="Flow store directory or subset CSV/Parquet")
+    parser.add_argument('--preprocessor', required=True)
+    parser.add_argument('--k-min', type=int, default=3)
+    parser.add_argument('--k-max', type=int, default=10)
+    parser.add_argument('--n-init', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sample-per-cluster', type=int, default=SAMPLE_PER_CLUSTER)
+    parser.add_argument('--output', default='k_selection.csv')
+    parser.add_argument('--plot', default=None, help="Optional elbow/silhouette PNG")
+    args = parser.parse_args()
+
+    ids = pd.read_csv(args.anomalies, usecols=['pkSeqID'])['pkSeqID'].to_numpy()
+    _, X = load_features_for_ids(args.flows, FeaturePreprocessor.load(args.preprocessor), ids)
+
+    k_values = range(args.k_min, args.k_max + 1)
+    print(f"Computing clustering metrics for k = {args.k_min} to {args.k_max} on {len(X):,} anomalies...")
+    table, _ = k_sweep(X, k_values, n_init=args.n_init, workers=args.workers,
+                       per_cluster=args.sample_per_cluster)
+    for row in table.itertuples():
+        print(f"k={row.k}: Inertia={row.inertia:.2f}, Silhouette={row.silhouette:.4f} "
+              f"[{row.silhouette_ci_low:.4f}, {row.silhouette_ci_high:.4f}], "
+              f"DB={row.davies_bouldin:.4f}, CH={row.calinski_harabasz:.1f}")
+
+    optimal = table.loc[table['silhouette'].idxmax()]
+    print(f"\nOptimal k (by silhouette): {int(optimal['k'])} with score {optimal['silhouette']:.4f}")
+    table.to_csv(args.output, index=False)
+    print(f"✓ Table saved to: {args.output}")
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+        axes[0].plot(table['k'], table['inertia'], 'bo-', linewidth=2, markersize=8)
+        axes[0].set_xlabel('Number of Clusters (k)', fontsize=12)
+        axes[0].set_ylabel('Inertia', fontsize=12)
+        axes[0].set_title('Elbow Method for Optimal k', fontsize=13, fontweight='bold')
+        axes[0].grid(True, alpha=0.3)
+        axes[1].errorbar(table['k'], table['silhouette'],
+                         yerr=[table['silhouette'] - table['silhouette_ci_low'],
+                               table['silhouette_ci_high'] - table['silhouette']],
+                         fmt='ro-', linewidth=2, markersize=8, capsize=4)
+        axes[1].set_xlabel('Number of Clusters (k)', fontsize=12)
+        axes[1].set_ylabel('Silhouette Score (sampled, 95% CI)', fontsize=12)
+        axes[1].set_title('Silhouette Score vs Number of Clusters', fontsize=13, fontweight='bold')
+        axes[1].grid(True, alpha=0.3)
+        plt.tight_layout()
+        plt.savefig(args.plot, dpi=300, bbox_inches='tight')
+        print(f"✓ Plot saved to: {args.plot}")
+
+
+if __name__ == '__main__':
+    main()
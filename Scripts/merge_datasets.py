@@ -1,5 +1,14 @@
-import pandas as pd
+import argparse
 import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import pandas as pd
+
+from flow_schema import BOT_IOT_COLUMNS, BOT_IOT_DTYPES, check_header
+from instrumentation import stage
 
 # Directory containing the CSV files
 data_dir = "/Users/nawara/Desktop/LLM-Clustering-Paper/Bot-IoT-Dataset"
@@ -12,23 +21,140 @@ csv_files = [
     "UNSW_2018_IoT_Botnet_Full5pc_4.csv"
 ]
 
-# Read and merge all CSV files
-dfs = []
-for file in csv_files:
-    file_path = os.path.join(data_dir, file)
-    print(f"Reading {file}...")
-    df = pd.read_csv(file_path)
-    print(f"  Shape: {df.shape}")
-    dfs.append(df)
-
-# Concatenate all dataframes
-merged_df = pd.concat(dfs, ignore_index=True)
-
-# Save to a new CSV file
-output_path = os.path.join(data_dir, "UNSW_2018_IoT_Botnet_Full_Merged.csv")
-merged_df.to_csv(output_path, index=False)
-
-print(f"\nMerging complete!")
-print(f"Total rows: {len(merged_df)}")
-print(f"Total columns: {len(merged_df.columns)}")
-print(f"Output saved to: {output_path}")
+CHUNK_SIZE = 250_000
+
+
+def merge_in_memory(data_dir: str, csv_files: list, output_path: str) -> int:
+    """Original merge: load every shard, concat, write one CSV."""
+    dfs = []
+    for file in csv_files:
+        file_path = os.path.join(data_dir, file)
+        print(f"Reading {file}...")
+        df = pd.read_csv(file_path)
+        print(f"  Shape: {df.shape}")
+        dfs.append(df)
+
+    merged_df = pd.concat(dfs, ignore_index=True)
+    merged_df.to_csv(output_path, index=False)
+    return len(merged_df)
+
+
+def _shard_to_part(job: tuple) -> tuple:
+    """
+    Parse one shard chunk by chunk into a headerless part file.
+    Runs in a worker process; holds at most one chunk in memory.
+    """
+    file_path, part_path, fmt, chunksize = job
+    check_header(pd.read_csv(file_path, nrows=0).columns, file_path)
+
+    rows = 0
+    writer = None
+    with pd.read_csv(file_path, dtype=BOT_IOT_DTYPES, chunksize=chunksize) as reader:
+        with open(part_path, 'wb') if fmt == 'csv' else nullcontext() as out:
+            for chunk in reader:
+                if fmt == 'csv':
+                    chunk.to_csv(out, header=False, index=False)
+                else:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(part_path, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+                rows += len(chunk)
+    if writer is not None:
+        writer.close()
+
+    return os.path.basename(file_path), rows
+
+
+def merge_streaming(data_dir: str, csv_files: list, output_path: str,
+                    chunksize: int = CHUNK_SIZE, fmt: str = 'csv', workers: int = None) -> int:
+    """
+    Bounded-memory merge.
+
+    Shards are parsed in parallel (one process per shard, at most `workers`
+    at a time) with the declared Bot-IoT schema, each streaming its chunks to
+    a part file. Parts are then appended to the output in shard order, so
+    row order matches the in-memory merge. Peak memory is roughly
+    `workers x chunksize` rows, independent of dataset size.
+    """
+    if fmt not in ('csv', 'parquet'):
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    tmp_dir = tempfile.mkdtemp(prefix='.merge_parts_', dir=out_dir)
+    try:
+        jobs = [
+            (os.path.join(data_dir, file), os.path.join(tmp_dir, f"part_{i:03d}.{fmt}"), fmt, chunksize)
+            for i, file in enumerate(csv_files)
+        ]
+        total = 0
+        with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as pool:
+            for name, rows in pool.map(_shard_to_part, jobs):
+                print(f"  {name}: {rows:,} rows")
+                total += rows
+
+        print("Appending parts to output...")
+        if fmt == 'csv':
+            with open(output_path, 'w') as out:
+                out.write(','.join(BOT_IOT_COLUMNS) + '\n')
+            with open(output_path, 'ab') as out:
+                for _, part_path, _, _ in jobs:
+                    with open(part_path, 'rb') as part:
+                        shutil.copyfileobj(part, out, length=16 * 1024 * 1024)
+        else:
+            writer = None
+            for _, part_path, _, _ in jobs:
+                part = pq.ParquetFile(part_path)
+                for i in range(part.num_row_groups):
+                    table = part.read_row_group(i)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output_path, table.schema)
+                    writer.write_table(table)
+            if writer is not None:
+                writer.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the Bot-IoT CSV shards into one file")
+    parser.add_argument('--data-dir', default=data_dir)
+    parser.add_argument('--output', default=None,
+                        help="Output path (default: <data-dir>/UNSW_2018_IoT_Botnet_Full_Merged.<format>)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--in-memory', action='store_true',
+                        help="Use the original load-everything merge (CSV only)")
+    args = parser.parse_args()
+    if args.in_memory and args.format != 'csv':
+        parser.error("--in-memory writes CSV only; drop it for --format parquet")
+
+    output_path = args.output or os.path.join(args.data_dir, f"UNSW_2018_IoT_Botnet_Full_Merged.{args.format}")
+
+    with stage('merge', files=len(csv_files), format=args.format) as span:
+        if args.in_memory:
+            total_rows = merge_in_memory(args.data_dir, csv_files, output_path)
+        else:
+            print(f"Streaming merge ({args.format}, chunksize={args.chunksize:,})...")
+            total_rows = merge_streaming(args.data_dir, csv_files, output_path,
+                                         chunksize=args.chunksize, fmt=args.format, workers=args.workers)
+        span.rows_out = total_rows
+
+    print(f"\nMerging complete!")
+    print(f"Total rows: {total_rows}")
+    print(f"Total columns: {len(BOT_IOT_COLUMNS)}")
+    print(f"Output saved to: {output_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Standard library only. Answers POST /v1/chat/completions with a
+deterministic, persona-style analysis built from the prompt (it quotes the
+cluster size and LOF statistics, so the metrics stage has something to
+ground), after a configurable latency. Batched multi-cluster prompts get a
+JSON object with one answer per cluster. It can also enforce a requests-per-
+minute limit and inject errors, returning 429/500 like the real API, to
+exercise the runner's rate limiting and retries offline:
+
+    python3 mock_llm_server.py --port 8000 --latency 0.5 --rpm 600
+    python3 persona_runner.py --base-url http://127.0.0.1:8000/v1
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+THREATS = ['botnet command and control (C2) beaconing', 'DDoS flooding', 'reconnaissance scanning',
+           'data exfiltration', 'brute-force service probing']
+SEVERITIES = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']
+
+
+def fake_analysis(prompt: str) -> str:
+    """Deterministic pseudo-analysis that cites numbers from the prompt."""
+    digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+    threat = THREATS[digest % len(THREATS)]
+    severity = SEVERITIES[(digest >> 8) % len(SEVERITIES)]
+
+    def find(pattern, default='unknown'):
+        match = re.search(pattern, prompt)
+        return match.group(1) if match else default
+
+    size = find(r'(?:Total Samples:\s*| n=)([\d.]+)')
+    mean_lof = find(r'(?:Mean LOF Anomaly Score:\s*|lof mean=)([\d.]+)')
+    max_lof = find(r'(?:Max Anomaly Score:\s*|lof mean=.*? max=)([\d.]+)')
+    return (f"**Classification**: The cluster of {size} flows is consistent with {threat}.\n"
+            f"**Threat Level**: {severity}. The mean anomaly score of {mean_lof} "
+            f"(max {max_lof}) indicates traffic well outside normal behaviour.\n"
+            f"**Recommendation**: Monitor the dominant protocol and destination ports, and alert on "
+            f"repeated flows from the top source addresses.")
+
+
+class _Limiter:
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def allow(self) -> float:
+        """0 if the call may proceed, else seconds until a slot frees up."""
+        if not self.rpm:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.calls = [t for t in self.calls if now - t < 60.0]
+            if len(self.calls) >= self.rpm:
+                return 60.0 - (now - self.calls[0])
+            self.calls.append(now)
+            return 0.0
+
+
+def make_handler(latency: float, jitter: float, error_rate: float, limiter: _Limiter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                return self._send(404, {'error': {'message': f'Unknown path {self.path}'}})
+            wait = limiter.allow()
+            if wait:
+                return self._send(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit'}},
+                                  {'Retry-After': f"{wait:.2f}"})
+            if random.random() < error_rate:
+                return self._send(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            prompt = '\n'.join(m.get('content', '') for m in request.get('messages', []))
+            sections = re.split(r'(?m)^## (cluster_\d+)', prompt)
+            if 'Respond with one JSON object' in prompt and len(sections) > 1:
+                # Batched request (prompt_compiler): one answer per cluster section
+                content = json.dumps({key: fake_analysis(key + body)
+                                      for key, body in zip(sections[1::2], sections[2::2])})
+            else:
+                content = fake_analysis(prompt)
+            prompt_tokens = max(1, len(prompt) // 4)
+            completion_tokens = max(1, len(content) // 4)
+            self._send(200, {
+                'id': f"chatcmpl-{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'mock'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': prompt_tokens + completion_tokens}
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = '127.0.0.1', port: int = 8000, latency: float = 0.5, jitter: float = 0.1,
+          error_rate: float = 0.0, rpm: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(latency, jitter, error_rate, _Limiter(rpm)))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.5, help="Seconds per completion")
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument('--rpm', type=int, default=0, help="Requests per minute before 429 (0 = unlimited)")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rpm)
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1 (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Online micro-batch anomaly scoring.
+
+Consumes Bot-IoT flow records in micro-batches, from a finished file or a
+capture file that is still being written (--follow), scores each batch with
+the persisted preprocessing artifact, LOF engine and (optionally) a fitted
+IsolationForest, and keeps the current top-K anomalies keyed by pkSeqID in
+O(K) memory. The top-K set is periodically written as a CSV with the same
+score columns as baseline_test_predictions.csv.
+"""
+
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from anomaly_index import top_k_positions
+from flow_schema import BOT_IOT_DTYPES, ID_COLUMN
+
+TOP_K = 5000
+BATCH_SIZE = 10_000
+POLL_INTERVAL = 1.0
+
+
+class TopKAnomalies:
+    """
+    Bounded set of the K highest-scoring flows, keyed by pkSeqID.
+
+    Each update merges the current K rows with the new batch and keeps the
+    K best with a partial selection (anomaly_index.top_k_positions), so an
+    update costs O(K + batch) and memory never exceeds K rows plus one
+    batch. Rows are kept in arrival order, so ties break by arrival as
+    top_k_positions breaks them by position. A pkSeqID seen again keeps its
+    latest scores.
+    """
+
+    def __init__(self, k: int = TOP_K, rank_by: str = 'lof_score'):
+        self.k = k
+        self.rank_by = rank_by
+        self._frame = None
+
+    def __len__(self) -> int:
+        return 0 if self._frame is None else len(self._frame)
+
+    def update(self, scored: pd.DataFrame):
+        pool = scored if self._frame is None else pd.concat([self._frame, scored], ignore_index=True)
+        pool = pool.drop_duplicates(subset=ID_COLUMN, keep='last')
+        if len(pool) > self.k:
+            keep = np.sort(top_k_positions(pool[self.rank_by].to_numpy(), self.k))
+            pool = pool.iloc[keep]
+        self._frame = pool.reset_index(drop=True)
+
+    def threshold(self) -> float:
+        """Score a new flow must beat to enter a full top-K set."""
+        if self._frame is None or len(self._frame) < self.k:
+            return -np.inf
+        return float(self._frame[self.rank_by].min())
+
+    def snapshot(self) -> pd.DataFrame:
+        if self._frame is None:
+            return pd.DataFrame(columns=[ID_COLUMN, self.rank_by])
+        return self._frame.sort_values(self.rank_by, ascending=False, kind='stable').reset_index(drop=True)
+
+
+def iter_batches(path: str, batch_size: int, follow: bool = False, poll_interval: float = POLL_INTERVAL):
+    """
+    Yield DataFrame micro-batches from a Bot-IoT CSV.
+
+    With `follow`, keep reading as the file grows (like `tail -f`); only
+    complete lines are parsed, so a half-written record waits for the next
+    poll.
+    """
+    if not follow:
+        with pd.read_csv(path, dtype=BOT_IOT_DTYPES, chunksize=batch_size) as reader:
+            yield from reader
+        return
+
+    with open(path, 'r') as f:
+        header = f.readline()
+        while not header.endswith('\n'):
+            time.sleep(poll_interval)
+            header += f.readline()
+        columns = pd.read_csv(io.StringIO(header)).columns.tolist()
+        dtypes = {c: t for c, t in BOT_IOT_DTYPES.items() if c in columns}
+        pending = ''
+        lines = []
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if pending.endswith('\n'):
+                    lines.append(pending)
+                    pending = ''
+                if len(lines) < batch_size:
+                    continue
+            if lines:
+                yield pd.read_csv(io.StringIO(''.join(lines)), names=columns, header=None, dtype=dtypes)
+                lines = []
+            else:
+                time.sleep(poll_interval)
+
+
+class OnlineScorer:
+    """Scores micro-batches with persisted models and feeds a TopKAnomalies."""
+
+    def __init__(self, preprocessor, lof_engine=None, iso_forest=None,
+                 k: int = TOP_K, rank_by: str = 'lof_score'):
+        if lof_engine is None and iso_forest is None:
+            raise ValueError("At least one of lof_engine / iso_forest is required")
+        self.preprocessor = preprocessor
+        self.lof_engine = lof_engine
+        self.iso_forest = iso_forest
+        self.top_k = TopKAnomalies(k=k, rank_by=rank_by)
+        self.rows_scored = 0
+        self._buffer = None
+
+    def score_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        if self._buffer is None or len(self._buffer) < len(batch):
+            self._buffer = np.empty((len(batch), self.preprocessor.n_features), dtype=np.float32)
+        X = self.preprocessor.transform(batch, out=self._buffer[:len(batch)])
+
+        scored = pd.DataFrame({ID_COLUMN: batch[ID_COLUMN].to_numpy()})
+        if 'attack' in batch.columns:
+            scored['actual_label'] = batch['attack'].to_numpy()
+        if self.iso_forest is not None:
+            iso_scores = self.iso_forest.score_samples(X)
+            scored['iso_forest_score'] = -iso_scores
+            scored['iso_forest_pred'] = (self.iso_forest.predict(X) == -1).astype(int)
+        if self.lof_engine is not None:
+            lof = self.lof_engine.score_frame(X)
+            scored['lof_score'] = lof['lof_score'].to_numpy()
+            scored['lof_pred'] = lof['lof_pred'].to_numpy()
+
+        self.top_k.update(scored)
+        self.rows_scored += len(batch)
+        return scored
+
+
+def _write_atomic(df: pd.DataFrame, path: str):
+    tmp = f"{path}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def main():
+    import joblib
+    from feature_preprocessing import FeaturePreprocessor
+    from lof_engine import LOFEngine
+
+    parser = argparse.ArgumentParser(description="Score flows in micro-batches and keep the top-K anomalies")
+    parser.add_argument('source', help="Bot-IoT flow CSV (may still be growing with --follow)")
+    parser.add_argument('--preprocessor', required=True)
+    parser.add_argument('--lof-model', help="LOF engine directory (lof_engine.py fit)")
+    parser.add_argument('--iso-model', help="joblib-dumped fitted IsolationForest")
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--rank-by', choices=['lof_score', 'iso_forest_score'], default='lof_score')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--follow', action='store_true', help="Keep tailing the source file")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+    parser.add_argument('--output', default='top_anomalies_online.csv')
+    parser.add_argument('--flush-every', type=int, default=10, help="Write the top-K CSV every N batches")
+    args = parser.parse_args()
+
+    scorer = OnlineScorer(
+        FeaturePreprocessor.load(args.preprocessor),
+        lof_engine=LOFEngine.load(args.lof_model) if args.lof_model else None,
+        iso_forest=joblib.load(args.iso_model) if args.iso_model else None,
+        k=args.top_k, rank_by=args.rank_by
+    )
+    if args.rank_by == 'lof_score' and scorer.lof_engine is None:
+        parser.error("--rank-by lof_score needs --lof-model")
+    if args.rank_by == 'iso_forest_score' and scorer.iso_forest is None:
+        parser.error("--rank-by iso_forest_score needs --iso-model")
+
+    print("=" * 80)
+    print(f"ONLINE SCORING: {args.source} (top {args.top_k:,} by {args.rank_by})")
+    print("=" * 80)
+
+    n_batches = 0
+    started = time.perf_counter()
+    try:
+        for batch in iter_batches(args.source, args.batch_size, follow=args.follow,
+                                  poll_interval=args.poll_interval):
+            scorer.score_batch(batch)
+            n_batches += 1
+            if n_batches % args.flush_every == 0:
+                _write_atomic(scorer.top_k.snapshot(), args.output)
+                rate = scorer.rows_scored / (time.perf_counter() - started)
+                print(f"  {scorer.rows_scored:,} flows scored ({rate:,.0f}/s), "
+                      f"top-K threshold={scorer.top_k.threshold():.4f}")
+    except KeyboardInterrupt:
+        print("\nStopping...")
+
+    _write_atomic(scorer.top_k.snapshot(), args.output)
+    print(f"\n✓ {scorer.rows_scored:,} flows scored; top {len(scorer.top_k):,} saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Concurrent persona interpretation runner.
+
+Replaces the notebook's sequential GPT-4 loop (one cluster and one persona
+per call, `time.sleep(1)` in between, first 3 clusters only):
+
+  * every (cluster, persona) request is issued concurrently through
+    `AsyncOpenAI`, bounded by a semaphore;
+  * a token bucket keeps requests and tokens under the per-minute budget,
+    and rate-limit / transient server errors are retried with exponential
+    backoff (honouring Retry-After);
+  * responses are stored in a content-addressed cache keyed by the hash of
+    the messages, model and temperature, so re-runs only pay for prompts
+    that changed;
+  * llm_multi_persona_analysis.json is rewritten atomically as results
+    arrive, so an interrupted run keeps everything finished so far. New
+    results are merged into the existing file, so a `--clusters` subset
+    run keeps every other cluster's interpretations.
+
+`--base-url` points the client at any OpenAI-compatible endpoint, e.g.
+mock_llm_server.py for offline throughput tests. With `--drift-state`,
+only clusters whose profile drifted since their last interpretation are
+re-queried (see interpretation_drift.py); the rest are carried forward.
+`--compact` sends prompts compiled by prompt_compiler.py, optionally
+packing several clusters per request (`--batch-size`).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+import interpretation_drift
+import prompt_compiler
+from instrumentation import percentiles, stage
+from personas import PERSONAS, create_persona_prompt
+
+MODEL = 'gpt-4'
+TEMPERATURE = 0.7
+MAX_TOKENS = 1200
+SYSTEM_MESSAGE = "You are an expert in network security and anomaly analysis. Provide clear, actionable insights."
+
+CONCURRENCY = 8
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 300_000
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+CACHE_DIR = '.llm_cache'
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (~4 characters per token) for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def cache_key(messages: list, model: str, temperature: float) -> str:
+    payload = json.dumps({'messages': messages, 'model': model, 'temperature': temperature},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _write_json_atomic(obj, path: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+class ResponseCache:
+    """On-disk cache of completions: <dir>/<key[:2]>/<key>.json."""
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, entry: dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_json_atomic(entry, path)
+
+
+class RateLimiter:
+    """
+    Token bucket over requests/minute and tokens/minute. A request reserves
+    its estimated tokens up front; `settle` refunds or charges the
+    difference once actual usage is known.
+    """
+
+    def __init__(self, rpm: int = REQUESTS_PER_MINUTE, tpm: int = TOKENS_PER_MINUTE):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._stamp
+        self._stamp = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    async def acquire(self, tokens: int):
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) * 60.0 / self.rpm,
+                           (tokens - self._tokens) * 60.0 / self.tpm, 0.01)
+                await asyncio.sleep(wait)
+
+    def settle(self, reserved: int, used: int):
+        self._tokens = min(self.tpm, self._tokens + reserved - used)
+
+
+def build_jobs(profiles: list, persona_keys: list) -> list:
+    """One job per (cluster, persona): {'cluster', 'persona', 'prompt'}."""
+    jobs = []
+    for profile in profiles:
+        for persona_key in persona_keys:
+            prompt, _ = create_persona_prompt(profile, persona_key)
+            jobs.append({'cluster': f"cluster_{profile['cluster_id']}", 'persona': persona_key, 'prompt': prompt})
+    return jobs
+
+
+class PersonaRunner:
+    """Runs interpretation jobs concurrently against an OpenAI-compatible API."""
+
+    def __init__(self, client, model: str = MODEL, temperature: float = TEMPERATURE,
+                 max_tokens: int = MAX_TOKENS, system_message: str = SYSTEM_MESSAGE,
+                 concurrency: int = CONCURRENCY, limiter: RateLimiter = None,
+                 cache: ResponseCache = None, max_retries: int = MAX_RETRIES, context_window: int = None):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.system_message = system_message
+        self.concurrency = concurrency
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.max_retries = max_retries
+        self.context_window = context_window or prompt_compiler.context_window(model)
+        self.stats = {'requests': 0, 'cache_hits': 0, 'retries': 0, 'failures': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+        self.latencies = []
+
+    def messages(self, prompt: str) -> list:
+        return [{'role': 'system', 'content': self.system_message},
+                {'role': 'user', 'content': prompt}]
+
+    async def _complete(self, messages: list, max_tokens: int) -> dict:
+        import openai
+
+        reserved = sum(estimate_tokens(m['content']) for m in messages) + max_tokens
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(reserved)
+            try:
+                started = time.perf_counter()
+                response = await self.client.chat.completions.create(
+                    model=self.model, messages=messages,
+                    temperature=self.temperature, max_tokens=max_tokens
+                )
+            except (openai.RateLimitError, openai.APITimeoutError,
+                    openai.APIConnectionError, openai.InternalServerError) as e:
+                self.limiter.settle(reserved, 0)
+                if attempt == self.max_retries:
+                    raise
+                self.stats['retries'] += 1
+                retry_after = None
+                if getattr(e, 'response', None) is not None:
+                    retry_after = e.response.headers.get('retry-after')
+                delay = float(retry_after) if retry_after else \
+                    min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random())
+                await asyncio.sleep(delay)
+                continue
+
+            usage = response.usage
+            prompt_tokens = usage.prompt_tokens if usage else 0
+            completion_tokens = usage.completion_tokens if usage else 0
+            self.limiter.settle(reserved, prompt_tokens + completion_tokens if usage else reserved)
+            self.stats['requests'] += 1
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+            return {'content': response.choices[0].message.content,
+                    'model': self.model, 'temperature': self.temperature,
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens},
+                    'latency': self._record_latency(time.perf_counter() - started)}
+
+    def _record_latency(self, seconds: float) -> float:
+        self.latencies.append(seconds)
+        return seconds
+
+    async def run_job(self, job: dict, semaphore: asyncio.Semaphore) -> list:
+        """
+        Results for one job. A job carries either a 'prompt' (sent after the
+        shared system message) or precompiled 'messages'; a batched job
+        lists its 'clusters' and its answer is split back per cluster.
+        """
+        messages = job.get('messages') or self.messages(job['prompt'])
+        clusters = job.get('clusters')
+        key = cache_key(messages, self.model, self.temperature)
+        entry = self.cache.get(key) if self.cache else None
+        cached = entry is not None
+        if cached:
+            self.stats['cache_hits'] += 1
+        else:
+            # One completion budget per cluster, capped to what the prompt leaves of the context
+            budget = prompt_compiler.completion_budget(messages, self.max_tokens * len(clusters or [None]),
+                                                       self.model, self.context_window)
+            if budget <= 0:
+                raise ValueError(f"Prompt leaves no room for a completion in {self.model}'s "
+                                 f"{self.context_window:,}-token context")
+            async with semaphore:
+                entry = await self._complete(messages, budget)
+
+        if clusters is None:
+            if self.cache and not cached:
+                self.cache.put(key, entry)
+            return [{'cluster': job['cluster'], 'persona': job['persona'],
+                     'response': entry['content'], 'cached': cached}]
+
+        parts = prompt_compiler.split_batch_response(entry['content'], clusters)
+        if self.cache and not cached and len(parts) == len(clusters):
+            self.cache.put(key, entry)
+        return [{'cluster': c, 'persona': job['persona'], 'response': parts[c], 'cached': cached} if c in parts
+                else {'cluster': c, 'persona': job['persona'], 'error': "missing from batched response"}
+                for c in clusters]
+
+    async def run(self, jobs: list, on_result=None) -> list:
+        """
+        Run all jobs; `on_result(result)` is called as each one finishes.
+        Failed jobs are reported with an 'error' field instead of raising.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def guarded(job):
+            try:
+                results = await self.run_job(job, semaphore)
+            except Exception as e:
+                results = [{'cluster': c, 'persona': job['persona'], 'error': f"{type(e).__name__}: {e}"}
+                           for c in job.get('clusters') or [job['cluster']]]
+            self.stats['failures'] += sum('error' in r for r in results)
+            if on_result:
+                for result in results:
+                    on_result(result)
+            return results
+
+        batches = await asyncio.gather(*(guarded(job) for job in jobs))
+        return [result for results in batches for result in results]
+
+
+class IncrementalResults:
+    """
+    {cluster: {persona: text}} written atomically every `flush_every`
+    results. With `records_path`, each new result is also appended there as
+    a JSONL record for evaluate_stream.py.
+    """
+
+    def __init__(self, path: str, flush_every: int = 1, existing: dict = None, records_path: str = None):
+        self.path = path
+        self.flush_every = flush_every
+        self.data = existing or {}
+        self.records_path = records_path
+        self._records = []
+        self._pending = 0
+
+    def add(self, result: dict):
+        if 'response' not in result:
+            print(f"  ❌ {result['cluster']} / {result['persona']}: {result.get('error')}")
+            return
+        self.data.setdefault(result['cluster'], {})[result['persona']] = result['response']
+        if self.records_path:
+            self._records.append(json.dumps({k: result[k] for k in ('cluster', 'persona', 'response')}))
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        _write_json_atomic(self.data, self.path)
+        if self._records:
+            with open(self.records_path, 'a') as f:
+                f.write('\n'.join(self._records) + '\n')
+            self._records = []
+        self._pending = 0
+
+
+def _make_client(base_url: str = None, timeout: float = 120.0):
+    from openai import AsyncOpenAI
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key and base_url is None:
+        raise SystemExit("❌ ERROR: OPENAI_API_KEY not configured (or pass --base-url for a local server)")
+    return AsyncOpenAI(api_key=api_key or 'local', base_url=base_url, timeout=timeout, max_retries=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate persona interpretations for every cluster concurrently")
+    parser.add_argument('--profiles', default='cluster_profiles.json')
+    parser.add_argument('--output', default='llm_multi_persona_analysis.json')
+    parser.add_argument('--personas', nargs='+', choices=list(PERSONAS), default=list(PERSONAS))
+    parser.add_argument('--clusters', nargs='+', type=int, default=None, help="Cluster ids (default: all)")
+    parser.add_argument('--model', default=MODEL)
+    parser.add_argument('--temperature', type=float, default=TEMPERATURE)
+    parser.add_argument('--max-tokens', type=int, default=MAX_TOKENS, help="Completion tokens per cluster")
+    parser.add_argument('--context-window', type=int, default=None, help="Default: the model's context size")
+    parser.add_argument('--base-url', default=None, help="OpenAI-compatible endpoint, e.g. http://127.0.0.1:8000/v1")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--rpm', type=int, default=REQUESTS_PER_MINUTE)
+    parser.add_argument('--tpm', type=int, default=TOKENS_PER_MINUTE)
+    parser.add_argument('--max-retries', type=int, default=MAX_RETRIES)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--flush-every', type=int, default=1)
+    parser.add_argument('--records', default=None, help="Also append each new result to this JSONL file")
+    parser.add_argument('--compact', action='store_true', help="Send compiled compact prompts")
+    parser.add_argument('--batch-size', type=int, default=1, help="Clusters per request with --compact")
+    parser.add_argument('--max-prompt-tokens', type=int, default=None)
+    parser.add_argument('--drift-state', default=None,
+                        help="Interpretation state file; enables drift-aware re-interpretation")
+    interpretation_drift.add_threshold_args(parser)
+    args = parser.parse_args()
+    try:
+        prompt_compiler.check_budget(args.personas, args.batch_size if args.compact else 1, args.max_tokens,
+                                     args.model, args.context_window)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.profiles, 'r') as f:
+        profiles = json.load(f)
+    # New results are merged into the existing output: clusters that are not
+    # queried this run keep their interpretations, only clusters that are no
+    # longer profiled are dropped
+    known = {f"cluster_{p['cluster_id']}" for p in profiles}
+    previous = {}
+    if os.path.exists(args.output):
+        with open(args.output, 'r') as f:
+            previous = json.load(f)
+    existing = {key: value for key, value in previous.items() if key in known}
+    if args.clusters is not None:
+        profiles = [p for p in profiles if p['cluster_id'] in set(args.clusters)]
+
+    query_profiles = profiles
+    if args.drift_state:
+        state = interpretation_drift.load_state(args.drift_state)
+        decisions = interpretation_drift.plan(profiles, state, previous, args.personas,
+                                              interpretation_drift.thresholds_from_args(args))
+        interpretation_drift.print_plan(decisions)
+        query_profiles = [p for p in profiles if decisions[f"cluster_{p['cluster_id']}"]['requery']]
+    if args.compact:
+        jobs = prompt_compiler.compile_jobs(query_profiles, args.personas, batch_size=args.batch_size,
+                                            max_prompt_tokens=args.max_prompt_tokens, model=args.model,
+                                            max_tokens=args.max_tokens, context=args.context_window)
+    else:
+        jobs = build_jobs(query_profiles, args.personas)
+
+    runner = PersonaRunner(
+        _make_client(args.base_url), model=args.model, temperature=args.temperature,
+        max_tokens=args.max_tokens, concurrency=args.concurrency, context_window=args.context_window,
+        limiter=RateLimiter(args.rpm, args.tpm),
+        cache=None if args.no_cache else ResponseCache(args.cache_dir), max_retries=args.max_retries
+    )
+    results = IncrementalResults(args.output, flush_every=args.flush_every, existing=existing,
+                                 records_path=args.records)
+
+    print("=" * 80)
+    print(f"MULTI-PERSONA CLUSTER ANALYSIS: {len(query_profiles)} clusters × {len(args.personas)} personas "
+          f"in {len(jobs)} requests (concurrency {args.concurrency})")
+    print("=" * 80)
+
+    started = time.perf_counter()
+    with stage('llm', rows_in=len(jobs), model=args.model) as span:
+        answered = [r for r in asyncio.run(runner.run(jobs, on_result=results.add)) if 'response' in r]
+        span.rows_out = len(answered)
+        results.flush()
+        span.extra.update(runner.stats, latency=percentiles(runner.latencies))
+    elapsed = time.perf_counter() - started
+
+    if args.drift_state:
+        # Record the profile only where every persona answered in this run;
+        # a failed re-query keeps the old entry so the cluster stays drifted
+        succeeded = {(r['cluster'], r['persona']) for r in answered}
+        for profile in query_profiles:
+            key = f"cluster_{profile['cluster_id']}"
+            if all((key, p) in succeeded for p in args.personas):
+                state[key] = {'profile': profile, 'personas': list(args.personas)}
+        # Forget only clusters gone from the profiles file, not those outside --clusters
+        interpretation_drift.save_state(args.drift_state, {k: v for k, v in state.items() if k in known})
+        print(f"✓ Interpretation state saved to: {args.drift_state} "
+              f"({len(profiles) - len(query_profiles)} clusters carried forward)")
+
+    s = runner.stats
+    print(f"\n✅ Multi-persona analysis saved to: {args.output}")
+    print(f"  {s['requests']} API calls, {s['cache_hits']} cache hits, {s['retries']} retries, "
+          f"{s['failures']} failures in {elapsed:.1f}s")
+    print(f"  Tokens: {s['prompt_tokens']:,} prompt + {s['completion_tokens']:,} completion")
+    if s['failures']:
+        # Partial results are written; a non-zero exit keeps pipeline.py from caching the stage
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
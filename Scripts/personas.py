@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Persona definitions and prompt builders for the LLM interpretation stage.
+
+Moved out of Anomaly_Clustering_Analysis.ipynb, which now imports them, so
+the notebook, persona_runner.py, prompt_compiler.py and compute_metrics.py
+share one copy. Prompt text is unchanged; missing statistics print as n/a.
+"""
+
+import json
+
+
+PERSONAS = {
+    "penetration_tester": {
+        "name": "🔓 Penetration Tester",
+        "role": "cybersecurity professional conducting red team operations",
+        "perspective": "Attack vectors, exploitability, threat severity",
+        "prefix": """You are an expert penetration tester with 15+ years of experience in network security and botnet analysis.
+        
+Analyze the following anomalous network traffic cluster and identify:
+1. **Attack Vectors**: What types of attacks or exploits are evident?
+2. **Threat Level**: Rate severity (CRITICAL/HIGH/MEDIUM/LOW) and explain
+3. **Attacker Profile**: What type of attacker (script kiddie, nation-state, cybercriminal)?
+4. **Exploitation Method**: How is the target being compromised?
+5. **Defense Evasion**: What techniques are used to avoid detection?
+
+Be concise and actionable. Focus on what defenders should prioritize."""
+    },
+
+    "security_researcher": {
+        "name": "🔬 Security Researcher",
+        "role": "academic cybersecurity researcher with published papers",
+        "perspective": "Pattern classification, behavioral analysis, statistical significance",
+        "prefix": """You are a leading security researcher specializing in botnet classification and malware behavioral analysis.
+
+Analyze the following network traffic cluster and provide:
+1. **Behavioral Signature**: What distinguishes this cluster from normal traffic?
+2. **Classification**: What malware family or attack category (C2, DDoS, Data exfiltration, etc.)?
+3. **Statistical Patterns**: Notable anomalies in packet sizes, timing, or frequency?
+4. **Temporal Characteristics**: Time-based patterns suggesting orchestration?
+5. **Research Relevance**: Why is this cluster scientifically significant?
+
+Provide academic rigor with references to known attack patterns where applicable."""
+    },
+
+    "security_ops_engineer": {
+        "name": "🛡️ SecOps Engineer",
+        "role": "SIEM/SOC analyst responsible for threat detection and response",
+        "perspective": "Detectability, response procedures, operational impact",
+        "prefix": """You are a senior Security Operations Center (SOC) engineer with deep experience in threat detection.
+
+Analyze the following anomalous network cluster and determine:
+1. **Detection Method**: How would you detect this in a SOC environment?
+2. **Alert Severity**: Recommended severity level (CRITICAL/HIGH/MEDIUM/LOW/INFO)?
+3. **Response Playbook**: What incident response steps should be taken?
+4. **IoCs**: What indicators of compromise can be extracted?
+5. **Mitigation**: Quick wins for immediate threat containment?
+
+Focus on operational practicality and SOC metrics."""
+    },
+
+    "data_analyst": {
+        "name": "📊 Data Analyst",
+        "role": "data scientist with expertise in anomaly detection",
+        "perspective": "Statistical anomalies, clustering quality, feature importance",
+        "prefix": """You are a data scientist specializing in network intrusion detection and anomaly clustering.
+
+Analyze the following cluster based on its statistical characteristics:
+1. **Feature Anomalies**: Which features (packet count, bytes, ports, state) are most anomalous?
+2. **Cluster Quality**: How well-separated is this cluster? What makes it distinct?
+3. **Outliers Within Cluster**: Are there sub-patterns or outlier samples within this group?
+4. **Predictive Power**: How reliable would this cluster be for automated classification?
+5. **Data Quality Issues**: Any obvious data artifacts or measurement errors?
+
+Use statistical terminology and explain at an 80th percentile technical level."""
+    }
+}
+
+
+def _fmt(value, spec=''):
+    """Format a profile statistic; missing ones (e.g. no LOF scores) print as n/a"""
+    return 'n/a' if value is None else format(value, spec)
+
+
+def format_cluster_for_llm(cluster_profile):
+    """Format cluster profile into readable format for LLM"""
+
+    lof = cluster_profile.get('lof_score_stats') or {}
+    stime = cluster_profile['numeric_stats']['stime']
+    span_hours = (stime['max'] - stime['min']) / 3600 if None not in (stime['max'], stime['min']) else None
+
+    formatted = f"""
+CLUSTER {cluster_profile['cluster_id']} - NETWORK ANOMALY ANALYSIS
+{'='*70}
+
+📊 DATASET STATISTICS:
+  • Total Samples: {cluster_profile['size']}
+  • Percentage of Total: {cluster_profile['percentage']}
+  
+🔴 ANOMALY SEVERITY:
+  • Mean LOF Anomaly Score: {_fmt(lof.get('mean'), '.4f')}
+  • Max Anomaly Score: {_fmt(lof.get('max'), '.4f')}
+  • Std Dev: {_fmt(lof.get('std'), '.4f')}
+  • Median: {_fmt(lof.get('median'), '.4f')}
+  
+🌐 NETWORK CHARACTERISTICS:
+
+  Protocol Distribution:
+    {json.dumps(cluster_profile['categorical_dist']['proto'], indent=4)}
+  
+  Connection State Distribution:
+    {json.dumps(cluster_profile['categorical_dist']['state'], indent=4)}
+  
+  Source Addresses (Top 3):
+    {json.dumps(cluster_profile['categorical_dist']['saddr'], indent=4)}
+  
+  Destination Addresses (Top 3):
+    {json.dumps(cluster_profile['categorical_dist']['daddr'], indent=4)}
+  
+  Destination Ports (Top 3):
+    {json.dumps(cluster_profile['categorical_dist']['dport'], indent=4)}
+
+📈 TRAFFIC METRICS:
+  
+  Packet Count (per flow):
+    • Mean: {_fmt(cluster_profile['numeric_stats']['pkts']['mean'], '.2f')}
+    • Range: {_fmt(cluster_profile['numeric_stats']['pkts']['min'])} - {_fmt(cluster_profile['numeric_stats']['pkts']['max'])}
+    • Median: {_fmt(cluster_profile['numeric_stats']['pkts']['median'])}
+  
+  Bytes per Flow:
+    • Mean: {_fmt(cluster_profile['numeric_stats']['bytes']['mean'], '.2f')}
+    • Range: {_fmt(cluster_profile['numeric_stats']['bytes']['min'])} - {_fmt(cluster_profile['numeric_stats']['bytes']['max'])}
+    • Median: {_fmt(cluster_profile['numeric_stats']['bytes']['median'])}
+  
+  Flow Flags:
+    • Mean: {_fmt(cluster_profile['numeric_stats']['flgs_number']['mean'], '.2f')}
+    • Range: {_fmt(cluster_profile['numeric_stats']['flgs_number']['min'])} - {_fmt(cluster_profile['numeric_stats']['flgs_number']['max'])}
+  
+  Protocol Numbers:
+    • Mean: {_fmt(cluster_profile['numeric_stats']['proto_number']['mean'], '.2f')}
+    • Range: {_fmt(cluster_profile['numeric_stats']['proto_number']['min'])} - {_fmt(cluster_profile['numeric_stats']['proto_number']['max'])}
+
+⏰ TEMPORAL CHARACTERISTICS:
+  • Time Range Span: {_fmt(span_hours, '.1f')} hours
+  • Temporal Variance: {_fmt(stime['std'], '.0f')} seconds
+
+🎯 ATTACK LABELS (Ground Truth):
+  {json.dumps(cluster_profile['attack_distribution'], indent=2)}
+"""
+
+    return formatted
+
+
+def create_persona_prompt(cluster_profile, persona_key):
+    """Create a full prompt for a specific persona"""
+
+    persona = PERSONAS[persona_key]
+    cluster_data = format_cluster_for_llm(cluster_profile)
+
+    full_prompt = f"""{persona['prefix']}
+
+---
+
+{cluster_data}
+
+---
+
+Please provide your analysis below:
+"""
+
+    return full_prompt, persona
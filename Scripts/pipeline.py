@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline runner with cached stage artifacts.
+
+Each stage runs one of the scripts in this directory with declared inputs,
+outputs and parameters:
+
+    merge → subset → store → preprocess → lof_fit → lof_score ┐
+                                        └→ iso_forest ────────┴→ baselines
+    → topk → cluster → profiles → llm → metrics
+             ↑
+    store → preprocess_cluster
+
+A stage's key is the sha256 of its command, its parameters, the content of
+its inputs and the code of its script plus every local module it imports.
+The key and the digests of its outputs are recorded in
+<workdir>/pipeline_state.json; a stage is skipped while its key is unchanged
+and its outputs are intact. Inputs are hashed by content, so a re-run stage
+that reproduces identical outputs does not invalidate its dependents, and
+editing only personas.py re-runs only `llm` and `metrics`. Stages whose
+inputs are ready run in parallel.
+
+File digests are cached by (size, mtime) so unchanged multi-GB inputs are
+not re-read on every run.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import instrumentation
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = 'pipeline_state.json'
+STATE_VERSION = 1
+LOG_DIR = 'logs'
+# Local modules that do not affect stage outputs, left out of stage keys
+UNHASHED_MODULES = {'instrumentation'}
+
+DEFAULT_PARAMS = {
+    'data_dir': None,        # Bot-IoT CSV shards; only needed by 'merge'
+    'subset': None,          # existing balanced subset; skips 'merge' and 'subset'
+    'target_n': 300000,
+    'random_state': 42,
+    'test_size': 0.3,
+    'lof_index': 'kd_tree',
+    'n_neighbors': 20,
+    'contamination': 0.1,
+    'n_estimators': 100,
+    'top_k': 5000,
+    'rank_by': 'lof_score',
+    'cluster_method': 'kmeans',
+    'n_clusters': 3,
+    'top_n': 3,
+    'model': 'gpt-4',
+    'temperature': 0.7,
+    'base_url': None,
+    'report_date': None
+}
+
+
+class Stage:
+    """One script invocation; paths are absolute."""
+
+    def __init__(self, name: str, script: str, argv: list, inputs: list, outputs: list, params: dict):
+        self.name = name
+        self.script = script
+        self.argv = [str(a) for a in argv]
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params
+
+
+def _opt(flag: str, value) -> list:
+    return [] if value is None else [flag, value]
+
+
+def define_stages(workdir: str, params: dict) -> list:
+    """The pipeline's stages for `params`, writing artifacts under `workdir`."""
+    def path(name):
+        return os.path.join(workdir, name)
+
+    def used(*names):
+        return {n: params[n] for n in names}
+
+    merged = path('bot_iot_merged.csv')
+    subset = os.path.abspath(params['subset']) if params['subset'] else path('bot_iot_balanced_subset.csv')
+    store = path('flows.store')
+    preprocessor = path('feature_preprocessing.npz')
+    cluster_preprocessor = path('cluster_preprocessing.npz')
+    lof_model, lof_scores = path('lof_model'), path('lof_test_scores.csv')
+    iso_model, iso_scores = path('iso_forest.joblib'), path('iso_forest_test_scores.csv')
+    predictions = path('baseline_test_predictions.csv')
+    top = path('top_anomalies.csv')
+    cluster_model, assignments = path('cluster_model'), path('cluster_assignments.csv')
+    profiles = path('cluster_profiles.json')
+    analysis = path('llm_multi_persona_analysis.json')
+    report = path('METRICS_VALIDATION_REPORT.json')
+
+    stages = []
+    if not params['subset']:
+        data_dir = os.path.abspath(params['data_dir']) if params['data_dir'] else None
+        stages += [
+            Stage('merge', 'merge_datasets.py', ['--data-dir', data_dir, '--output', merged],
+                  [data_dir], [merged], {}),
+            Stage('subset', 'create_balanced_subset.py',
+                  ['--input', merged, '--output', subset, '--target-n', params['target_n'],
+                   '--random-state', params['random_state']],
+                  [merged], [subset], used('target_n', 'random_state')),
+        ]
+    stages += [
+        Stage('store', 'flow_store.py', ['write', subset, store], [subset], [store], {}),
+        Stage('preprocess', 'feature_preprocessing.py',
+              ['fit', store, '--output', preprocessor, '--test-size', params['test_size'],
+               '--random-state', params['random_state']],
+              [store], [preprocessor], used('test_size', 'random_state')),
+        Stage('preprocess_cluster', 'feature_preprocessing.py',
+              ['fit', store, '--features', 'clustering', '--output', cluster_preprocessor,
+               '--test-size', params['test_size'], '--random-state', params['random_state']],
+              [store], [cluster_preprocessor], used('test_size', 'random_state')),
+        Stage('lof_fit', 'lof_engine.py',
+              ['fit', store, '--preprocessor', preprocessor, '--output', lof_model,
+               '--index', params['lof_index'], '--n-neighbors', params['n_neighbors'],
+               '--contamination', params['contamination']],
+              [store, preprocessor], [lof_model], used('lof_index', 'n_neighbors', 'contamination')),
+        Stage('lof_score', 'lof_engine.py',
+              ['score', store, '--preprocessor', preprocessor, '--model', lof_model, '--output', lof_scores],
+              [store, preprocessor, lof_model], [lof_scores], {}),
+        Stage('iso_forest', 'run_baselines.py',
+              ['iso', store, '--preprocessor', preprocessor, '--model', iso_model, '--output', iso_scores,
+               '--n-estimators', params['n_estimators'], '--contamination', params['contamination'],
+               '--random-state', params['random_state']],
+              [store, preprocessor], [iso_model, iso_scores],
+              used('n_estimators', 'contamination', 'random_state')),
+        Stage('baselines', 'run_baselines.py',
+              ['combine', '--iso', iso_scores, '--lof', lof_scores, '--output', predictions],
+              [iso_scores, lof_scores], [predictions], {}),
+        Stage('topk', 'run_baselines.py',
+              ['top', predictions, '--top-k', params['top_k'], '--rank-by', params['rank_by'], '--output', top],
+              [predictions], [top], used('top_k', 'rank_by')),
+        Stage('cluster', 'incremental_clustering.py',
+              ['fit', top, '--flows', store, '--preprocessor', cluster_preprocessor, '--model', cluster_model,
+               '--method', params['cluster_method'], '--n-clusters', params['n_clusters'],
+               '--output', assignments],
+              [top, store, cluster_preprocessor], [cluster_model, assignments], used('cluster_method', 'n_clusters')),
+        Stage('profiles', 'cluster_profiles.py',
+              ['build', assignments, '--flows', store, '--anomalies', top, '--top-n', params['top_n'],
+               '--output', profiles],
+              [assignments, store, top], [profiles], used('top_n')),
+        Stage('llm', 'persona_runner.py',
+              ['--profiles', profiles, '--output', analysis, '--model', params['model'],
+               '--temperature', params['temperature']] + _opt('--base-url', params['base_url']),
+              [profiles], [analysis], used('model', 'temperature', 'base_url')),
+        Stage('metrics', 'compute_metrics.py',
+              ['--analysis', analysis, '--profiles', profiles, '--output', report]
+              + _opt('--report-date', params['report_date']),
+              [analysis, profiles], [report], used('report_date')),
+    ]
+    return stages
+
+
+# ---------------------------------------------------------------- hashing
+
+def _local_imports(script_path: str) -> set:
+    with open(script_path, 'r') as f:
+        tree = ast.parse(f.read(), filename=script_path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return {n for n in names if n not in UNHASHED_MODULES and os.path.exists(os.path.join(SCRIPTS_DIR, f"{n}.py"))}
+
+
+def code_files(script: str) -> list:
+    """The script and every module of this directory it imports, transitively."""
+    seen, todo = set(), [os.path.splitext(script)[0]]
+    while todo:
+        name = todo.pop()
+        if name not in seen:
+            seen.add(name)
+            todo.extend(_local_imports(os.path.join(SCRIPTS_DIR, f"{name}.py")))
+    return sorted(f"{n}.py" for n in seen)
+
+
+class Digests:
+    """sha256 of files and directories, cached by (size, mtime_ns)."""
+
+    def __init__(self, cache: dict = None):
+        self.cache = cache or {}
+
+    def file(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self.cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        self.cache[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def path(self, path: str):
+        """Digest of a file or directory tree; None if it does not exist."""
+        if os.path.isfile(path):
+            return self.file(path)
+        if not os.path.isdir(path):
+            return None
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(f"{os.path.relpath(full, path)}\0{self.file(full)}\0".encode())
+        return h.hexdigest()
+
+
+def stage_key(stage: Stage, digests: Digests) -> str:
+    if None in stage.inputs:
+        raise FileNotFoundError(f"Stage '{stage.name}' needs an input path parameter (e.g. --set data_dir=...)")
+    missing = [p for p in stage.inputs if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Stage '{stage.name}' is missing inputs: {missing}")
+    payload = {
+        'script': stage.script,
+        'argv': stage.argv,
+        'params': stage.params,
+        'inputs': {p: digests.path(p) for p in stage.inputs},
+        'code': {f: digests.file(os.path.join(SCRIPTS_DIR, f)) for f in code_files(stage.script)}
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ---------------------------------------------------------------- running
+
+def load_state(workdir: str) -> dict:
+    path = os.path.join(workdir, STATE_FILE)
+    if not os.path.exists(path):
+        return {'version': STATE_VERSION, 'stages': {}, 'files': {}}
+    with open(path, 'r') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"{path} is pipeline state v{state.get('version')}, expected v{STATE_VERSION}")
+    return state
+
+
+def save_state(workdir: str, state: dict):
+    path = os.path.join(workdir, STATE_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def is_up_to_date(stage: Stage, key: str, record: dict, digests: Digests) -> bool:
+    if not record or record.get('key') != key:
+        return False
+    return all(digests.path(p) == record['outputs'].get(p) for p in stage.outputs)
+
+
+def _run_stage(stage: Stage, workdir: str, trace_path: str = None, profile: str = None) -> dict:
+    """Run a stage's script; returns its exit code, wall/CPU seconds and peak RSS."""
+    log_path = os.path.join(workdir, LOG_DIR, f"{stage.name}.log")
+    env = dict(os.environ)
+    if trace_path:
+        env[instrumentation.TRACE_ENV] = trace_path
+        if profile:
+            env[instrumentation.PROFILE_ENV] = profile
+    started = time.perf_counter()
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_DIR, stage.script)] + stage.argv,
+                                cwd=workdir, stdout=log, stderr=subprocess.STDOUT, env=env)
+        cpu_s = peak_rss_mb = None
+        if hasattr(os, 'wait4'):
+            # wait4 reports the child's own CPU time and peak RSS, even with stages running in parallel
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            cpu_s = usage.ru_utime + usage.ru_stime
+            peak_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+        else:
+            proc.wait()
+    return {'code': proc.returncode, 'wall_s': time.perf_counter() - started, 'cpu_s': cpu_s,
+            'peak_rss_mb': peak_rss_mb, 'log': log_path}
+
+
+def select(stages: list, targets: list) -> tuple:
+    """Stages needed for `targets` (all when empty) and each stage's dependencies."""
+    producer = {out: s.name for s in stages for out in s.outputs}
+    deps = {s.name: sorted({producer[p] for p in s.inputs if p in producer}) for s in stages}
+    by_name = {s.name: s for s in stages}
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown}; expected some of {list(by_name)}")
+    needed, todo = set(), list(targets or by_name)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(deps[name])
+    return [s for s in stages if s.name in needed], deps
+
+
+def run_pipeline(stages: list, workdir: str, targets: list = (), force: list = (), jobs: int = 2,
+                 dry_run: bool = False, trace: str = None, profile: str = None) -> dict:
+    """
+    Run the stages needed for `targets`, skipping up-to-date ones. Returns
+    {stage: 'ran' | 'skipped' | 'failed' | 'blocked' | 'would run'}.
+
+    With `trace` (a run trace path), every stage process is instrumented
+    and the run trace combines each stage's status, wall/CPU time and peak
+    RSS with the spans its script recorded; `profile` names a span to run
+    under cProfile.
+    """
+    selected, deps = select(stages, list(targets))
+    os.makedirs(os.path.join(workdir, LOG_DIR), exist_ok=True)
+    state = load_state(workdir)
+    digests = Digests(state['files'])
+    status, running, runs = {}, {}, {}
+    forced = set(force)
+    trace_dir = os.path.splitext(trace)[0] if trace else None
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while len(status) < len(selected):
+            for stage in selected:
+                if stage.name in status or stage.name in running:
+                    continue
+                upstream = [status.get(d) for d in deps[stage.name]]
+                if any(u in ('failed', 'blocked') for u in upstream):
+                    status[stage.name] = 'blocked'
+                    print(f"  ⏭️  {stage.name}: blocked by a failed upstream stage")
+                    continue
+                if dry_run and 'would run' in upstream:
+                    status[stage.name] = 'would run'
+                    print(f"  ▶️  {stage.name}: would run (upstream changes)")
+                    continue
+                if not all(u in ('ran', 'skipped') for u in upstream):
+                    continue
+                try:
+                    key = stage_key(stage, digests)
+                except FileNotFoundError as e:
+                    status[stage.name] = 'failed'
+                    print(f"  ❌ {stage.name}: {e}")
+                    continue
+                if stage.name not in forced and is_up_to_date(stage, key, state['stages'].get(stage.name), digests):
+                    status[stage.name] = 'skipped'
+                    print(f"  ✓ {stage.name}: up to date")
+                elif dry_run:
+                    status[stage.name] = 'would run'
+                    print(f"  ▶️  {stage.name}: would run")
+                else:
+                    command = ' '.join([stage.script] + stage.argv[:1 if not stage.argv[0].startswith('-') else 0])
+                    print(f"  ▶️  {stage.name}: running {command}...")
+                    stage_trace = os.path.join(trace_dir, f"{stage.name}.json") if trace else None
+                    running[stage.name] = (pool.submit(_run_stage, stage, workdir, stage_trace, profile), stage, key)
+            if not running:
+                continue
+
+            done, _ = wait([f for f, _, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name, (future, stage, key) in list(running.items()):
+                if future not in done:
+                    continue
+                del running[name]
+                run = runs[name] = future.result()
+                code, seconds = run['code'], run['wall_s']
+                missing = [p for p in stage.outputs if not os.path.exists(p)]
+                if code != 0 or missing:
+                    status[name] = 'failed'
+                    why = f"exit code {code}" if code != 0 else f"missing outputs {missing}"
+                    print(f"  ❌ {name}: {why} after {seconds:.1f}s (log: {run['log']})")
+                    continue
+                state['stages'][name] = {
+                    'key': key,
+                    'outputs': {p: digests.path(p) for p in stage.outputs},
+                    'params': stage.params,
+                    'seconds': round(seconds, 3),
+                    'finished': time.strftime('%Y-%m-%dT%H:%M:%S')
+                }
+                save_state(workdir, state)
+                status[name] = 'ran'
+                print(f"  ✅ {name}: done in {seconds:.1f}s")
+
+    if not dry_run:
+        save_state(workdir, state)
+    if trace and not dry_run:
+        write_run_trace(trace, trace_dir, status, runs)
+    return status
+
+
+def write_run_trace(path: str, trace_dir: str, status: dict, runs: dict):
+    """{'stages': {name: {'status', 'wall_s', 'cpu_s', 'peak_rss_mb', 'trace'}}} for one run."""
+    stages = {}
+    for name, st in status.items():
+        entry = {'status': st}
+        if name in runs:
+            entry.update({k: runs[name][k] for k in ('wall_s', 'cpu_s', 'peak_rss_mb')})
+            stage_trace = os.path.join(trace_dir, f"{name}.json")
+            if os.path.exists(stage_trace):
+                with open(stage_trace, 'r') as f:
+                    entry['trace'] = json.load(f)
+        stages[name] = entry
+    with open(path, 'w') as f:
+        json.dump({'version': instrumentation.TRACE_VERSION, 'run': os.path.basename(trace_dir),
+                   'stages': stages}, f, indent=2)
+
+
+def _parse_value(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the anomaly-clustering pipeline, skipping up-to-date stages")
+    parser.add_argument('targets', nargs='*', help="Stages to bring up to date with their upstream (default: all)")
+    parser.add_argument('--workdir', default='pipeline_artifacts')
+    parser.add_argument('--config', default=None, help="JSON file of parameter overrides")
+    parser.add_argument('--set', nargs='+', action='extend', default=[], metavar='NAME=VALUE', help="Parameter overrides")
+    parser.add_argument('--force', nargs='+', action='extend', default=[], help="Re-run these stages even if up to date")
+    parser.add_argument('--jobs', type=int, default=2, help="Stages run in parallel")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would run")
+    parser.add_argument('--list', action='store_true', help="List stages and their parameters")
+    parser.add_argument('--trace', action='store_true',
+                        help="Instrument every stage; writes <workdir>/traces/run_<time>.json")
+    parser.add_argument('--profile', default=None, metavar='SPAN',
+                        help="With --trace, run this instrumented span (e.g. lof.fit) under cProfile")
+    args = parser.parse_args()
+
+    params = dict(DEFAULT_PARAMS)
+    if args.config:
+        with open(args.config, 'r') as f:
+            params.update(json.load(f))
+    for item in args.set:
+        name, _, value = item.partition('=')
+        if name not in DEFAULT_PARAMS:
+            parser.error(f"Unknown parameter '{name}'; expected one of {list(DEFAULT_PARAMS)}")
+        params[name] = _parse_value(value)
+
+    workdir = os.path.abspath(args.workdir)
+    stages = define_stages(workdir, params)
+    if args.list:
+        for stage in stages:
+            print(f"{stage.name:12s} {stage.script:28s} {stage.params}")
+        return
+
+    print("=" * 80)
+    print(f"PIPELINE: {', '.join(args.targets) or 'all stages'} in {workdir}")
+    print("=" * 80)
+    started = time.perf_counter()
+    trace = None
+    if args.trace:
+        trace = os.path.join(workdir, 'traces', f"run_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        os.makedirs(os.path.splitext(trace)[0], exist_ok=True)
+    status = run_pipeline(stages, workdir, args.targets, force=args.force, jobs=args.jobs,
+                          dry_run=args.dry_run, trace=trace, profile=args.profile)
+    counts = {s: list(status.values()).count(s) for s in dict.fromkeys(status.values())}
+    print(f"\n{'Planned' if args.dry_run else 'Finished'} in {time.perf_counter() - started:.1f}s: "
+          + ', '.join(f"{n} {s}" for s, n in counts.items()))
+    if trace:
+        print(f"Trace: {trace}")
+    if any(s in ('failed', 'blocked') for s in status.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted prompt compilation for the persona interpretation stage.
+
+The notebook prompt (`create_persona_prompt`) repeats the full persona
+prefix in every user message, pretty-prints JSON blocks with indent=4, and
+sends one request per (cluster, persona). This stage compiles the same
+profile content into far fewer tokens:
+
+  * a fixed system preamble per persona (shared system message + persona
+    prefix + a one-line legend). It is byte-identical across requests, so
+    provider-side prompt caching can reuse it;
+  * a compact tabular cluster encoding, with one `mean|std|min|median|max`
+    row per numeric feature, `value=count` lists for categoricals, and
+    timestamps as a span instead of 10-digit decimals;
+  * optional packing of several clusters into one request, which asks for
+    a JSON object keyed by cluster id and is split back per cluster.
+
+Tokens are counted with tiktoken when it is available (and its encoding can
+be loaded), else with a tokenizer-shaped heuristic. `report` compares the
+compiled prompts with the current llm_cluster_prompts.json format.
+"""
+
+import argparse
+import functools
+import json
+import math
+import re
+
+from personas import PERSONAS, create_persona_prompt
+
+SYSTEM_MESSAGE = "You are an expert in network security and anomaly analysis. Provide clear, actionable insights."
+LEGEND = ("Cluster profiles are compact tables: n = flows in the cluster; lof = LOF anomaly score "
+          "(higher = more anomalous); numeric rows are feature|mean|std|min|median|max; categorical "
+          "rows list the top values as value=count; attack = ground-truth label counts.")
+
+PROMPT_FEATURES = ['pkts', 'bytes', 'flgs_number', 'proto_number', 'stime']
+PROMPT_CATEGORICALS = ['proto', 'state', 'saddr', 'daddr', 'dport']
+TIME_FEATURES = ['stime', 'ltime']
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+# Context windows (prompt + completion tokens); unknown models get the smallest
+CONTEXT_WINDOWS = {'gpt-4': 8192, 'gpt-4-32k': 32768, 'gpt-4-turbo': 128000, 'gpt-4o': 128000,
+                   'gpt-4o-mini': 128000, 'gpt-3.5-turbo': 16385}
+DEFAULT_CONTEXT_WINDOW = 8192
+# Heuristic counts are estimates; budget against them with some slack
+HEURISTIC_SLACK = 1.1
+
+
+# ------------------------------------------------------------ token counting
+@functools.lru_cache(maxsize=None)
+def _encoder(model: str):
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        # Not installed, or the encoding file cannot be fetched offline
+        return None
+
+
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]|\n+")
+
+
+def _heuristic_tokens(text: str) -> int:
+    """BPE-shaped estimate: words, 3-digit number chunks, punctuation, newlines."""
+    count = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha():
+            count += max(1, math.ceil(len(piece) / 6))
+        elif not piece.isascii():
+            count += math.ceil(len(piece.encode('utf-8')) / 2)
+        else:
+            count += 1
+    return count
+
+
+def count_tokens(text: str, model: str = 'gpt-4') -> int:
+    enc = _encoder(model)
+    return len(enc.encode(text)) if enc is not None else _heuristic_tokens(text)
+
+
+def tokenizer_name(model: str = 'gpt-4') -> str:
+    enc = _encoder(model)
+    return f"tiktoken:{enc.name}" if enc is not None else "heuristic"
+
+
+def count_message_tokens(messages: list, model: str = 'gpt-4') -> int:
+    """Chat request size: content plus the per-message framing tokens."""
+    return sum(count_tokens(m['content'], model) + MESSAGE_OVERHEAD for m in messages) + REPLY_OVERHEAD
+
+
+# ------------------------------------------------------------ context budget
+def context_window(model: str = 'gpt-4') -> int:
+    """Context size of `model`, matched on the longest known name (dated snapshots included)."""
+    matches = [name for name in CONTEXT_WINDOWS if model == name or model.startswith(f"{name}-")]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+def _budget_tokens(messages: list, model: str) -> int:
+    tokens = count_message_tokens(messages, model)
+    return tokens if _encoder(model) is not None else math.ceil(tokens * HEURISTIC_SLACK)
+
+
+def completion_budget(messages: list, max_tokens: int, model: str = 'gpt-4', context: int = None) -> int:
+    """`max_tokens`, capped to what the context window leaves after the prompt."""
+    return min(max_tokens, (context or context_window(model)) - _budget_tokens(messages, model))
+
+
+def check_budget(persona_keys: list, batch_size: int, max_tokens: int, model: str = 'gpt-4',
+                 context: int = None):
+    """Raise ValueError if `batch_size` completions of `max_tokens` cannot fit next to any prompt."""
+    context = context or context_window(model)
+    preamble = max(_budget_tokens([{'role': 'system', 'content': system_preamble(k)}], model)
+                   for k in persona_keys)
+    if preamble + max_tokens * batch_size > context:
+        raise ValueError(f"--batch-size {batch_size} × --max-tokens {max_tokens} completion tokens plus a "
+                         f"{preamble}-token preamble exceed {model}'s {context:,}-token context; "
+                         f"lower one of them (at most {(context - preamble) // max_tokens} clusters per request)")
+
+
+# --------------------------------------------------------- compact encoding
+def _fmt(value) -> str:
+    """Short numeric text that stays within the grounding tolerance (0.1)."""
+    if value is None:
+        return '-'
+    if isinstance(value, str):
+        return value
+    if float(value).is_integer():
+        return str(int(value))
+    text = f"{value:.1f}" if abs(value) >= 100 else f"{value:.2f}" if abs(value) >= 0.01 else f"{value:.3g}"
+    return text.rstrip('0').rstrip('.') if '.' in text and 'e' not in text else text
+
+
+def compact_profile(profile: dict, features: list = PROMPT_FEATURES,
+                    categoricals: list = PROMPT_CATEGORICALS) -> str:
+    """Tabular encoding of one cluster profile."""
+    numeric = profile['numeric_stats']
+    features = list(numeric) if features is None else [f for f in features if f in numeric]
+    categoricals = list(profile['categorical_dist']) if categoricals is None else \
+        [c for c in categoricals if c in profile['categorical_dist']]
+    lof = profile['lof_score_stats']
+
+    lines = [f"## cluster_{profile['cluster_id']} n={profile['size']} ({profile['percentage']} of anomalies)",
+             "lof " + ' '.join(f"{k}={_fmt(lof.get(k))}" for k in ('mean', 'median', 'std', 'max'))]
+    rows = [f for f in features if f not in TIME_FEATURES]
+    if rows:
+        lines.append("feature|mean|std|min|median|max")
+        for feat in rows:
+            s = numeric[feat]
+            lines.append('|'.join([feat] + [_fmt(s.get(k)) for k in ('mean', 'std', 'min', 'median', 'max')]))
+    for feat in (f for f in features if f in TIME_FEATURES):
+        s = numeric[feat]
+        if s.get('min') is not None and s.get('max') is not None:
+            lines.append(f"{feat} span_h={(s['max'] - s['min']) / 3600:.1f} std_s={_fmt(round(s['std'] or 0))}")
+    for feat in categoricals:
+        dist = profile['categorical_dist'][feat]
+        lines.append(f"{feat}: " + ' '.join(f"{k}={v}" for k, v in dist.items()))
+    lines.append("attack: " + ' '.join(f"{k}={v}" for k, v in profile['attack_distribution'].items()))
+    return '\n'.join(lines)
+
+
+def system_preamble(persona_key: str) -> str:
+    """Fixed per-persona system message (identical for every request)."""
+    return f"{SYSTEM_MESSAGE}\n\n{PERSONAS[persona_key]['prefix']}\n\n{LEGEND}"
+
+
+def single_messages(profile: dict, persona_key: str, **encoding) -> list:
+    return [{'role': 'system', 'content': system_preamble(persona_key)},
+            {'role': 'user', 'content': f"{compact_profile(profile, **encoding)}\n\nPlease provide your analysis below:"}]
+
+
+def batch_messages(profiles: list, persona_key: str, **encoding) -> list:
+    keys = ', '.join(f"cluster_{p['cluster_id']}" for p in profiles)
+    tables = '\n\n'.join(compact_profile(p, **encoding) for p in profiles)
+    return [{'role': 'system', 'content': system_preamble(persona_key)},
+            {'role': 'user', 'content': (
+                f"Analyze each of the following {len(profiles)} clusters independently.\n\n{tables}\n\n"
+                f"Respond with one JSON object whose keys are the cluster ids ({keys}) and whose values "
+                f"are your full analysis of that cluster as a markdown string.")}]
+
+
+def split_batch_response(text: str, cluster_keys: list) -> dict:
+    """{cluster key: analysis} from a batched answer; missing keys are absent."""
+    body = text.strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", body, re.S)
+    if fenced:
+        body = fenced.group(1)
+    start, end = body.find('{'), body.rfind('}')
+    try:
+        parsed = json.loads(body[start:end + 1]) if start >= 0 else {}
+    except json.JSONDecodeError:
+        parsed = {}
+    out = {}
+    for key in cluster_keys:
+        value = parsed.get(key)
+        if value is not None:
+            out[key] = value if isinstance(value, str) else json.dumps(value, indent=2)
+    return out
+
+
+# ------------------------------------------------------------------ jobs
+def compile_jobs(profiles: list, persona_keys: list, batch_size: int = 1, max_prompt_tokens: int = None,
+                 model: str = 'gpt-4', max_tokens: int = None, context: int = None, **encoding) -> list:
+    """
+    Runner jobs with precompiled messages. With batch_size > 1, clusters are
+    packed greedily per persona until the batch is full, would exceed
+    `max_prompt_tokens`, or (given `max_tokens` per cluster) would leave too
+    little of the context window for every cluster's completion; such jobs
+    carry a 'clusters' list to split back.
+    """
+    context = context or context_window(model)
+
+    def too_big(candidate: list, persona_key: str) -> bool:
+        if max_prompt_tokens is None and max_tokens is None:
+            return False
+        messages = batch_messages(candidate, persona_key, **encoding)
+        if max_prompt_tokens is not None and count_message_tokens(messages, model) > max_prompt_tokens:
+            return True
+        return max_tokens is not None and _budget_tokens(messages, model) + max_tokens * len(candidate) > context
+
+    jobs = []
+    for persona_key in persona_keys:
+        if batch_size <= 1:
+            for p in profiles:
+                jobs.append({'cluster': f"cluster_{p['cluster_id']}", 'persona': persona_key,
+                             'messages': single_messages(p, persona_key, **encoding)})
+            continue
+
+        batch = []
+        for p in profiles:
+            candidate = batch + [p]
+            if len(candidate) > batch_size or (batch and too_big(candidate, persona_key)):
+                jobs.append(_batch_job(batch, persona_key, **encoding))
+                batch = [p]
+            else:
+                batch = candidate
+        if batch:
+            jobs.append(_batch_job(batch, persona_key, **encoding))
+    return jobs
+
+
+def _batch_job(batch: list, persona_key: str, **encoding) -> dict:
+    if len(batch) == 1:
+        return {'cluster': f"cluster_{batch[0]['cluster_id']}", 'persona': persona_key,
+                'messages': single_messages(batch[0], persona_key, **encoding)}
+    return {'clusters': [f"cluster_{p['cluster_id']}" for p in batch], 'persona': persona_key,
+            'messages': batch_messages(batch, persona_key, **encoding)}
+
+
+# ---------------------------------------------------------------- report
+def savings_report(profiles: list, persona_keys: list, legacy_prompts: dict = None,
+                   batch_size: int = 8, max_prompt_tokens: int = None, model: str = 'gpt-4',
+                   max_tokens: int = None, context: int = None, **encoding) -> dict:
+    """
+    Prompt tokens for the current format vs compiled prompts. The current
+    format sends the shared system message plus, per (cluster, persona),
+    the persona prefix and the cluster block from llm_cluster_prompts.json
+    (or `create_persona_prompt` when no such file is given).
+    """
+    def legacy_messages(profile, persona_key):
+        key = f"cluster_{profile['cluster_id']}"
+        if legacy_prompts is not None and key in legacy_prompts:
+            user = f"{PERSONAS[persona_key]['prefix']}\n\n---\n\n{legacy_prompts[key]}\n\n---\n\n" \
+                   f"Please provide your analysis below:\n"
+        else:
+            user, _ = create_persona_prompt(profile, persona_key)
+        return [{'role': 'system', 'content': SYSTEM_MESSAGE}, {'role': 'user', 'content': user}]
+
+    if legacy_prompts is not None:
+        profiles = [p for p in profiles if f"cluster_{p['cluster_id']}" in legacy_prompts]
+    legacy = [count_message_tokens(legacy_messages(p, k), model) for k in persona_keys for p in profiles]
+    single = compile_jobs(profiles, persona_keys, batch_size=1, model=model, **encoding)
+    batched = compile_jobs(profiles, persona_keys, batch_size=batch_size, max_prompt_tokens=max_prompt_tokens,
+                           model=model, max_tokens=max_tokens, context=context, **encoding)
+
+    def summarize(tokens: list, jobs: list = None) -> dict:
+        out = {'requests': len(tokens), 'prompt_tokens': int(sum(tokens)),
+               'mean_tokens_per_request': round(sum(tokens) / max(len(tokens), 1), 1)}
+        if jobs is not None:
+            preamble = sum(count_tokens(j['messages'][0]['content'], model) + MESSAGE_OVERHEAD for j in jobs)
+            out['fixed_preamble_tokens'] = int(preamble)
+            out['variable_tokens'] = int(sum(tokens) - preamble)
+        return out
+
+    single_tokens = [count_message_tokens(j['messages'], model) for j in single]
+    batched_tokens = [count_message_tokens(j['messages'], model) for j in batched]
+    base = max(sum(legacy), 1)
+    return {
+        'tokenizer': tokenizer_name(model),
+        'clusters': len(profiles), 'personas': len(persona_keys),
+        'legacy': summarize(legacy),
+        'compact': {**summarize(single_tokens, single),
+                    'savings_pct': round(100 * (1 - sum(single_tokens) / base), 1)},
+        'compact_batched': {**summarize(batched_tokens, batched), 'batch_size': batch_size,
+                            'savings_pct': round(100 * (1 - sum(batched_tokens) / base), 1)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile compact persona prompts and report token savings")
+    parser.add_argument('command', choices=['report', 'compile', 'show'])
+    parser.add_argument('--profiles', default='cluster_profiles.json')
+    parser.add_argument('--legacy-prompts', default=None, help="Current llm_cluster_prompts.json to compare against")
+    parser.add_argument('--personas', nargs='+', choices=list(PERSONAS), default=list(PERSONAS))
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-prompt-tokens', type=int, default=None)
+    parser.add_argument('--max-tokens', type=int, default=None,
+                        help="Completion tokens per cluster; batches are sized so prompt + completions fit the context")
+    parser.add_argument('--context-window', type=int, default=None, help="Default: the model's context size")
+    parser.add_argument('--all-features', action='store_true', help="Include every numeric feature in the table")
+    parser.add_argument('--model', default='gpt-4')
+    parser.add_argument('--output', default=None, help="report: JSON file; compile: JSONL of requests")
+    args = parser.parse_args()
+    if args.max_tokens is not None:
+        try:
+            check_budget(args.personas, args.batch_size, args.max_tokens, args.model, args.context_window)
+        except ValueError as e:
+            parser.error(str(e))
+
+    with open(args.profiles, 'r') as f:
+        profiles = json.load(f)
+    encoding = {'features': None} if args.all_features else {}
+
+    if args.command == 'show':
+        print(compact_profile(profiles[0], **encoding))
+        print(f"\n({count_tokens(compact_profile(profiles[0], **encoding), args.model)} tokens, "
+              f"{tokenizer_name(args.model)})")
+        return
+
+    if args.command == 'compile':
+        jobs = compile_jobs(profiles, args.personas, args.batch_size, args.max_prompt_tokens,
+                            args.model, args.max_tokens, args.context_window, **encoding)
+        with open(args.output or 'compiled_prompts.jsonl', 'w') as f:
+            for job in jobs:
+                f.write(json.dumps({**job, 'prompt_tokens': count_message_tokens(job['messages'], args.model)}) + '\n')
+        print(f"✓ {len(jobs)} requests written to: {args.output or 'compiled_prompts.jsonl'}")
+        return
+
+    legacy = None
+    if args.legacy_prompts:
+        with open(args.legacy_prompts, 'r') as f:
+            legacy = json.load(f)
+    report = savings_report(profiles, args.personas, legacy, args.batch_size, args.max_prompt_tokens,
+                            args.model, args.max_tokens, args.context_window, **encoding)
+    print(f"Prompt tokens ({report['tokenizer']}), {report['clusters']} clusters × {report['personas']} personas:")
+    for name in ('legacy', 'compact', 'compact_batched'):
+        r = report[name]
+        saving = f", {r['savings_pct']}% saved" if 'savings_pct' in r else ''
+        print(f"  {name:16s} {r['requests']:4d} requests, {r['prompt_tokens']:8,} tokens "
+              f"({r['mean_tokens_per_request']:.0f}/request{saving})")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
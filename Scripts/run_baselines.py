@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Baseline anomaly scores and top-K anomaly selection as scriptable steps.
+
+Reproduces the outputs of Anomaly_Detection_Baselines.ipynb from the
+persisted preprocessing artifact, keyed by pkSeqID instead of row position:
+
+    iso      fit IsolationForest on the train split, score the test split
+    combine  join IsolationForest and LOF (lof_engine.py score) test scores
+             into baseline_test_predictions.csv
+    top      top-K rows of a predictions CSV by lof_score / iso_forest_score
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from anomaly_index import top_k_positions
+from flow_schema import ID_COLUMN
+from instrumentation import stage
+
+TOP_K = 5000
+PREDICTION_COLUMNS = [ID_COLUMN, 'actual_label', 'iso_forest_score', 'iso_forest_pred', 'lof_score', 'lof_pred']
+
+
+def fit_isolation_forest(X_train: np.ndarray, n_estimators: int = 100, contamination: float = 0.1,
+                         random_state: int = 42, n_jobs: int = -1):
+    from sklearn.ensemble import IsolationForest
+
+    return IsolationForest(contamination=contamination, n_estimators=n_estimators,
+                           random_state=random_state, n_jobs=n_jobs).fit(X_train)
+
+
+def iso_forest_frame(iso_forest, X: np.ndarray) -> pd.DataFrame:
+    """`iso_forest_score` (higher = more anomalous) and binary `iso_forest_pred`."""
+    return pd.DataFrame({
+        'iso_forest_score': -iso_forest.score_samples(X),
+        'iso_forest_pred': (iso_forest.predict(X) == -1).astype(int)
+    })
+
+
+def combine_scores(iso: pd.DataFrame, lof: pd.DataFrame) -> pd.DataFrame:
+    """Inner join on pkSeqID, in the IsolationForest file's row order."""
+    lof = lof.drop(columns=[c for c in ('actual_label',) if c in iso.columns and c in lof.columns])
+    merged = iso.merge(lof, on=ID_COLUMN, how='inner', validate='one_to_one')
+    if len(merged) != len(iso) or len(merged) != len(lof):
+        raise ValueError(f"Score files cover different pkSeqIDs ({len(iso):,} IsolationForest, "
+                         f"{len(lof):,} LOF, {len(merged):,} shared)")
+    return merged[[c for c in PREDICTION_COLUMNS if c in merged.columns]]
+
+
+def select_top_k(predictions: pd.DataFrame, k: int = TOP_K, rank_by: str = 'lof_score') -> pd.DataFrame:
+    """The k highest-scoring rows, most anomalous first, via partial selection."""
+    return predictions.iloc[top_k_positions(predictions[rank_by].to_numpy(), k)].reset_index(drop=True)
+
+
+def main():
+    import joblib
+    from feature_preprocessing import FeaturePreprocessor, load_features_for_ids
+
+    parser = argparse.ArgumentParser(description="Baseline anomaly scores and top-K selection")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    iso = sub.add_parser('iso', help="Fit IsolationForest on the train split and score the test split")
+    iso.add_argument('flows', help="Flow store directory or subset CSV/Parquet")
+    iso.add_argument('--preprocessor', required=True)
+    iso.add_argument('--model', required=True, help="joblib file for the fitted IsolationForest")
+    iso.add_argument('--output', required=True, help="CSV with pkSeqID, iso_forest_score, iso_forest_pred")
+    iso.add_argument('--n-estimators', type=int, default=100)
+    iso.add_argument('--contamination', type=float, default=0.1)
+    iso.add_argument('--random-state', type=int, default=42)
+
+    combine = sub.add_parser('combine', help="Join IsolationForest and LOF test scores")
+    combine.add_argument('--iso', required=True)
+    combine.add_argument('--lof', required=True)
+    combine.add_argument('--output', default='baseline_test_predictions.csv')
+
+    top = sub.add_parser('top', help="Top-K anomalies of a predictions CSV")
+    top.add_argument('predictions')
+    top.add_argument('--top-k', type=int, default=TOP_K)
+    top.add_argument('--rank-by', choices=['lof_score', 'iso_forest_score'], default='lof_score')
+    top.add_argument('--output', default='top_anomalies.csv')
+
+    args = parser.parse_args()
+
+    if args.command == 'iso':
+        preprocessor = FeaturePreprocessor.load(args.preprocessor)
+        _, X_train = load_features_for_ids(args.flows, preprocessor, preprocessor.train_ids)
+        print(f">>> Training Isolation Forest on {len(X_train):,} TRAIN rows...")
+        with stage('iso_forest.fit', rows_in=len(X_train), n_estimators=args.n_estimators):
+            model = fit_isolation_forest(X_train, n_estimators=args.n_estimators,
+                                         contamination=args.contamination, random_state=args.random_state)
+        del X_train
+        os.makedirs(os.path.dirname(os.path.abspath(args.model)), exist_ok=True)
+        joblib.dump(model, args.model)
+        df, X_test = load_features_for_ids(args.flows, preprocessor, preprocessor.test_ids)
+        with stage('iso_forest.score', rows_in=len(X_test)) as span:
+            result = iso_forest_frame(model, X_test)
+            span.rows_out = len(result)
+            span.extra['anomalies'] = int(result['iso_forest_pred'].sum())
+        result.insert(0, ID_COLUMN, df[ID_COLUMN].to_numpy())
+        result.insert(1, 'actual_label', df['attack'].to_numpy())
+        result.to_csv(args.output, index=False)
+        print(f"✓ Scored {len(result):,} TEST rows → {args.output}")
+        print(f"  Detected anomalies: {result['iso_forest_pred'].sum():,} / {len(result):,}")
+    elif args.command == 'combine':
+        result = combine_scores(pd.read_csv(args.iso), pd.read_csv(args.lof))
+        result.to_csv(args.output, index=False)
+        print(f"✓ Test predictions saved to: {args.output} ({len(result):,} rows)")
+    else:
+        predictions = pd.read_csv(args.predictions)
+        with stage('topk', rows_in=len(predictions), k=args.top_k, rank_by=args.rank_by) as span:
+            result = select_top_k(predictions, k=args.top_k, rank_by=args.rank_by)
+            span.rows_out = len(result)
+        result.to_csv(args.output, index=False)
+        print(f"✓ Top {len(result):,} of {len(predictions):,} by {args.rank_by} → {args.output}")
+        print(f"  {args.rank_by} range: {result[args.rank_by].min():.4f} - {result[args.rank_by].max():.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic Bot-IoT flow generator.
+
+Writes flows with the exact Bot-IoT schema (flow_schema.BOT_IOT_COLUMNS)
+so every stage can be run and benchmarked without the real capture. Each
+row is drawn from a per-(category, subcategory) traffic profile:
+
+    DDoS / DoS        TCP, UDP, HTTP floods against a few victim hosts
+    Reconnaissance    Service_Scan, OS_Fingerprint over many ports
+    Theft             Keylogging, Data_Exfiltration with large transfers
+    Normal            mixed protocols, ports and hosts
+
+The category mix is controllable (`--mix DDoS=0.5,DoS=0.3,Normal=0.2`);
+the default follows the proportions of the Bot-IoT 5% extract. Output is
+generated in chunks, so 10M+ rows need only one chunk in memory, and the
+same seed, mix and chunk size always give the same file.
+
+`synthetic_interpretations` produces template LLM outputs for cluster
+profiles, so compute_metrics can be benchmarked without an API.
+"""
+
+import argparse
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from flow_schema import BOT_IOT_COLUMNS, BOT_IOT_DTYPES
+
+CHUNK_ROWS = 500_000
+START_TIME = 1526344121.0  # first stime in the Bot-IoT capture (2018-05-15)
+
+# Bot-IoT 5% extract: 3,668,522 flows
+CATEGORY_MIX = {
+    'DDoS': 0.5257,
+    'DoS': 0.4478,
+    'Reconnaissance': 0.0249,
+    'Normal': 0.0013,
+    'Theft': 0.0003
+}
+
+PROTO_NUMBERS = {'tcp': 1, 'arp': 2, 'udp': 3, 'icmp': 4, 'ipv6-icmp': 5}
+STATE_NUMBERS = {'RST': 1, 'CON': 2, 'REQ': 3, 'INT': 4, 'URP': 5, 'FIN': 6, 'ACC': 7, 'NRS': 8, 'ECO': 9}
+FLGS_NUMBERS = {'e': 1, 'e g': 2, 'e s': 3, 'e *': 4, 'e d': 5}
+PROTO_FLAGS = {
+    'tcp': {'e': 0.7, 'e s': 0.2, 'e d': 0.1},
+    'udp': {'e': 0.9, 'e *': 0.1},
+    'icmp': {'e': 0.95, 'e g': 0.05},
+    'arp': {'e': 1.0}
+}
+PROTO_STATES = {
+    'tcp': {'RST': 0.3, 'REQ': 0.3, 'CON': 0.2, 'FIN': 0.15, 'ACC': 0.05},
+    'udp': {'INT': 0.6, 'CON': 0.35, 'REQ': 0.05},
+    'icmp': {'ECO': 0.5, 'URP': 0.3, 'INT': 0.2},
+    'arp': {'CON': 0.7, 'INT': 0.3}
+}
+
+VICTIMS = ['192.168.100.3', '192.168.100.5', '192.168.100.6', '192.168.100.7']
+ATTACKERS = ['192.168.100.147', '192.168.100.148', '192.168.100.149', '192.168.100.150']
+LAN_HOSTS = [f'192.168.100.{i}' for i in range(1, 56)]
+EXTERNAL_HOSTS = ['8.8.8.8', '27.124.125.250', '52.28.231.150', '205.251.196.36', '192.168.217.2']
+SERVICE_PORTS = ['80', '443', '53', '123', '1900', '22', '21', '8080', '5353', '138']
+
+# Per-subcategory traffic profile. `states` overrides PROTO_STATES for TCP.
+# pkts ~ 1 + Poisson(pkts), packet size ~ pkt_size * lognormal, dur ~ lognormal(mean dur)
+PROFILES = {
+    ('DDoS', 'TCP'): {'share': 0.5, 'proto': {'tcp': 1.0}, 'states': {'REQ': 0.7, 'RST': 0.3},
+                      'src': ATTACKERS, 'dst': VICTIMS, 'dport': ['80'],
+                      'pkts': 6, 'pkt_size': 60, 'dur': 12.0, 'burst': 20, 'conn': 60},
+    ('DDoS', 'UDP'): {'share': 0.45, 'proto': {'udp': 1.0}, 'src': ATTACKERS, 'dst': VICTIMS, 'dport': ['80'],
+                      'pkts': 5, 'pkt_size': 60, 'dur': 10.0, 'burst': 20, 'conn': 60},
+    ('DDoS', 'HTTP'): {'share': 0.05, 'proto': {'tcp': 1.0}, 'states': {'CON': 0.5, 'RST': 0.3, 'FIN': 0.2},
+                       'src': ATTACKERS, 'dst': VICTIMS, 'dport': ['80'],
+                       'pkts': 10, 'pkt_size': 300, 'dur': 20.0, 'burst': 6, 'conn': 20},
+    ('DoS', 'TCP'): {'share': 0.5, 'proto': {'tcp': 1.0}, 'states': {'REQ': 0.6, 'RST': 0.4},
+                     'src': ATTACKERS[:1], 'dst': VICTIMS, 'dport': ['80'],
+                     'pkts': 7, 'pkt_size': 60, 'dur': 14.0, 'burst': 15, 'conn': 40},
+    ('DoS', 'UDP'): {'share': 0.45, 'proto': {'udp': 1.0}, 'src': ATTACKERS[:1], 'dst': VICTIMS, 'dport': ['80'],
+                     'pkts': 6, 'pkt_size': 60, 'dur': 12.0, 'burst': 15, 'conn': 40},
+    ('DoS', 'HTTP'): {'share': 0.05, 'proto': {'tcp': 1.0}, 'states': {'CON': 0.5, 'RST': 0.3, 'FIN': 0.2},
+                      'src': ATTACKERS[:1], 'dst': VICTIMS, 'dport': ['80'],
+                      'pkts': 12, 'pkt_size': 300, 'dur': 25.0, 'burst': 5, 'conn': 15},
+    ('Reconnaissance', 'Service_Scan'): {'share': 0.8, 'proto': {'tcp': 0.7, 'udp': 0.3},
+                                         'states': {'RST': 0.6, 'REQ': 0.3, 'ACC': 0.1},
+                                         'src': ATTACKERS, 'dst': VICTIMS, 'dport': 'scan',
+                                         'pkts': 1, 'pkt_size': 60, 'dur': 0.5, 'burst': 30, 'conn': 80},
+    ('Reconnaissance', 'OS_Fingerprint'): {'share': 0.2, 'proto': {'tcp': 0.6, 'udp': 0.2, 'icmp': 0.2},
+                                           'states': {'RST': 0.5, 'REQ': 0.5},
+                                           'src': ATTACKERS, 'dst': VICTIMS, 'dport': 'scan',
+                                           'pkts': 2, 'pkt_size': 70, 'dur': 1.0, 'burst': 25, 'conn': 70},
+    ('Theft', 'Keylogging'): {'share': 0.7, 'proto': {'tcp': 1.0}, 'states': {'CON': 0.6, 'FIN': 0.4},
+                              'src': VICTIMS, 'dst': ATTACKERS, 'dport': ['80', '8080', '4444'],
+                              'pkts': 30, 'pkt_size': 200, 'dur': 60.0, 'burst': 2, 'conn': 3},
+    ('Theft', 'Data_Exfiltration'): {'share': 0.3, 'proto': {'tcp': 1.0}, 'states': {'CON': 0.5, 'FIN': 0.5},
+                                     'src': VICTIMS, 'dst': ATTACKERS, 'dport': ['21', '80', '443'],
+                                     'pkts': 400, 'pkt_size': 1200, 'dur': 120.0, 'burst': 1, 'conn': 2},
+    ('Normal', 'Normal'): {'share': 1.0, 'proto': {'tcp': 0.45, 'udp': 0.4, 'icmp': 0.1, 'arp': 0.05},
+                           'src': LAN_HOSTS, 'dst': LAN_HOSTS + EXTERNAL_HOSTS, 'dport': SERVICE_PORTS,
+                           'pkts': 8, 'pkt_size': 250, 'dur': 8.0, 'burst': 3, 'conn': 5}
+}
+
+
+def parse_mix(text: str) -> dict:
+    """'DDoS=0.5,DoS=0.3,Normal=0.2' -> normalized {category: share}."""
+    mix = {}
+    for item in text.split(','):
+        name, _, share = item.partition('=')
+        name = name.strip()
+        if name not in CATEGORY_MIX:
+            raise ValueError(f"Unknown category '{name}', expected some of {list(CATEGORY_MIX)}")
+        mix[name] = float(share)
+    return _normalize(mix)
+
+
+def _normalize(mix: dict) -> dict:
+    total = sum(mix.values())
+    if total <= 0 or any(v < 0 for v in mix.values()):
+        raise ValueError(f"Invalid category mix {mix}")
+    return {k: v / total for k, v in mix.items() if v > 0}
+
+
+def _choice(rng, options: dict, n: int) -> np.ndarray:
+    keys = list(options)
+    p = np.array([options[k] for k in keys], dtype=float)
+    return np.array(keys, dtype=object)[rng.choice(len(keys), size=n, p=p / p.sum())]
+
+
+def _ports(rng, n: int) -> np.ndarray:
+    return rng.integers(1024, 65536, size=n).astype(str).astype(object)
+
+
+def _fill_group(rng, cols: dict, idx: np.ndarray, profile: dict):
+    n = len(idx)
+    proto = _choice(rng, profile['proto'], n)
+    cols['proto'][idx] = proto
+
+    state = np.empty(n, dtype=object)
+    flgs = np.empty(n, dtype=object)
+    sport, dport = _ports(rng, n), np.empty(n, dtype=object)
+    for p in np.unique(proto):
+        m = proto == p
+        states = profile.get('states', PROTO_STATES[p]) if p == 'tcp' else PROTO_STATES[p]
+        state[m] = _choice(rng, states, m.sum())
+        flgs[m] = _choice(rng, PROTO_FLAGS[p], m.sum())
+        if p in ('tcp', 'udp'):
+            if profile['dport'] == 'scan':
+                dport[m] = rng.integers(1, 1025, size=m.sum()).astype(str).astype(object)
+            else:
+                dport[m] = np.array(profile['dport'], dtype=object)[rng.integers(0, len(profile['dport']), m.sum())]
+        elif p == 'icmp':
+            sport[m] = '0x0008'
+            dport[m] = np.array(['0x0000', '0x0303', '0x0008'], dtype=object)[rng.integers(0, 3, m.sum())]
+        else:
+            sport[m] = '-1'
+            dport[m] = '-1'
+    cols['state'][idx], cols['flgs'][idx] = state, flgs
+    cols['sport'][idx], cols['dport'][idx] = sport, dport
+    cols['saddr'][idx] = np.array(profile['src'], dtype=object)[rng.integers(0, len(profile['src']), n)]
+    cols['daddr'][idx] = np.array(profile['dst'], dtype=object)[rng.integers(0, len(profile['dst']), n)]
+
+    pkts = 1 + rng.poisson(profile['pkts'], n)
+    spkts = rng.binomial(pkts, 0.6)
+    dpkts = pkts - spkts
+    sbytes = np.rint(spkts * profile['pkt_size'] * rng.lognormal(0.0, 0.3, n)).astype(np.int64)
+    dbytes = np.rint(dpkts * profile['pkt_size'] * rng.lognormal(0.0, 0.3, n)).astype(np.int64)
+    dur = profile['dur'] * rng.lognormal(-0.5, 1.0, n)
+    safe_dur = np.where(dur > 0, dur, 1.0)
+
+    mean = dur * rng.uniform(0.2, 1.0, n)
+    low = mean * rng.uniform(0.0, 1.0, n)
+    high = mean + (mean - low) * rng.uniform(1.0, 3.0, n)
+    n_records = 1 + rng.poisson(2, n)
+    rate = pkts / safe_dur
+
+    burst = profile['burst']
+    conn_dst = np.minimum(1 + rng.poisson(profile['conn'], n), 100)
+    conn_src = np.minimum(1 + rng.poisson(profile['conn'] / 2, n), 100)
+    tnp_src = pkts * (1 + rng.poisson(burst, n))
+    tnp_dst = pkts * (1 + rng.poisson(burst, n))
+
+    values = {
+        'pkts': pkts, 'spkts': spkts, 'dpkts': dpkts,
+        'bytes': sbytes + dbytes, 'sbytes': sbytes, 'dbytes': dbytes,
+        'dur': dur, 'mean': mean, 'min': low, 'max': high,
+        'stddev': (high - low) * rng.uniform(0.1, 0.5, n), 'sum': mean * n_records,
+        'rate': rate, 'srate': spkts / safe_dur, 'drate': dpkts / safe_dur,
+        'seq': rng.integers(1, 262212, n),
+        'TnBPSrcIP': (sbytes + dbytes) * (1 + rng.poisson(burst, n)),
+        'TnBPDstIP': (sbytes + dbytes) * (1 + rng.poisson(burst, n)),
+        'TnP_PSrcIP': tnp_src, 'TnP_PDstIP': tnp_dst,
+        'TnP_PerProto': pkts * (1 + rng.poisson(3 * burst, n)),
+        'TnP_Per_Dport': pkts * (1 + rng.poisson(2 * burst, n)),
+        'AR_P_Proto_P_SrcIP': rate * rng.uniform(0.5, 1.5, n),
+        'AR_P_Proto_P_DstIP': rate * rng.uniform(0.5, 1.5, n),
+        'AR_P_Proto_P_Sport': rate * rng.uniform(0.5, 1.5, n),
+        'AR_P_Proto_P_Dport': rate * rng.uniform(0.5, 1.5, n),
+        'N_IN_Conn_P_DstIP': conn_dst, 'N_IN_Conn_P_SrcIP': conn_src,
+        'Pkts_P_State_P_Protocol_P_DestIP': tnp_dst / conn_dst,
+        'Pkts_P_State_P_Protocol_P_SrcIP': tnp_src / conn_src
+    }
+    for col, v in values.items():
+        cols[col][idx] = v
+
+
+def _subcategory_table(mix: dict) -> tuple:
+    keys = [k for k in PROFILES if k[0] in mix]
+    p = np.array([mix[c] * PROFILES[(c, s)]['share'] for c, s in keys])
+    return keys, p / p.sum()
+
+
+def generate_chunk(n_rows: int, start_id: int, rng: np.random.Generator, mix: dict = None) -> pd.DataFrame:
+    """`n_rows` flows with pkSeqIDs from `start_id`, columns in Bot-IoT order."""
+    keys, p = _subcategory_table(_normalize(mix or CATEGORY_MIX))
+    group = rng.choice(len(keys), size=n_rows, p=p)
+
+    cols = {c: np.empty(n_rows, dtype=object if t == 'object' else t) for c, t in BOT_IOT_DTYPES.items()}
+    for g in np.unique(group):
+        _fill_group(rng, cols, np.flatnonzero(group == g), PROFILES[keys[g]])
+
+    ids = np.arange(start_id, start_id + n_rows, dtype=np.int64)
+    cols['pkSeqID'] = ids
+    # ~10 flows per second in capture order, with jitter
+    cols['stime'] = START_TIME + ids * 0.1 + rng.uniform(0.0, 0.1, n_rows)
+    cols['ltime'] = cols['stime'] + cols['dur']
+    cols['flgs_number'] = pd.Series(cols['flgs']).map(FLGS_NUMBERS).to_numpy(np.int64)
+    cols['proto_number'] = pd.Series(cols['proto']).map(PROTO_NUMBERS).to_numpy(np.int64)
+    cols['state_number'] = pd.Series(cols['state']).map(STATE_NUMBERS).to_numpy(np.int64)
+    category = np.array([k[0] for k in keys], dtype=object)[group]
+    cols['category'] = category
+    cols['subcategory'] = np.array([k[1] for k in keys], dtype=object)[group]
+    cols['attack'] = (category != 'Normal').astype(np.int64)
+    return pd.DataFrame({c: cols[c] for c in BOT_IOT_COLUMNS})
+
+
+def generate_flows(n_rows: int, seed: int = 42, mix: dict = None, start_id: int = 1,
+                   chunk_rows: int = CHUNK_ROWS):
+    """Yield DataFrame chunks totalling `n_rows`; chunk i is seeded from (seed, i)."""
+    children = np.random.SeedSequence(seed).spawn(max(1, -(-n_rows // chunk_rows)))
+    for i, child in enumerate(children):
+        size = min(chunk_rows, n_rows - i * chunk_rows)
+        yield generate_chunk(size, start_id + i * chunk_rows, np.random.default_rng(child), mix)
+
+
+def write_flows(path: str, n_rows: int, seed: int = 42, mix: dict = None, start_id: int = 1,
+                chunk_rows: int = CHUNK_ROWS) -> dict:
+    """Write a synthetic CSV or Parquet file; returns row counts per category."""
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
+    import pyarrow.parquet as pq
+
+    counts = {}
+    writer = None
+    tmp = f"{path}.tmp"
+    try:
+        for chunk in generate_flows(n_rows, seed, mix, start_id, chunk_rows):
+            # pyarrow's C++ writers are ~10x faster than DataFrame.to_csv on float columns
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = (pq.ParquetWriter(tmp, table.schema) if path.endswith('.parquet')
+                          else pcsv.CSVWriter(tmp, table.schema))
+            writer.write_table(table)
+            for category, count in chunk['category'].value_counts().items():
+                counts[category] = counts.get(category, 0) + int(count)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, path)
+    return counts
+
+
+def write_bot_iot_shards(data_dir: str, n_rows: int, seed: int = 42, mix: dict = None,
+                         chunk_rows: int = CHUNK_ROWS) -> dict:
+    """Split `n_rows` over the four shard files merge_datasets.py expects."""
+    from merge_datasets import csv_files
+
+    os.makedirs(data_dir, exist_ok=True)
+    counts, start = {}, 1
+    for i, name in enumerate(csv_files):
+        rows = n_rows // len(csv_files) + (1 if i < n_rows % len(csv_files) else 0)
+        shard = write_flows(os.path.join(data_dir, name), rows, seed + i, mix, start, chunk_rows)
+        for k, v in shard.items():
+            counts[k] = counts.get(k, 0) + v
+        start += rows
+    return counts
+
+
+def synthetic_interpretations(profiles: list, n_clusters: int = None, personas: list = None,
+                              seed: int = 42, paragraphs: int = 4, hallucination_rate: float = 0.2) -> tuple:
+    """
+    ({cluster: {persona: text}}, cluster profiles) for compute_metrics.
+    Profiles are cycled, with fresh cluster ids, up to `n_clusters`; each
+    text quotes numbers from its profile, mixes in the metric keywords and,
+    with probability `hallucination_rate` per paragraph, a number that is
+    not in the profile.
+    """
+    from compute_metrics import FEATURE_KEYWORDS, PERSONAS, THEME_KEYWORDS, THREAT_KEYWORDS
+
+    rng = random.Random(seed)
+    personas = personas or PERSONAS
+    vocab = sorted({w for group in (THREAT_KEYWORDS, FEATURE_KEYWORDS, THEME_KEYWORDS)
+                    for words in group.values() for w in words})
+    llm_data, cluster_data = {}, []
+    for cid in range(n_clusters or len(profiles)):
+        profile = dict(profiles[cid % len(profiles)], cluster_id=cid)
+        cluster_data.append(profile)
+        stats, dist = profile['numeric_stats'], profile['categorical_dist']
+        facts = [f"{profile['size']} flows", f"a mean of {stats['pkts']['mean']:.2f} packets",
+                 f"{stats['bytes']['mean']:.1f} bytes on average", f"at most {stats['pkts']['max']:.0f} packets"]
+        facts += [f"{n} {proto} flows" for proto, n in dist['proto'].items()]
+        facts += [f"{n} flows to port {port}" for port, n in dist['dport'].items()]
+        if profile['lof_score_stats'].get('max') is not None:
+            facts.append(f"a peak LOF score of {profile['lof_score_stats']['max']:.3f}")
+
+        analysis = {}
+        for persona in personas:
+            text = []
+            for _ in range(paragraphs):
+                a, b, c, d = rng.sample(vocab, 4)
+                quoted = rng.sample(facts, min(3, len(facts)))
+                text.append(f"The {a} pattern points to {b} with {c} activity; the cluster has "
+                            f"{', '.join(quoted)}. Analysts should {d} this traffic.")
+                if rng.random() < hallucination_rate:
+                    text.append(f"Around {rng.randint(1000, 99999)} external hosts may be involved.")
+            analysis[persona] = ' '.join(text)
+        llm_data[f"cluster_{cid}"] = analysis
+    return llm_data, cluster_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic Bot-IoT flows")
+    parser.add_argument('output', help="CSV/Parquet file, or a directory with --shards")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mix', default=None, help="Category shares, e.g. DDoS=0.5,DoS=0.3,Normal=0.2")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--shards', action='store_true',
+                        help="Write the four UNSW_2018_IoT_Botnet_Full5pc_*.csv shards into OUTPUT")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix) if args.mix else None
+    print(f"Generating {args.rows:,} synthetic flows (seed={args.seed})...")
+    if args.shards:
+        counts = write_bot_iot_shards(args.output, args.rows, args.seed, mix, args.chunk_rows)
+    else:
+        counts = write_flows(args.output, args.rows, args.seed, mix, chunk_rows=args.chunk_rows)
+    print(f"✓ Saved to: {args.output}")
+    for category, count in sorted(counts.items(), key=lambda kv: -kv[1]):
+        print(f"  {category}: {count:,} ({count / args.rows * 100:.2f}%)")
+
+
+if __name__ == '__main__':
+    main()
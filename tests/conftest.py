@@ -0,0 +1,8 @@
+"""Put Scripts/ on sys.path so the tests import the modules the way the CLIs do."""
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
@@ -0,0 +1,28 @@
+import numpy as np
+
+from anomaly_index import top_k_positions
+
+
+def test_ties_break_by_position():
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.1, 0.5])
+    assert top_k_positions(scores, 4).tolist() == [1, 3, 0, 2]
+    assert top_k_positions(scores, 6).tolist() == [1, 3, 0, 2, 5, 4]
+
+
+def test_nan_ranks_last():
+    scores = np.array([np.nan, 0.2, np.nan, 0.7, 0.2])
+    assert top_k_positions(scores, 3).tolist() == [3, 1, 4]
+    assert top_k_positions(scores, 5).tolist() == [3, 1, 4, 0, 2]
+
+
+def test_k_at_least_len_matches_stable_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 20, size=500).astype(float)
+    scores[rng.choice(500, 25, replace=False)] = np.nan
+    expected = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind='stable')
+    for k in (1, 17, 499, 500, 800):
+        assert top_k_positions(scores, k).tolist() == expected[:k].tolist()
+
+
+def test_k_zero_is_empty():
+    assert top_k_positions(np.array([0.3, 0.1]), 0).tolist() == []
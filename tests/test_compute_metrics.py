@@ -0,0 +1,23 @@
+import json
+import os
+
+from compute_metrics import compute_report
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_DIR, 'Data')
+# Written by the pre-library compute_metrics.py on the shipped Data/*.json
+EXPECTED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'metrics_report_expected.json')
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_report_unchanged_on_shipped_data():
+    llm_data = _load(os.path.join(DATA_DIR, 'llm_multi_persona_analysis.json'))
+    cluster_data = _load(os.path.join(DATA_DIR, 'cluster_profiles.json'))
+    report = compute_report(llm_data, cluster_data, report_date='2026-01-31')
+
+    # Round-trip so tuples / numpy scalars compare the way they are written
+    assert json.loads(json.dumps(report)) == _load(EXPECTED)
@@ -0,0 +1,41 @@
+import joblib
+import numpy as np
+import pytest
+
+from ensemble_scoring import score_ensemble
+from lof_engine import LOFEngine
+from run_baselines import fit_isolation_forest
+
+
+@pytest.fixture(scope='module')
+def models(tmp_path_factory):
+    rng = np.random.default_rng(7)
+    X_train = rng.normal(0, 1, (800, 6)).astype(np.float32)
+    X_test = np.vstack([rng.normal(0, 1, (450, 6)), rng.normal(3, 1, (50, 6))]).astype(np.float32)
+    root = tmp_path_factory.mktemp('models')
+    iso_path = str(root / 'iso_forest.joblib')
+    lof_dir = str(root / 'lof')
+    joblib.dump(fit_isolation_forest(X_train, n_estimators=50, contamination=0.1, random_state=42, n_jobs=1), iso_path)
+    LOFEngine(index='kd_tree', n_jobs=1).fit(X_train).save(lof_dir)
+    return X_test, iso_path, lof_dir
+
+
+def test_scores_identical_for_any_worker_count(models, tmp_path):
+    X_test, iso_path, lof_dir = models
+    single = score_ensemble(X_test, iso_path, lof_dir, workers=1, shard_rows=64, workdir=str(tmp_path))
+    pooled = score_ensemble(X_test, iso_path, lof_dir, workers=3, shard_rows=64, workdir=str(tmp_path))
+
+    assert single.columns.tolist() == pooled.columns.tolist()
+    for column in single.columns:
+        assert np.array_equal(single[column].to_numpy(), pooled[column].to_numpy()), column
+
+
+def test_scores_match_single_process_models(models, tmp_path):
+    X_test, iso_path, lof_dir = models
+    result = score_ensemble(X_test, iso_path, lof_dir, workers=2, shard_rows=128, workdir=str(tmp_path))
+    iso = joblib.load(iso_path)
+    lof = LOFEngine.load(lof_dir, n_jobs=1)
+
+    np.testing.assert_allclose(result['iso_forest_score'], -iso.score_samples(X_test), rtol=1e-12)
+    np.testing.assert_allclose(result['lof_score'], -lof.score_samples(X_test), rtol=1e-12)
+    assert np.array_equal(result['iso_forest_pred'], (iso.predict(X_test) == -1).astype(int))
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import LocalOutlierFactor
+
+from lof_engine import LOFEngine
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(42)
+    X_train = np.vstack([rng.normal(0, 1, (600, 8)), rng.normal(4, 0.5, (60, 8))]).astype(np.float32)
+    X_test = rng.normal(0, 1.5, (300, 8)).astype(np.float32)
+    return X_train, X_test
+
+
+@pytest.mark.parametrize('index', ['brute', 'kd_tree', 'ball_tree'])
+def test_matches_sklearn_novelty_lof(data, index):
+    X_train, X_test = data
+    reference = LocalOutlierFactor(n_neighbors=20, contamination=0.1, novelty=True).fit(X_train)
+    engine = LOFEngine(n_neighbors=20, contamination=0.1, index=index, n_jobs=1, batch_size=128).fit(X_train)
+
+    np.testing.assert_allclose(engine.score_samples(X_test), reference.score_samples(X_test), rtol=1e-5)
+    assert engine.offset_ == pytest.approx(reference.offset_, rel=1e-5)
+
+
+def test_save_load_round_trip(data, tmp_path):
+    X_train, X_test = data
+    engine = LOFEngine(index='kd_tree', n_jobs=1).fit(X_train)
+    engine.save(str(tmp_path / 'lof'))
+    loaded = LOFEngine.load(str(tmp_path / 'lof'), n_jobs=1)
+
+    np.testing.assert_array_equal(loaded.score_samples(X_test), engine.score_samples(X_test))
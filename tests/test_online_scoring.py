@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from anomaly_index import top_k_positions
+from online_scoring import TopKAnomalies
+
+
+def test_streaming_top_k_matches_top_k_positions():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 30, size=5000).astype(float)
+    scores[rng.choice(5000, 200, replace=False)] = np.nan
+    flows = pd.DataFrame({'pkSeqID': np.arange(5000) + 100, 'lof_score': scores})
+
+    for k in (1, 50, 333):
+        top = TopKAnomalies(k=k)
+        for start in range(0, len(flows), 137):
+            top.update(flows.iloc[start:start + 137])
+        expected = flows['pkSeqID'].to_numpy()[top_k_positions(scores, k)]
+        assert top.snapshot()['pkSeqID'].tolist() == expected.tolist()